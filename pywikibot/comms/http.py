@@ -24,6 +24,8 @@ __docformat__ = 'epytext'
 
 import atexit
 import sys
+import threading
+import time
 
 from distutils.version import StrictVersion
 from string import Formatter
@@ -31,9 +33,12 @@ from warnings import warn
 
 import requests
 
+from requests.adapters import HTTPAdapter
+
 if sys.version_info[0] > 2:
     from http import cookiejar as cookielib
     from urllib.parse import quote
+    unicode = str
 else:
     import cookielib
     from urllib2 import quote
@@ -67,6 +72,33 @@ if (isinstance(pywikibot.config2.socket_timeout, tuple) and
 
 session = requests.Session()
 
+
+def _accepted_encodings():
+    """Return the configured compressions which requests can decode."""
+    encodings = list(config.http_compression)
+    if 'br' in encodings:
+        try:
+            # only defined if urllib3 is able to use the brotli module
+            from requests.packages.urllib3.response import BrotliDecoder  # noqa
+        except ImportError:
+            encodings.remove('br')
+    return ', '.join(encodings) or 'identity'
+
+
+def _mount_adapters():
+    """Mount adapters with the configured connection pool sizes."""
+    for scheme in ('http://', 'https://'):
+        session.mount(scheme, HTTPAdapter(
+            pool_connections=config.http_pool_connections,
+            pool_maxsize=config.http_pool_maxsize))
+        for host, maxsize in config.http_pool_maxsize_hosts.items():
+            session.mount(scheme + host + '/', HTTPAdapter(
+                pool_connections=1, pool_maxsize=maxsize))
+
+
+_mount_adapters()
+session.headers['Accept-Encoding'] = _accepted_encodings()
+
 cookie_jar = cookielib.LWPCookieJar(
     config.datafilepath('pywikibot.lwp'))
 try:
@@ -81,6 +113,10 @@ session.cookies = cookie_jar
 
 # Prepare flush on quit
 def _flush():
+    for host, values in sorted(statistics().items()):
+        pywikibot.log('HTTP statistics for {0}: {1}'.format(
+            host, ', '.join('{0}={1}'.format(*item)
+                            for item in sorted(values.items()))))
     session.close()
     message = 'Closing network session.'
     if hasattr(sys, 'last_type'):
@@ -247,19 +283,107 @@ def request(site=None, uri=None, method='GET', body=None, headers=None,
     return r.content
 
 
+class _HostStatistics(object):
+
+    """Transfer statistics of the requests to one host."""
+
+    # upper bounds in seconds of the latency histogram buckets
+    latency_buckets = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        """Constructor."""
+        self.requests = 0
+        self.errors = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.latency = [0] * (len(self.latency_buckets) + 1)
+
+    def add(self, latency, response=None, body=None):
+        """Record one request."""
+        self.requests += 1
+        for index, bound in enumerate(self.latency_buckets):
+            if latency <= bound:
+                break
+        else:
+            index = len(self.latency_buckets)
+        self.latency[index] += 1
+        if isinstance(body, (bytes, unicode)) or hasattr(body, 'read'):
+            self.bytes_out += len(body)
+        if response is None:
+            self.errors += 1
+        else:
+            # bytes read from the connection, before decompression
+            tell = getattr(response.raw, 'tell', None)
+            self.bytes_in += tell() if tell else len(response.content)
+
+    def as_dict(self):
+        """Return the statistics as a dict."""
+        values = {
+            'requests': self.requests,
+            'errors': self.errors,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+        }
+        for bound, count in zip(self.latency_buckets + ('inf', ),
+                                self.latency):
+            values['latency<={0}'.format(bound)] = count
+        return values
+
+
+_statistics = {}
+_statistics_lock = threading.Lock()
+
+
+def statistics():
+    """
+    Return the transfer statistics of the requests made so far per host.
+
+    The values of each host are the number of requests and of failed
+    requests, the bytes sent and received, a histogram of the latencies
+    and, while the connections to the host are pooled, the fraction of
+    requests which reused an open connection.
+
+    @return: statistics per host name
+    @rtype: dict of dict
+    """
+    with _statistics_lock:
+        result = dict((host, stats.as_dict())
+                      for host, stats in _statistics.items())
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None or not pool.num_requests:
+                continue
+            host = pool.host if pool.port in (None, 80, 443) else \
+                '{0}:{1}'.format(pool.host, pool.port)
+            result.setdefault(host, {})['connection_reuse'] = round(
+                1 - float(pool.num_connections) / pool.num_requests, 3)
+    return result
+
+
 def _http_process(session, http_request):
     method = http_request.method
     uri = http_request.uri
     body = http_request.body
     headers = http_request.headers
-    timeout = config.socket_timeout
+    timeout = http_request.kwargs.get('timeout', config.socket_timeout)
+    verify = not http_request.kwargs.get('disable_ssl_certificate_validation')
+    start = time.time()
+    request = None
     try:
         request = session.request(method, uri, data=body, headers=headers,
-                                  verify=True, timeout=timeout)
+                                  verify=verify, timeout=timeout)
     except Exception as e:
         http_request.data = e
     else:
         http_request.data = request
+    finally:
+        with _statistics_lock:
+            if http_request.hostname not in _statistics:
+                _statistics[http_request.hostname] = _HostStatistics()
+            _statistics[http_request.hostname].add(
+                time.time() - start, request, body)
 
 
 def error_handling_callback(request):
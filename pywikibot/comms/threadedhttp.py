@@ -142,9 +142,8 @@ class HttpRequest(UnicodeMixin):
                                        'received in the header.'.format(
                         charset, self.header_encoding))
                 try:
-                    # TODO: Buffer decoded content, weakref does remove it too
-                    #       early (directly after this method)
-                    self.raw.decode(self.header_encoding)
+                    self._decoded = (self.header_encoding,
+                                     self.raw.decode(self.header_encoding))
                 except UnicodeError as e:
                     self._encoding = e
                 else:
@@ -155,7 +154,7 @@ class HttpRequest(UnicodeMixin):
             if charset and (isinstance(self._encoding, Exception) or
                             not self._encoding):
                 try:
-                    self.raw.decode(charset)
+                    self._decoded = (charset, self.raw.decode(charset))
                 except UnicodeError as e:
                     self._encoding = e
                 else:
@@ -167,6 +166,11 @@ class HttpRequest(UnicodeMixin):
 
     def decode(self, encoding, errors='strict'):
         """Return the decoded response."""
+        # The response was already decoded once to detect the encoding.
+        # Hand out that text once instead of decoding the body again.
+        decoded = self.__dict__.pop('_decoded', None)
+        if decoded and decoded[0] == encoding:
+            return decoded[1]
         return self.raw.decode(encoding, errors)
 
     @property
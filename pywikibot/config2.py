@@ -492,6 +492,13 @@ interwiki_graph = False
 # once.
 interwiki_min_subjects = 100
 
+# From how many sites should interwiki.py load pages at the same time?
+interwiki_parallel_sites = 4
+
+# Should interwiki.py remember the interlanguage links in a database and use
+# the pages connected to a page as hints? See -langlinksgraph.
+interwiki_langlinks_graph = False
+
 # If interwiki graphs are enabled, which format(s) should be used?
 # Supported formats include png, jpg, ps, and svg. See:
 # http://www.graphviz.org/doc/info/output.html
@@ -516,8 +523,8 @@ interwiki_graph_url = None
 without_interwiki = False
 
 # Experimental feature:
-# Store the page contents on disk (/cache/ directory) instead of loading
-# them in RAM.
+# Store the page contents on disk (in a temporary file) instead of loading
+# them in RAM. See page_contents_on_disk.
 interwiki_contents_on_disk = False
 
 # ############# SOLVE_DISAMBIGUATION SETTINGS ############
@@ -537,6 +544,11 @@ sort_ignore_case = False
 # Commons by default.
 upload_to_commons = False
 
+# Chunked uploads use smaller chunks if uploading one chunk takes longer
+# than this number of seconds, but never larger chunks than the requested
+# chunk size. Set it to 0 to always use the requested chunk size.
+upload_chunk_time = 30
+
 # ############# SETTINGS TO AVOID SERVER OVERLOAD ##############
 
 # Slow down the robot such that it never requests a second page within
@@ -596,6 +608,12 @@ table2wikiSkipWarnings = False
 # that slow servers won't slow you down.
 max_external_links = 50
 
+# How many of these links may be loaded from the same host at the same time,
+# and how many seconds should be between the start of two requests to the
+# same host?
+max_external_links_per_host = 4
+external_links_host_delay = 0
+
 report_dead_links_on_talk = False
 
 # ############# DATABASE SETTINGS ##############
@@ -699,6 +717,24 @@ persistent_http = False
 # read timeout, or a single value for both in a tuple (since requests 2.4.0).
 socket_timeout = 30
 
+# Connections are kept open and reused for later requests to the same host.
+# 'http_pool_maxsize' is the number of connections kept open per host; it
+# should be at least the number of threads accessing a host at the same time.
+# 'http_pool_connections' is the number of hosts for which connections are
+# kept open.
+http_pool_connections = 10
+http_pool_maxsize = 10
+
+# Number of connections kept open for specific hosts, overriding
+# 'http_pool_maxsize'. For example:
+# http_pool_maxsize_hosts['commons.wikimedia.org'] = 20
+http_pool_maxsize_hosts = {}
+
+# Compressions the server may apply to the responses. Brotli ('br') is only
+# requested when the brotli module is installed and supported by requests.
+# Set to [] to request uncompressed responses.
+http_compression = ['gzip', 'deflate', 'br']
+
 
 # ############# COSMETIC CHANGES SETTINGS ##############
 # The bot can make some additional changes to each page it edits, e.g. fix
@@ -752,6 +788,21 @@ cosmetic_changes_deny_script = ['category_redirect', 'cosmetic_changes',
 # liwiki. Note that this does not take the origin wiki into account.
 replicate_replace = {}
 
+# ############# PAGE GENERATOR SETTINGS ##############
+# Pages yielded by several page generators, e.g. by combining generators on
+# the command line, are only processed once. The seen pages are remembered by
+#  'exact'  - the page objects themselves
+#  'hash'   - a 64 bit hash of their title
+#  'pageid' - their page id if it is known, otherwise a hash of their title
+#  'bloom'  - a Bloom filter with a fixed size, which wrongly considers some
+#             pages as seen, see dedupe_bloom_capacity and _error_rate
+dedupe_mode = 'exact'
+
+# The Bloom filter needs about 1.8 MB for one million pages at an error rate
+# of 0.1 %. The error rate increases if more pages than the capacity are seen.
+dedupe_bloom_capacity = 1000000
+dedupe_bloom_error_rate = 0.001
+
 # ############# FURTHER SETTINGS ##############
 
 # Proxy configuration
@@ -776,6 +827,13 @@ simulate = False
 # processing. As higher this value this effect will decrease.
 max_queue_size = 64
 
+# Keep the texts of the loaded revisions in a store, which writes the least
+# recently used texts to a temporary file once they have more characters
+# than page_contents_memory. This reduces the memory used by bots which hold
+# many pages at the same time.
+page_contents_on_disk = False
+page_contents_memory = 10000000
+
 # Define the line separator. Pages retrieved via API have "\n" whereas
 # pages fetched from screen (mostly) have "\r\n". Interwiki and category
 # separator settings in family files should use multiplied of this.
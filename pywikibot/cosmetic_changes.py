@@ -59,7 +59,9 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
+import collections
 import re
+import time
 
 from warnings import warn
 
@@ -157,6 +159,10 @@ CANCEL_METHOD = 2
 CANCEL_MATCH = 3
 
 
+# site specific patterns, which are created once per site
+_site_patterns = {}
+
+
 def _format_isbn_match(match, strict=True):
     """Helper function to validate and format a single matched ISBN."""
     isbn = match.group('code')
@@ -210,6 +216,23 @@ class CosmeticChangesToolkit:
 
     """Cosmetic changes toolkit."""
 
+    # A method is only executed if one of these strings is in the text,
+    # because its patterns can't match otherwise.
+    prefilters = {
+        'fixSelfInterwiki': ('[[', ),
+        'fixSyntaxSave': ('http', ),
+        'cleanUpLinks': ('[[', ),
+        'cleanUpSectionHeaders': ('=', ),
+        'putSpacesInLists': ('*', '#'),
+        'translateAndCapitalizeNamespaces': ('[[', ),
+        'replaceDeprecatedTemplates': ('{{', ),
+        'removeNonBreakingSpaceBeforePercent': ('&nbsp;%', ),
+        'fixHtml': ('<', ),
+        'fixReferences': ('<', ),
+        'fixStyle': ('prettytable', ),
+        'fixTypo': ('ccm', u'º', u'°'),
+    }
+
     @deprecate_arg('debug', 'diff')
     def __init__(self, site, diff=False, redirect=False, namespace=None,
                  pageTitle=None, ignore=CANCEL_ALL):
@@ -222,6 +245,8 @@ class CosmeticChangesToolkit:
         self.talkpage = self.namespace >= 0 and self.namespace % 2 == 1
         self.title = pageTitle
         self.ignore = ignore
+        # seconds spent in each method during the last change()
+        self.timings = collections.defaultdict(float)
 
         self.common_methods = (
             self.commonsfiledesc,
@@ -267,14 +292,35 @@ class CosmeticChangesToolkit:
                 raise
         return text if result is None else result
 
+    def _site_pattern(self, name, create):
+        """
+        Return a site specific pattern, which is only created once per site.
+
+        @param name: the name of the pattern
+        @type name: str
+        @param create: callable which creates the pattern
+        @type create: callable
+        """
+        patterns = _site_patterns.setdefault(self.site, {})
+        if name not in patterns:
+            patterns[name] = create()
+        return patterns[name]
+
     def _change(self, text):
         """Execute all clean up methods."""
         for method in self.common_methods:
+            needles = self.prefilters.get(method.__name__)
+            if needles and not any(needle in text for needle in needles):
+                continue
+            start = time.time()
             text = self.safe_execute(method, text)
+            self.timings[method.__name__] += time.time() - start
         return text
 
     def change(self, text):
         """Execute all clean up methods and catch errors if activated."""
+        self.timings.clear()
+        start = time.time()
         try:
             new_text = self._change(text)
         except Exception as e:
@@ -285,6 +331,11 @@ class CosmeticChangesToolkit:
             else:
                 raise
         else:
+            timings = ', '.join(
+                '{0} {1:.3f}s'.format(name, seconds) for name, seconds in
+                sorted(self.timings.items(), key=lambda item: -item[1]))
+            pywikibot.log(u'Cosmetic changes on "{0}" took {1:.3f}s: {2}'
+                          .format(self.title, time.time() - start, timings))
             if self.diff:
                 pywikibot.showDiff(text, new_text)
             return new_text
@@ -296,8 +347,9 @@ class CosmeticChangesToolkit:
         Remove their language code prefix.
         """
         if not self.talkpage and pywikibot.calledModuleName() != 'interwiki':
-            interwikiR = re.compile(r'\[\[%s\s?:([^\[\]\n]*)\]\]'
-                                    % self.site.code)
+            interwikiR = self._site_pattern(
+                'interwiki', lambda: re.compile(r'\[\[%s\s?:([^\[\]\n]*)\]\]'
+                                                % self.site.code))
             text = interwikiR.sub(r'[[\1]]', text)
         return text
 
@@ -417,10 +469,18 @@ class CosmeticChangesToolkit:
         # arz uses english stylish codes
         if self.site.sitename() == 'wikipedia:arz':
             return text
-        family = self.site.family
         # wiki links aren't parsed here.
         exceptions = ['nowiki', 'comment', 'math', 'pre']
 
+        for regex, replacement in self._site_pattern(
+                'namespaces', self._namespace_patterns):
+            text = textlib.replaceExcept(text, regex, replacement, exceptions)
+        return text
+
+    def _namespace_patterns(self):
+        """Return the patterns of translateAndCapitalizeNamespaces."""
+        family = self.site.family
+        patterns = []
         for namespace in self.site.namespaces.values():
             if namespace.id in (0, 2, 3):
                 # skip main (article) namespace
@@ -449,13 +509,11 @@ class CosmeticChangesToolkit:
                 namespaces[i] = item
             namespaces.append(first_lower(thisNs))
             if thisNs and namespaces:
-                text = textlib.replaceExcept(
-                    text,
-                    r'\[\[\s*(%s) *:(?P<nameAndLabel>.*?)\]\]'
-                    % '|'.join(namespaces),
-                    r'[[%s:\g<nameAndLabel>]]' % thisNs,
-                    exceptions)
-        return text
+                patterns.append((
+                    re.compile(r'\[\[\s*(%s) *:(?P<nameAndLabel>.*?)\]\]'
+                               % '|'.join(namespaces)),
+                    r'[[%s:\g<nameAndLabel>]]' % thisNs))
+        return patterns
 
     def translateMagicWords(self, text):
         """Use localized magic words."""
@@ -584,7 +642,8 @@ class CosmeticChangesToolkit:
             # don't change anything
             return match.group()
 
-        trailR = re.compile(self.site.linktrail())
+        trailR = self._site_pattern(
+            'linktrail', lambda: re.compile(self.site.linktrail()))
     # The regular expression which finds links. Results consist of four groups:
     # group <newline> depends whether the links starts with a new line.
     # group <titleWithSection> is the page title and section, that is,
@@ -592,9 +651,9 @@ class CosmeticChangesToolkit:
     # group <label> is the alternative link title between | and ].
     # group <linktrail> is the link trail after ]] which are part of the word.
     # note that the definition of 'letter' varies from language to language.
-        linkR = re.compile(
+        linkR = self._site_pattern('link', lambda: re.compile(
             r'(?P<newline>[\n]*)\[\[(?P<titleWithSection>[^\]\|]+)(\|(?P<label>[^\]\|]*))?\]\](?P<linktrail>' +
-            self.site.linktrail() + ')')
+            self.site.linktrail() + ')'))
 
         text = textlib.replaceExcept(text, linkR, handleOneLink,
                                      ['comment', 'math', 'nowiki', 'pre',
@@ -674,7 +733,9 @@ class CosmeticChangesToolkit:
         """
         if not self.template:
             exceptions = ['comment', 'math', 'nowiki', 'pre', 'source', 'template',
-                          'timeline', self.site.redirectRegex()]
+                          'timeline',
+                          self._site_pattern('redirect',
+                                             self.site.redirectRegex)]
             text = textlib.replaceExcept(
                 text,
                 r'(?m)^(?P<bullet>[:;]*(\*+|#+)[:;\*#]*)(?P<char>[^\s\*#:;].+?)',
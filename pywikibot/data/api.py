@@ -11,10 +11,13 @@ __version__ = '$Id$'
 
 from collections import Container, MutableMapping
 from email.mime.nonmultipart import MIMENonMultipart
+import binascii
 import datetime
+import functools
 import hashlib
 import inspect
 import json
+import logging
 import os
 try:
     import cPickle as pickle
@@ -36,53 +39,14 @@ from pywikibot.exceptions import (
 from pywikibot.comms import http
 
 if not PY2:
-    # Subclassing necessary to fix a possible bug of the email package
-    # in py3: see http://bugs.python.org/issue19003
-    # The following solution might be removed if/once the bug is fixed,
-    # unless the fix is not backported to py3.x versions that should
-    # instead support PWB.
     basestring = (str, )
     from urllib.parse import urlencode, unquote
     unicode = str
-
-    from io import BytesIO
-
-    import email.generator
-    from email.mime.multipart import MIMEMultipart as MIMEMultipartOrig
-
-    class CTEBinaryBytesGenerator(email.generator.BytesGenerator):
-
-        """Workaround for bug in python 3 email handling of CTE binary."""
-
-        def __init__(self, *args, **kwargs):
-            """Constructor."""
-            super(CTEBinaryBytesGenerator, self).__init__(*args, **kwargs)
-            self._writeBody = self._write_body
-
-        def _write_body(self, msg):
-            if msg['content-transfer-encoding'] == 'binary':
-                self._fp.write(msg.get_payload(decode=True))
-            else:
-                super(CTEBinaryBytesGenerator, self)._handle_text(msg)
-
-    class CTEBinaryMIMEMultipart(MIMEMultipartOrig):
-
-        """Workaround for bug in python 3 email handling of CTE binary."""
-
-        def as_bytes(self, unixfrom=False, policy=None):
-            """Return unmodified binary payload."""
-            policy = self.policy if policy is None else policy
-            fp = BytesIO()
-            g = CTEBinaryBytesGenerator(fp, mangle_from_=False, policy=policy)
-            g.flatten(self, unixfrom=unixfrom)
-            return fp.getvalue()
-
-    MIMEMultipart = CTEBinaryMIMEMultipart
 else:
     from urllib import urlencode, unquote
-    from email.mime.multipart import MIMEMultipart
 
 _logger = "data.api"
+_api_logger = logging.getLogger('pywiki.' + _logger)
 
 lagpattern = re.compile(r"Waiting for [\d.]+: (?P<lag>\d+) seconds? lagged")
 
@@ -1036,6 +1000,157 @@ class EnableSSLSiteWrapper(object):
         return 'https'
 
 
+class MultipartBody(object):
+
+    """
+    A multipart/form-data request body which is read from its parts.
+
+    The content of a part is either a string or an open file. Files are
+    read in blocks while the body is sent and never loaded as a whole, so
+    uploading a large file doesn't need memory of the file size. Other
+    objects supporting the buffer interface, like mmap, are read without
+    copying them. The length of the body is known in advance, so it is sent
+    with a Content-Length header.
+    """
+
+    blocksize = 65536
+
+    def __init__(self, boundary=None):
+        """
+        Constructor.
+
+        @param boundary: the boundary between the parts, which must not
+            occur in the contents. Defaults to a random boundary.
+        @type boundary: str
+        """
+        if boundary is None:
+            boundary = binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.boundary = boundary
+        # the parts are bytes or (file, offset, length) tuples
+        self._parts = []
+        self._length = 0
+        self._index = 0
+        self._position = 0
+
+    @property
+    def headers(self):
+        """Return the HTTP headers describing the body."""
+        return {'Content-Type': 'multipart/form-data; boundary="%s"'
+                                % self.boundary,
+                'MIME-Version': '1.0'}
+
+    @staticmethod
+    def _quote(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"')
+
+    def _append(self, part):
+        if isinstance(part, tuple):
+            self._length += part[2]
+        else:
+            self._length += len(part)
+        self._parts.append(part)
+
+    def add(self, key, content, keytype=None, headers=None):
+        """
+        Add a form field.
+
+        @param key: the name of the field
+        @type key: str
+        @param content: the value of the field, a file is read from its
+            current position, which is kept so that the body can be built
+            again from the same file
+        @type content: unicode, bytes, buffer or file
+        @param keytype: the MIME type, defaults to text/plain for ASCII
+            strings and application/octet-stream otherwise
+        @type keytype: tuple of str
+        @param headers: additional parameters of the Content-Disposition
+            header like the filename
+        @type headers: dict
+        """
+        if not keytype:
+            try:
+                content.encode('ascii')
+                keytype = ('text', 'plain')
+            except (UnicodeError, AttributeError):
+                keytype = ('application', 'octet-stream')
+        disposition = 'form-data; name="%s"' % self._quote(key)
+        for name, value in (headers or {}).items():
+            disposition += '; %s="%s"' % (name, self._quote(value))
+        lines = ['--' + self.boundary,
+                 'Content-Type: %s/%s' % tuple(keytype),
+                 'MIME-Version: 1.0',
+                 'Content-Disposition: ' + disposition]
+        if keytype != ('text', 'plain'):
+            lines.append('Content-Transfer-Encoding: binary')
+        self._append(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8'))
+
+        if isinstance(content, unicode):
+            self._append(content.encode('utf-8'))
+        elif hasattr(content, 'read'):
+            offset = content.tell()
+            content.seek(0, os.SEEK_END)
+            self._append((content, offset, content.tell() - offset))
+            content.seek(offset)
+        else:
+            self._append(memoryview(content))
+        self._append(b'\r\n')
+
+    def close(self):
+        """Add the end of the body after the last field."""
+        self._append(('--%s--\r\n' % self.boundary).encode('ascii'))
+
+    def __len__(self):
+        """Return the length of the body in bytes."""
+        return self._length
+
+    def read(self, size=-1):
+        """
+        Read the next bytes of the body.
+
+        @param size: the maximum number of bytes, all if negative
+        @type size: int
+        @rtype: bytes
+        """
+        blocks = []
+        while self._index < len(self._parts) and size != 0:
+            part = self._parts[self._index]
+            if isinstance(part, tuple):
+                f, offset, length = part
+                remaining = length - self._position
+                if size >= 0:
+                    remaining = min(remaining, size)
+                f.seek(offset + self._position)
+                block = f.read(remaining)
+                # a retried request builds the body again from the file
+                f.seek(offset)
+                if len(block) < remaining:
+                    raise IOError('The file was truncated while reading it')
+            else:
+                end = len(part) if size < 0 else self._position + size
+                block = part[self._position:end]
+                if isinstance(block, memoryview):
+                    block = block.tobytes()
+            blocks.append(block)
+            self._position += len(block)
+            if size >= 0:
+                size -= len(block)
+            if isinstance(part, tuple):
+                length = part[2]
+            else:
+                length = len(part)
+            if self._position >= length:
+                self._index += 1
+                self._position = 0
+        return b''.join(blocks)
+
+    def __iter__(self):
+        """Iterate over the body in blocks."""
+        block = self.read(self.blocksize)
+        while block:
+            yield block
+            block = self.read(self.blocksize)
+
+
 class Request(MutableMapping):
 
     """A request to a Site's api.php interface.
@@ -1590,6 +1705,9 @@ class Request(MutableMapping):
     def _build_mime_request(cls, params, mime_params):
         """Construct a MIME multipart form post.
 
+        The body is read into memory, use L{_build_multipart_body} to
+        stream it instead.
+
         @param params: HTTP request params
         @type params: dict
         @param mime_params: HTTP request parts which must be sent in the body
@@ -1597,26 +1715,27 @@ class Request(MutableMapping):
         @return: HTTP request headers and body
         @rtype: (headers, body)
         """
-        # construct a MIME message containing all API key/values
-        container = MIMEMultipart(_subtype='form-data')
+        headers, body = cls._build_multipart_body(params, mime_params)
+        return headers, body.read()
+
+    @staticmethod
+    def _build_multipart_body(params, mime_params):
+        """Construct a MIME multipart form post which is read from its parts.
+
+        @param params: HTTP request params
+        @type params: dict
+        @param mime_params: HTTP request parts which must be sent in the body
+        @type mime_params: dict of (content, keytype, headers)
+        @return: HTTP request headers and body
+        @rtype: (dict, MultipartBody)
+        """
+        body = MultipartBody()
         for key, value in params.items():
-            submsg = cls._generate_MIME_part(key, value)
-            container.attach(submsg)
+            body.add(key, value)
         for key, value in mime_params.items():
-            submsg = cls._generate_MIME_part(key, *value)
-            container.attach(submsg)
-
-        # strip the headers to get the HTTP message body
-        if not PY2:
-            body = container.as_bytes()
-        else:
-            body = container.as_string()
-        marker = b'\n\n'  # separates headers from body
-        eoh = body.find(marker)
-        body = body[eoh + len(marker):]
-        # retrieve the headers from the MIME object
-        headers = dict(container.items())
-        return headers, body
+            body.add(key, *value)
+        body.close()
+        return body.headers, body
 
     def _handle_warnings(self, result):
         if 'warnings' in result:
@@ -1680,7 +1799,7 @@ class Request(MutableMapping):
             uri = self.site.scriptpath() + "/api.php"
             try:
                 if self.mime:
-                    (headers, body) = Request._build_mime_request(
+                    (headers, body) = Request._build_multipart_body(
                         self._encoded_items(), self.mime_params)
                     use_get = False  # MIME requests require HTTP POST
                 else:
@@ -1724,8 +1843,12 @@ class Request(MutableMapping):
                 continue
             if not isinstance(rawdata, unicode):
                 rawdata = rawdata.decode(self.site.encoding())
-            pywikibot.debug((u"API response received from %s:\n" % self.site) +
-                            rawdata, _logger)
+            # Responses can be several megabytes large, so only build the
+            # debug message (a copy of the response) if it is going to be
+            # logged.
+            if _api_logger.isEnabledFor(logging.DEBUG):
+                pywikibot.debug((u"API response received from %s:\n"
+                                 % self.site) + rawdata, _logger)
             if rawdata.startswith(u"unknown_action"):
                 raise APIError(rawdata[:14], rawdata[16:])
             try:
@@ -2156,8 +2279,14 @@ class QueryGenerator(object):
     types (such as "meta=...") that don't return the usual list of pages or
     links. See the API documentation for specific query options.
 
+    If the results are in ascending order of a key, sort_key is a callable
+    which returns the key of a result. This allows the results of several
+    generators to be intersected by a merge join.
+
     """
 
+    sort_key = None
+
     def __init__(self, **kwargs):
         """Construct a QueryGenerator object.
 
@@ -2440,12 +2569,13 @@ class QueryGenerator(object):
                     elif "pageids" in self.data["query"]:
                         # this ensures that page data will be iterated
                         # in the same order as received from server
-                        resultdata = [resultdata[k]
-                                      for k in self.data["query"]["pageids"]]
+                        resultdata = self._pop_items(
+                            resultdata, self.data["query"]["pageids"])
                     else:
-                        resultdata = [resultdata[k]
-                                      for k in sorted(resultdata.keys())]
-                else:
+                        resultdata = self._pop_items(
+                            resultdata, sorted(resultdata.keys()))
+                elif _api_logger.isEnabledFor(logging.DEBUG):
+                    # formatting all results is expensive for large responses
                     pywikibot.debug(u"%s received %s; limit=%s"
                                     % (self.__class__.__name__,
                                        resultdata,
@@ -2499,6 +2629,23 @@ class QueryGenerator(object):
 
             del self.data  # a new request with (query-)continue is needed
 
+    @staticmethod
+    def _pop_items(data, keys):
+        """
+        Remove and yield the values of data in the order of keys.
+
+        Each entry is dropped from the response when it is handed out, so
+        that it can be freed once the caller has processed it instead of
+        being kept until the complete batch has been iterated.
+
+        @param data: the response entries, like query.pages
+        @type data: dict
+        @param keys: the keys of data in the order in which to yield them
+        @type keys: iterable
+        """
+        for key in keys:
+            yield data.pop(key)
+
     def result(self, data):
         """Process result data as needed for particular subclass."""
         return data
@@ -2555,6 +2702,18 @@ class PageGenerator(QueryGenerator):
 
         self.props = self.request['prop']
 
+    @staticmethod
+    def title_sort_key(page):
+        """
+        Return the key of a page when the pages are sorted by title.
+
+        The titles are compared with underscores like in the database.
+
+        @rtype: tuple
+        """
+        return (page.namespace(),
+                page.title(underscore=True, withNamespace=False))
+
     def result(self, pagedata):
         """Convert page dict entry from api to Page object.
 
@@ -2770,13 +2929,19 @@ def update_page(page, pagedict, props=[]):
         for item in pagedict['protection']:
             page._protection[item['type']] = item['level'], item['expiry']
     if 'revisions' in pagedict:
+        store = page.contents_store
+        if store is not None:
+            revision_class = functools.partial(pywikibot.page.StoredRevision,
+                                               store=store)
+        else:
+            revision_class = pywikibot.page.Revision
         # TODO: T102735: Use the page content model for <1.21
         # TODO: Add rvprop 'contentmodel' to all revisions calls, but only
         # on 1.21+ otherwise it causes API warnings
         for rev in pagedict['revisions']:
             assert 'parentid' in rev, 'parentid missing in revision %r' % rev
 
-            revision = pywikibot.page.Revision(
+            revision = revision_class(
                 revid=rev['revid'],
                 timestamp=pywikibot.Timestamp.fromISOformat(rev['timestamp']),
                 user=rev.get('user', u''),
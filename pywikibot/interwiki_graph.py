@@ -9,8 +9,11 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
+import sqlite3
 import threading
 
+from collections import defaultdict
+
 try:
     import pydot
 except ImportError as e:
@@ -19,6 +22,8 @@ except ImportError as e:
 import pywikibot
 
 from pywikibot import config2 as config
+from pywikibot.data import api
+from pywikibot.tools import itergroup
 
 # deprecated value
 pydotfound = not isinstance(pydot, ImportError)
@@ -115,6 +120,301 @@ class Subject(object):
         self.found_in = value
 
 
+class LanglinksGraph(object):
+
+    """
+    Store of the language links between pages on several sites.
+
+    The pages are stored by their site and page id together with the
+    revision whose language links are stored. The graph is kept in a SQLite
+    database, so it is available to later runs. The connected components
+    of the graph are merged while pages and their links are added and only
+    computed again after links were removed.
+
+    The sites are stored as '<family>:<code>'.
+    """
+
+    def __init__(self, filename=None):
+        """
+        Constructor.
+
+        @param filename: the database file, defaults to langlinks.sqlite3
+            in the data directory. ':memory:' keeps the graph in memory.
+        @type filename: str
+        """
+        if filename is None:
+            filename = config.datafilepath('langlinks.sqlite3')
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                site TEXT NOT NULL, pageid INTEGER NOT NULL,
+                title TEXT NOT NULL, revid INTEGER NOT NULL,
+                PRIMARY KEY (site, pageid));
+            CREATE INDEX IF NOT EXISTS pages_title ON pages (site, title);
+            CREATE TABLE IF NOT EXISTS langlinks (
+                site TEXT NOT NULL, pageid INTEGER NOT NULL,
+                target_site TEXT NOT NULL, target_title TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS langlinks_page
+                ON langlinks (site, pageid);
+            CREATE INDEX IF NOT EXISTS langlinks_target
+                ON langlinks (target_site, target_title);
+            ''')
+        # union-find of (site, pageid) nodes and the members of each root,
+        # which are only built when a component is requested
+        self._parent = None
+        self._members = None
+
+    @staticmethod
+    def siteKey(site):
+        """Return the key of the site in the database."""
+        return '%s:%s' % (site.family.name, site.code)
+
+    @staticmethod
+    def keySite(key):
+        """Return the site of the key in the database."""
+        family, code = key.split(':', 1)
+        return pywikibot.Site(code, family)
+
+    def _find(self, node):
+        self._parent.setdefault(node, node)
+        while self._parent[node] != node:
+            # halve the path while walking to the root
+            self._parent[node] = self._parent[self._parent[node]]
+            node = self._parent[node]
+        return node
+
+    def _union(self, first, second):
+        first, second = self._find(first), self._find(second)
+        if first == second:
+            return
+        firstMembers = self._members.setdefault(first, set([first]))
+        secondMembers = self._members.setdefault(second, set([second]))
+        if len(firstMembers) < len(secondMembers):
+            first, second = second, first
+            firstMembers, secondMembers = secondMembers, firstMembers
+        self._parent[second] = first
+        firstMembers.update(secondMembers)
+        del self._members[second]
+
+    def _build(self):
+        """Compute the connected components of all stored links."""
+        self._parent = {}
+        self._members = {}
+        for row in self.connection.execute('''
+                SELECT l.site, l.pageid, p.site, p.pageid
+                FROM langlinks l JOIN pages p
+                ON p.site = l.target_site AND p.title = l.target_title'''):
+            self._union(row[:2], row[2:])
+
+    def _nodeOf(self, site, title):
+        row = self.connection.execute(
+            'SELECT pageid FROM pages WHERE site = ? AND title = ?',
+            (site, title)).fetchone()
+        return (site, row[0]) if row else None
+
+    def store(self, site, pageid, title, revid, links):
+        """
+        Store a page and replace its language links.
+
+        @param site: the key of the site of the page
+        @type site: str
+        @param links: the (site key, title) pairs of the language links
+        @type links: iterable
+        """
+        node = (site, pageid)
+        links = set(links)
+        with self.lock:
+            old = set(self.connection.execute(
+                '''SELECT target_site, target_title FROM langlinks
+                   WHERE site = ? AND pageid = ?''', node))
+            replaced = self._nodeOf(site, title)
+            if replaced not in (None, node):
+                # the title belonged to another page, e.g. before a move
+                self.remove(site, title)
+            self.connection.execute(
+                'DELETE FROM pages WHERE site = ? AND pageid = ?', node)
+            self.connection.execute(
+                'INSERT INTO pages VALUES (?, ?, ?, ?)',
+                (site, pageid, title, revid))
+            self.connection.execute(
+                'DELETE FROM langlinks WHERE site = ? AND pageid = ?', node)
+            self.connection.executemany(
+                'INSERT INTO langlinks VALUES (?, ?, ?, ?)',
+                [(site, pageid) + link for link in links])
+            if old - links:
+                # links can't be removed from the components
+                self._parent = self._members = None
+            elif self._parent is not None:
+                for target in links - old:
+                    targetNode = self._nodeOf(*target)
+                    if targetNode:
+                        self._union(node, targetNode)
+                # the page may be the target of already stored links
+                for source in self.connection.execute(
+                        '''SELECT site, pageid FROM langlinks
+                           WHERE target_site = ? AND target_title = ?''',
+                        (site, title)).fetchall():
+                    self._union(node, source)
+
+    def update(self, page):
+        """
+        Store a loaded page with its language links.
+
+        The page must have been loaded together with its language links,
+        e.g. by Site.preloadpages(langlinks=True).
+        """
+        self.store(self.siteKey(page.site), page._pageid, page.title(),
+                   page.latest_revision_id,
+                   [(self.siteKey(link.site), link.canonical_title())
+                    for link in page.langlinks(include_obsolete=True)])
+
+    def remove(self, site, title):
+        """Remove the page and its language links from the graph."""
+        with self.lock:
+            node = self._nodeOf(site, title)
+            if node:
+                self.connection.execute(
+                    'DELETE FROM pages WHERE site = ? AND pageid = ?', node)
+                self.connection.execute(
+                    'DELETE FROM langlinks WHERE site = ? AND pageid = ?',
+                    node)
+                self._parent = self._members = None
+
+    def revision(self, site, title):
+        """Return the stored revision id of the page or None."""
+        row = self.connection.execute(
+            'SELECT revid FROM pages WHERE site = ? AND title = ?',
+            (site, title)).fetchone()
+        return row[0] if row else None
+
+    def component(self, page):
+        """
+        Return the pages which are connected to the page by language links.
+
+        These are the stored pages of its connected component and the
+        targets of their links which aren't stored yet.
+
+        @return: (site key, title) pairs
+        @rtype: set
+        """
+        site = self.siteKey(page.site)
+        result = set([(site, page.title())])
+        with self.lock:
+            node = self._nodeOf(site, page.title())
+            if node is None:
+                return result
+            if self._parent is None:
+                self._build()
+            members = self._members.get(self._find(node), set([node]))
+            for member in members:
+                result.update(self.connection.execute(
+                    '''SELECT site, title FROM pages
+                       WHERE site = ? AND pageid = ?''', member))
+                result.update(self.connection.execute(
+                    '''SELECT target_site, target_title FROM langlinks
+                       WHERE site = ? AND pageid = ?''', member))
+        return result
+
+    def componentPages(self, page):
+        """Return the component of the page as Page objects."""
+        return [pywikibot.Page(self.keySite(site), title)
+                for site, title in sorted(self.component(page))]
+
+    def refresh(self, site, titles, step=50):
+        """
+        Update the pages which changed since they were stored.
+
+        The revision ids of the pages are queried first and only the
+        language links of the pages which have a new revision or aren't
+        stored are loaded. Missing pages are removed from the graph.
+
+        @param site: the site of the pages
+        @type site: BaseSite
+        @param titles: the titles of the pages
+        @type titles: iterable of unicode
+        @return: the titles of the loaded or removed pages
+        @rtype: list
+        """
+        key = self.siteKey(site)
+        changed = []
+        for group in itergroup(titles, step):
+            stale = []
+            for pagedata in self._query(site, 'info', group):
+                title = pagedata['title']
+                if 'missing' in pagedata or 'invalid' in pagedata:
+                    self.remove(key, title)
+                    changed.append(title)
+                elif self.revision(key, title) != pagedata['lastrevid']:
+                    stale.append(title)
+            if not stale:
+                continue
+            pages = {}
+            for pagedata in self._query(site, 'info|langlinks', stale,
+                                        lllimit='max'):
+                # the links may be split into several continued responses
+                if pagedata['title'] in pages:
+                    pages[pagedata['title']].setdefault(
+                        'langlinks', []).extend(pagedata.get('langlinks', []))
+                else:
+                    pages[pagedata['title']] = pagedata
+            for title, pagedata in pages.items():
+                links = []
+                for linkdata in pagedata.get('langlinks', []):
+                    link = pywikibot.Link.langlinkUnsafe(
+                        linkdata['lang'], linkdata['*'], source=site)
+                    links.append((self.siteKey(link.site),
+                                  link.canonical_title()))
+                self.store(key, pagedata['pageid'], title,
+                           pagedata['lastrevid'], links)
+                changed.append(title)
+        return changed
+
+    def refreshComponent(self, page):
+        """
+        Update the component of the page and return its pages.
+
+        @rtype: list of Page
+        """
+        return self.refreshComponents([page])[page]
+
+    def refreshComponents(self, pages):
+        """
+        Update the components of several pages and return their pages.
+
+        The pages of all components are refreshed together, so each site is
+        only queried once for up to 50 titles.
+
+        @param pages: the pages whose components are refreshed
+        @type pages: list of Page
+        @return: the pages of the component of each page
+        @rtype: dict
+        """
+        sites = defaultdict(set)
+        for page in pages:
+            for site, title in self.component(page):
+                sites[site].add(title)
+        for site, titles in sorted(sites.items()):
+            self.refresh(self.keySite(site), sorted(titles))
+        return dict((page, self.componentPages(page)) for page in pages)
+
+    @staticmethod
+    def _query(site, props, titles, **kwargs):
+        """Query the properties of the pages."""
+        return api.PropertyGenerator(props, site=site,
+                                     titles='|'.join(titles), **kwargs)
+
+    def save(self):
+        """Commit the changes to the database."""
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        """Save the changes and close the database."""
+        self.save()
+        self.connection.close()
+
+
 class GraphDrawer:
 
     """Graphviz (dot) code creator."""
@@ -26,7 +26,7 @@ import re
 import sys
 import unicodedata
 
-from collections import defaultdict, namedtuple
+from collections import defaultdict, namedtuple, MutableMapping
 from warnings import warn
 
 if sys.version_info[0] > 2:
@@ -56,7 +56,7 @@ from pywikibot.tools import (
     MediaWikiVersion, UnicodeMixin, ComparableMixin, DotReadableDict,
     deprecated, deprecate_arg, deprecated_args, issue_deprecation_warning,
     first_upper, remove_last_args, _NotImplementedWarning,
-    OrderedDict, Counter,
+    OrderedDict, Counter, SpillStore,
 )
 from pywikibot.tools.ip import ip_regexp  # noqa & deprecated
 from pywikibot.tools.ip import is_IP
@@ -141,6 +141,31 @@ class BasePage(UnicodeMixin, ComparableMixin):
         """Return the Site object for the wiki on which this Page resides."""
         return self._link.site
 
+    _default_contents_store = None
+
+    @property
+    def contents_store(self):
+        """
+        Return the store which keeps the revision texts of this page.
+
+        Unless a store has been set for this page, all pages share one
+        SpillStore if config.page_contents_on_disk is enabled.
+
+        @rtype: SpillStore or None
+        """
+        store = getattr(self, '_contents_store', None)
+        if store is None and config.page_contents_on_disk:
+            if BasePage._default_contents_store is None:
+                BasePage._default_contents_store = SpillStore(
+                    config.page_contents_memory)
+            store = BasePage._default_contents_store
+        return store
+
+    @contents_store.setter
+    def contents_store(self, store):
+        """Set the store which keeps the revision texts of this page."""
+        self._contents_store = store
+
     def version(self):
         """Return MediaWiki version number of the page site.
 
@@ -3260,7 +3285,9 @@ class WikibasePage(BasePage):
 
         @param force: override caching
         @type force: bool
-        @param args: may be used to specify custom props.
+        @param args: may be used to specify custom props. The 'info' prop
+            is always added to them as it is needed to determine whether
+            the entity exists.
         """
         lazy_loading_id = not hasattr(self, 'id') and hasattr(self, '_site')
         if force or not hasattr(self, '_content'):
@@ -3268,6 +3295,8 @@ class WikibasePage(BasePage):
             if not identification:
                 raise pywikibot.NoPage(self)
 
+            if args and 'info' not in args:
+                args += ('info', )
             data = self.repo.loadcontent(identification, *args)
             item_index = list(data.keys())[0]
             if lazy_loading_id or item_index != '-1':
@@ -3465,6 +3494,8 @@ class WikibasePage(BasePage):
 
         @param data: Data to be saved
         @type data: dict, or None to save the current content of the entity.
+        @return: the result of the wbeditentity request
+        @rtype: dict
         """
         if hasattr(self, '_revid'):
             baserevid = self.latest_revision_id
@@ -3483,6 +3514,7 @@ class WikibasePage(BasePage):
         lazy_loading_id = not hasattr(self, 'id') and hasattr(self, '_site')
         if lazy_loading_id or self.id == '-1':
             self.__init__(self.site, title=updates['entity']['id'])
+        return updates
 
     def editLabels(self, labels, **kwargs):
         """
@@ -3529,6 +3561,86 @@ class WikibasePage(BasePage):
         raise NotImplementedError
 
 
+class ClaimCollection(MutableMapping):
+
+    """
+    Mapping of property ids to the list of claims of an entity.
+
+    The JSON of the claims returned by the API is only converted into
+    L{Claim} instances when a property is accessed for the first time.
+    Checking whether a property is present and iterating over the
+    property ids does not convert any claim.
+    """
+
+    def __init__(self, repo, data=None, on_item=None):
+        """
+        Constructor.
+
+        @param repo: repository the claims are on
+        @type repo: pywikibot.site.DataSite
+        @param data: JSON of the claims per property id
+        @type data: dict
+        @param on_item: the item the claims are on
+        @type on_item: ItemPage
+        """
+        self.repo = repo
+        self.on_item = on_item
+        self._json = dict(data) if data else {}
+        self._claims = {}
+
+    def __getitem__(self, pid):
+        """Return the claims of the property, converting them if needed."""
+        if pid not in self._claims:
+            claims = []
+            for data in self._json[pid]:
+                claim = Claim.fromJSON(self.repo, data)
+                claim.on_item = self.on_item
+                claims.append(claim)
+            # only forget the JSON after all claims were converted
+            self._claims[pid] = claims
+            del self._json[pid]
+        return self._claims[pid]
+
+    def __setitem__(self, pid, claims):
+        """Set the claims of the property."""
+        self._json.pop(pid, None)
+        self._claims[pid] = claims
+
+    def __delitem__(self, pid):
+        """Remove all claims of the property."""
+        if pid in self._claims:
+            del self._claims[pid]
+        else:
+            del self._json[pid]
+
+    def __contains__(self, pid):
+        """Return whether the property has claims without converting them."""
+        return pid in self._claims or pid in self._json
+
+    def __iter__(self):
+        """Iterate over the property ids."""
+        # Accessing the claims while iterating changes the dicts
+        return iter(list(self._claims) + list(self._json))
+
+    def __len__(self):
+        """Return the number of properties."""
+        return len(self._claims) + len(self._json)
+
+    def __repr__(self):
+        """Return the representation without converting the claims."""
+        return '{0}({1!r})'.format(self.__class__.__name__, list(self))
+
+    def is_loaded(self, pid):
+        """
+        Return whether the claims of the property were already converted.
+
+        @param pid: property id
+        @type pid: str
+        @rtype: bool
+        """
+        return pid in self._claims
+
+
 class ItemPage(WikibasePage):
 
     """Wikibase entity of type 'item'.
@@ -3540,6 +3652,8 @@ class ItemPage(WikibasePage):
     been looked up, the item is then defined by the qid.
     """
 
+    _batch = None
+
     def __init__(self, site, title=None, ns=None):
         """
         Constructor.
@@ -3648,21 +3762,22 @@ class ItemPage(WikibasePage):
         """
         Fetch all item data, and cache it.
 
+        The claims are not decoded into L{Claim} instances until the
+        property is accessed in the L{ClaimCollection} stored in claims.
+
         @param force: override caching
         @type force: bool
-        @param args: values of props
+        @param args: values of props, e.g. 'info', 'claims'. When some
+            are given only those are fetched and cached.
         """
         data = super(ItemPage, self).get(force=force, *args, **kwargs)
 
-        # claims
-        self.claims = {}
-        if 'claims' in self._content:
-            for pid in self._content['claims']:
-                self.claims[pid] = list()
-                for claim in self._content['claims'][pid]:
-                    c = Claim.fromJSON(self.repo, claim)
-                    c.on_item = self
-                    self.claims[pid].append(c)
+        # claims are only decoded when they are accessed, the claims
+        # changed in an active batch are kept until it is saved
+        if force or self._batch is None:
+            self.claims = ClaimCollection(self.repo,
+                                          self._content.get('claims', {}),
+                                          on_item=self)
 
         # sitelinks
         self.sitelinks = {}
@@ -3718,7 +3833,9 @@ class ItemPage(WikibasePage):
                             claim not in diffto_claims[prop]):
                         temp[prop].append(claim)
 
-                    claim_ids.add(claim['id'])
+                    # new claims don't have an id yet
+                    if 'id' in claim:
+                        claim_ids.add(claim['id'])
 
             for prop, prop_claims in diffto_claims.items():
                 for claim in prop_claims:
@@ -3829,6 +3946,11 @@ class ItemPage(WikibasePage):
         @param bot: Whether to flag as bot (if possible)
         @type bot: bool
         """
+        if self._batch is not None:
+            if not bot:
+                kwargs['bot'] = bot
+            self._batch.record('add_claim', claim, **kwargs)
+            return
         self.repo.addClaim(self, claim, bot=bot, **kwargs)
         claim.on_item = self
 
@@ -3843,8 +3965,25 @@ class ItemPage(WikibasePage):
         # list of length one.
         if isinstance(claims, pywikibot.Claim):
             claims = [claims]
+        if self._batch is not None:
+            for claim in claims:
+                self._batch.record('remove_claim', claim, **kwargs)
+            return
         self.repo.removeClaims(claims, **kwargs)
 
+    def batch(self, retries=3, **kwargs):
+        """
+        Return a batch which saves all changes of the item in one edit.
+
+        See L{ItemBatch} for details.
+
+        @param retries: how often the edit is retried after an edit conflict
+        @type retries: int
+        @param kwargs: the arguments for L{editEntity}, e.g. summary or bot
+        @rtype: ItemBatch
+        """
+        return ItemBatch(self, retries, **kwargs)
+
     def mergeInto(self, item, **kwargs):
         """
         Merge the item into another item.
@@ -3960,6 +4099,231 @@ class Property():
             return self.id
 
 
+class ItemBatch(object):
+
+    """
+    Changes of an item which are saved together in one edit.
+
+    While the batch is active, L{ItemPage.addClaim}, L{ItemPage.removeClaims}
+    and the methods of L{Claim} which save a change to the repository only
+    change the local objects. All changes are saved with one wbeditentity
+    request using the revision the item was loaded from as baserevid when
+    the batch ends:
+
+        with item.batch(summary='Import claims'):
+            item.addClaim(claim)
+            claim.addSource(source)
+            claim.addQualifier(qualifier)
+
+    When the edit conflicts with another edit, the item is reloaded, the
+    recorded changes are applied to it again and the edit is retried.
+
+    The keyword arguments of the changes, e.g. summary or bot, are used for
+    the edit. A ValueError is raised when they differ from the arguments of
+    the batch or of another change. When the block raises an exception
+    nothing is saved and the claims of the item are reset to the loaded
+    content.
+    """
+
+    def __init__(self, item, retries=3, **kwargs):
+        """
+        Constructor.
+
+        @param item: the item which is changed
+        @type item: ItemPage
+        @param retries: how often the edit is retried after an edit conflict
+        @type retries: int
+        @param kwargs: the arguments for L{ItemPage.editEntity}
+        """
+        self.item = item
+        self.retries = retries
+        self.kwargs = kwargs
+        self._changes = []
+
+    def __enter__(self):
+        """Start recording the changes of the item."""
+        if self.item._batch is not None:
+            raise pywikibot.Error('{0} has already an active batch'
+                                  .format(self.item))
+        # get() creates new claims, so keep those which were already loaded
+        if not hasattr(self.item, '_content'):
+            self.item.get()
+        self.item._batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Save the changes or discard them if an exception occurred."""
+        self.item._batch = None
+        if exc_type is None:
+            self.save()
+        else:
+            self.rollback()
+
+    def record(self, change, claim, *args, **kwargs):
+        """
+        Apply a change to the local objects and record it.
+
+        @param change: the type of the change, e.g. 'add_claim'
+        @type change: str
+        @param claim: the claim which is added, removed or changed
+        @type claim: Claim
+        @param kwargs: the arguments of the change for the edit
+        @raise ValueError: an argument differs from the one already used
+        """
+        for key, value in kwargs.items():
+            if self.kwargs.setdefault(key, value) != value:
+                raise ValueError(
+                    'The argument {0}={1!r} differs from {0}={2!r} used by '
+                    'the batch'.format(key, value, self.kwargs[key]))
+        getattr(self, '_' + change)(claim, *args)
+        self._changes.append((change, claim, args))
+
+    def rollback(self):
+        """Discard the changes and reset the claims to the loaded content."""
+        self._changes = []
+        self.item.claims = ClaimCollection(self.item.repo,
+                                           self.item._content.get('claims'),
+                                           on_item=self.item)
+
+    def _add_claim(self, claim):
+        claim.on_item = self.item
+        if claim.getID() in self.item.claims:
+            self.item.claims[claim.getID()].append(claim)
+        else:
+            self.item.claims[claim.getID()] = [claim]
+
+    def _remove_claim(self, claim):
+        self.item.claims[claim.getID()].remove(claim)
+
+    def _change_target(self, claim, value, snaktype):
+        if value:
+            claim.setTarget(value)
+        claim.setSnakType(snaktype)
+
+    def _change_rank(self, claim, rank):
+        claim.rank = rank
+
+    def _add_sources(self, claim, sources):
+        source = defaultdict(list)
+        for source_claim in sources:
+            source[source_claim.getID()].append(source_claim)
+        claim.sources.append(source)
+
+    def _remove_sources(self, claim, sources):
+        # sources added in this batch have no hash yet
+        hashes = set(source.hash for source in sources
+                     if source.hash is not None)
+        unsaved = set(id(source) for source in sources if source.hash is None)
+        claim.sources = [source for source in claim.sources
+                         if not any(source_claim.hash in hashes or
+                                    id(source_claim) in unsaved
+                                    for source_claims in source.values()
+                                    for source_claim in source_claims)]
+
+    def _add_qualifier(self, claim, qualifier):
+        qualifier.isQualifier = True
+        if qualifier.getID() in claim.qualifiers:
+            claim.qualifiers[qualifier.getID()].append(qualifier)
+        else:
+            claim.qualifiers[qualifier.getID()] = [qualifier]
+
+    @staticmethod
+    def _find(claims, claim):
+        """Return the claim with the same id as the given claim."""
+        for other in claims:
+            if other.snak == claim.snak:
+                return other
+        return None
+
+    def _reapply(self):
+        """Reload the item and apply the recorded changes again."""
+        self.item.get(force=True)
+        for change, claim, args in self._changes:
+            if change != 'add_claim':
+                if claim.snak is None:
+                    # the claim was added in this batch and already
+                    # contains the change
+                    continue
+                current = self._find(self.item.claims.get(claim.getID(), []),
+                                     claim)
+                if current is None:
+                    if change == 'remove_claim':
+                        continue
+                    raise pywikibot.EditConflict(self.item)
+                claim = current
+            getattr(self, '_' + change)(claim, *args)
+
+    def _merge_entity(self, entity, data):
+        """
+        Merge the entity returned by wbeditentity into the item content.
+
+        @param entity: the entity returned by the API
+        @type entity: dict
+        @param data: the data which was saved
+        @type data: dict
+        """
+        content = self.item._content
+        for key, value in entity.items():
+            if isinstance(value, dict) and isinstance(content.get(key), dict):
+                content[key].update(value)
+            else:
+                content[key] = value
+        # the properties whose claims were all removed are not returned
+        claims = content.get('claims')
+        if isinstance(claims, dict):
+            for pid in data.get('claims', {}):
+                if not (entity.get('claims') or {}).get(pid):
+                    claims.pop(pid, None)
+
+    def _update_claims(self, claims):
+        """Set the ids and hashes of the claims from the saved entity."""
+        for pid, claims_data in claims.items():
+            if not self.item.claims.is_loaded(pid):
+                continue
+            local_claims = self.item.claims[pid]
+            if len(local_claims) != len(claims_data):
+                continue
+            for claim, data in zip(local_claims, claims_data):
+                claim.snak = data['id']
+                for source, reference in zip(claim.sources,
+                                             data.get('references', [])):
+                    for source_claims in source.values():
+                        for source_claim in source_claims:
+                            source_claim.hash = reference['hash']
+                qualifiers = data.get('qualifiers', {})
+                for prop, prop_qualifiers in claim.qualifiers.items():
+                    for qualifier, qualifier_data in zip(
+                            prop_qualifiers, qualifiers.get(prop, [])):
+                        qualifier.hash = qualifier_data['hash']
+
+    def save(self):
+        """
+        Save the changes in one edit.
+
+        @raise EditConflict: the edit conflicted more often than retries
+            allowed or a changed claim was removed by another edit
+        """
+        for attempt in range(self.retries + 1):
+            data = self.item.toJSON(diffto=self.item._content)
+            if not data:
+                break
+            try:
+                updates = self.item.editEntity(data, **self.kwargs)
+            except pywikibot.data.api.APIError as e:
+                if e.code != 'editconflict':
+                    raise
+                if attempt == self.retries:
+                    raise pywikibot.EditConflict(self.item)
+                pywikibot.log('Edit conflict while saving {0}, retrying'
+                              .format(self.item))
+                self._reapply()
+            else:
+                self._merge_entity(updates['entity'], data)
+                self._update_claims(updates['entity'].get('claims') or {})
+                break
+        self._changes = []
+
+
 class PropertyPage(WikibasePage, Property):
 
     """
@@ -4178,6 +4542,11 @@ class Claim(Property):
                     data['references'].append(reference)
         return data
 
+    @property
+    def _batch(self):
+        """Return the active batch of the item the claim is on."""
+        return getattr(self.on_item, '_batch', None)
+
     def setTarget(self, value):
         """
         Set the target value in the local object.
@@ -4203,6 +4572,10 @@ class Claim(Property):
         @param snaktype: The new snak type.
         @type snaktype: str ('value', 'somevalue', or 'novalue')
         """
+        if self._batch is not None:
+            self._batch.record('change_target', self, value, snaktype,
+                               **kwargs)
+            return
         if value:
             self.setTarget(value)
 
@@ -4251,6 +4624,9 @@ class Claim(Property):
 
     def changeRank(self, rank):
         """Change the rank of the Claim and save."""
+        if self._batch is not None:
+            self._batch.record('change_rank', self, rank)
+            return
         self.rank = rank
         return self.repo.save_claim(self)
 
@@ -4288,6 +4664,9 @@ class Claim(Property):
         @param claims: the claims to add
         @type claims: list of pywikibot.Claim
         """
+        if self._batch is not None:
+            self._batch.record('add_sources', self, claims, **kwargs)
+            return
         data = self.repo.editSource(self, claims, new=True, **kwargs)
         source = defaultdict(list)
         for claim in claims:
@@ -4312,6 +4691,9 @@ class Claim(Property):
         @param sources: the sources to remove
         @type sources: list of pywikibot.Claim
         """
+        if self._batch is not None:
+            self._batch.record('remove_sources', self, sources, **kwargs)
+            return
         self.repo.removeSources(self, sources, **kwargs)
         for source in sources:
             source_dict = defaultdict(list)
@@ -4324,6 +4706,9 @@ class Claim(Property):
         @param qualifier: the qualifier to add
         @type qualifier: Claim
         """
+        if self._batch is not None:
+            self._batch.record('add_qualifier', self, qualifier, **kwargs)
+            return
         data = self.repo.editQualifier(self, qualifier, **kwargs)
         qualifier.isQualifier = True
         self.on_item.latest_revision_id = data['pageinfo']['lastrevid']
@@ -4529,6 +4914,52 @@ class Revision(DotReadableDict):
                                       self.text, self.rollbacktoken)
 
 
+class StoredRevision(Revision):
+
+    """
+    A revision which keeps its text in a store.
+
+    The text is only held by the store, which may write it to disk when it
+    isn't used. It is removed from the store when the revision is deleted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Constructor.
+
+        @param store: the store of the text
+        @type store: SpillStore
+        @see: L{Revision}
+        """
+        self._store = kwargs.pop('store')
+        self._key = None
+        super(StoredRevision, self).__init__(*args, **kwargs)
+
+    @property
+    def text(self):
+        """Return the revision wikitext."""
+        if self._key is None:
+            return None
+        return self._store.get(self._key)
+
+    @text.setter
+    def text(self, value):
+        """Store the revision wikitext."""
+        if self._key is not None:
+            self._store.remove(self._key)
+            self._key = None
+        if value is not None:
+            self._key = self._store.add(value)
+
+    def __del__(self):
+        """Remove the text from the store."""
+        try:
+            self.text = None
+        except Exception:
+            # the store may already be closed when the program exits
+            pass
+
+
 class FileInfo(DotReadableDict):
 
     """A structure holding imageinfo of latest rev. of FilePage.
@@ -4589,6 +5020,11 @@ class Link(ComparableMixin):
         u'|&#x[0-9A-Fa-f]+;'
     )
 
+    # Matches link texts which the title normalisation in the constructor
+    # could change: anything but printable ASCII without '%', '&' and '_',
+    # consecutive spaces or spaces at either end.
+    _unnormalized_title_pattern = re.compile(r"[^ -$'-^`-~]|  |^ | $")
+
     def __init__(self, text, source=None, defaultNamespace=0):
         """Constructor.
 
@@ -4623,6 +5059,12 @@ class Link(ComparableMixin):
         else:
             self._anchor = None
 
+        if not Link._unnormalized_title_pattern.search(self._text):
+            # Fast path: the text is already normalised
+            if source_is_page:
+                self._text = source.title(withSection=False) + self._text
+            return
+
         # Convert URL-encoded characters to unicode
         encodings = [self._source.encoding()] + list(self._source.encodings())
 
@@ -4687,21 +5129,19 @@ class Link(ComparableMixin):
                 t = t.lstrip(u":").lstrip(u" ")
                 continue
             prefix = t[:t.index(u":")].lower()  # part of text before :
-            ns = self._source.ns_index(prefix)
-            if ns:
+            if self._source._link_prefix(prefix, interwiki=False):
                 # The prefix is a namespace in the source wiki
                 return (fam.name, code)
             if prefix in fam.langs:
                 # prefix is a language code within the source wiki family
                 return (fam.name, prefix)
             try:
-                newsite = self._source.interwiki(prefix)
-            except KeyError:
-                break  # text before : doesn't match any known prefix
+                newsite = self._source._link_prefix(prefix)
             except SiteDefinitionError:
                 return (None, None)
-            else:
-                return (newsite.family.name, newsite.code)
+            if newsite is None:
+                break  # text before : doesn't match any known prefix
+            return (newsite.family.name, newsite.code)
         return (fam.name, code)  # text before : doesn't match any known prefix
 
     def parse(self):
@@ -4728,22 +5168,21 @@ class Link(ComparableMixin):
                 continue
 
             prefix = t[:t.index(u":")].lower()
-            ns = self._site.ns_index(prefix)
-            if ns:
-                # Ordinary namespace
-                t = t[t.index(u":"):].lstrip(u":").lstrip(u" ")
-                self._namespace = ns
-                ns_prefix = True
-                break
             try:
-                newsite = self._site.interwiki(prefix)
-            except KeyError:
-                break  # text before : doesn't match any known prefix
+                newsite = self._site._link_prefix(prefix)
             except SiteDefinitionError as e:
                 raise SiteDefinitionError(
                     u'{0} is not a local page on {1}, and the interwiki prefix '
                     '{2} is not supported by PyWikiBot!:\n{3}'.format(
                     self._text, self._site, prefix, e))
+            if newsite is None:
+                break  # text before : doesn't match any known prefix
+            elif isinstance(newsite, Namespace):
+                # Ordinary namespace
+                t = t[t.index(u":"):].lstrip(u":").lstrip(u" ")
+                self._namespace = newsite
+                ns_prefix = True
+                break
             else:
                 t = t[t.index(u":"):].lstrip(u":").lstrip(u" ")
                 if first_other_site:
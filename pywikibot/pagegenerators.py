@@ -26,6 +26,8 @@ __version__ = '$Id$'
 import codecs
 import datetime
 import itertools
+import json
+import os
 import re
 import sys
 import time
@@ -41,6 +43,11 @@ from pywikibot.tools import (
     DequeGenerator,
     intersect_generators,
     filter_unique,
+    issue_deprecation_warning,
+    BloomFilter,
+    HashedSet,
+    IntegerSet,
+    OrderedDict,
 )
 
 from pywikibot import date, config, i18n
@@ -51,6 +58,7 @@ from pywikibot.site import Namespace
 
 if sys.version_info[0] > 2:
     basestring = (str, )
+    unicode = str
 
 _logger = "pagegenerators"
 
@@ -143,6 +151,11 @@ parameterHelp = u"""\
 -liverecentchanges Work on pages from the live recent changes feed. If used as
                   -liverecentchanges:x, work on x recent changes.
 
+-rcfeed           Work on the pages changed since the last run, following
+                  the recent changes. The position in the recent changes is
+                  stored in a file, which is rcfeed-<family>-<code>.json in
+                  the data directory or can be given as -rcfeed:filename.
+
 -imagesused       Work on all images that contained on a certain page.
                   Argument can also be given as "-imagesused:linkingpagetitle".
 
@@ -270,6 +283,8 @@ parameterHelp = u"""\
                   For usage and examples, see -onlyif above.
 
 -intersect        Work on the intersection of all the provided generators.
+                  If all generators are sorted by title, like -start and
+                  -prefixindex, no pages need to be remembered.
 """
 
 docuReplacements = {'&params;': parameterHelp}
@@ -293,9 +308,11 @@ class GeneratorFactory(object):
     """
 
     # This is the function that will be used to de-duplicate iterators.
-    # See the documentation in L{pywikibot.tools.filter_unique} for reasons
-    # why this should be changed to improve space and time of execution.
-    _filter_unique = staticmethod(filter_unique)
+    # The seen pages are remembered as configured by config.dedupe_mode.
+    @staticmethod
+    def _filter_unique(iterable):
+        return DuplicateFilterPageGenerator(iterable)
+
     # The seen list can not yet be shared at present, due to `intersect` mode
     # not being known until after all generators have been created.
     # When not in intersect mode, _filter_unique could be:
@@ -358,6 +375,27 @@ class GeneratorFactory(object):
                 Namespace.resolve(self._namespaces, self.site.namespaces))
         return self._namespaces
 
+    @staticmethod
+    def _intersect_generators(gens):
+        """
+        Return the intersection of the generators.
+
+        When all generators are from the same site and sorted by the same
+        key, e.g. allpages, they are intersected by a merge join. Otherwise
+        only the titles of the pages are remembered.
+
+        @param gens: the page generators
+        @type gens: list
+        """
+        sort_keys = set(getattr(gen, 'sort_key', None) for gen in gens)
+        sites = set(getattr(gen, 'site', None) for gen in gens)
+        if len(sort_keys) == 1 and None not in sort_keys and len(sites) == 1:
+            pywikibot.debug('Intersecting sorted generators by a merge join',
+                            _logger)
+            return intersect_generators(gens, key=sort_keys.pop(),
+                                        sorted_by_key=True)
+        return intersect_generators(gens, key=unicode)
+
     def getCombinedGenerator(self, gen=None):
         """Return the combination of all accumulated generators.
 
@@ -391,7 +429,7 @@ class GeneratorFactory(object):
                     '"-intersect" ignored as only one generator is specified.')
         else:
             if self.intersect:
-                gensList = intersect_generators(self.gens)
+                gensList = self._intersect_generators(self.gens)
                 # By definition no duplicates are possible.
                 dupfiltergen = gensList
             else:
@@ -554,6 +592,15 @@ class GeneratorFactory(object):
                 gen = LiveRCPageGenerator(self.site, total=int(arg[19:]))
             else:
                 gen = LiveRCPageGenerator(self.site)
+        elif arg.startswith('-rcfeed'):
+            filename = arg[8:]
+            if not filename:
+                filename = config.datafilepath(
+                    'rcfeed-%s-%s.json' % (self.site.family.name,
+                                           self.site.code))
+            gen = IncrementalRCPageGenerator(
+                self.site, checkpoint=RecentChangesCheckpoint(filename),
+                namespaces=self.namespaces)
         elif arg.startswith('-file'):
             textfilename = arg[6:]
             if not textfilename:
@@ -1274,7 +1321,90 @@ def RedirectFilterPageGenerator(generator, no_redirects=True,
                                  % page)
 
 
-DuplicateFilterPageGenerator = filter_unique
+class PageIdSet(object):
+
+    """
+    Set of pages which stores the page ids.
+
+    The page ids are stored in an L{IntegerSet} for each site. A hash of the
+    title is stored for pages whose page id is not known, like pages which
+    don't exist. A page therefore is only found if its page id was either
+    known or unknown both times.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._ids = {}
+        self._titles = HashedSet()
+
+    def add(self, page):
+        """Add a page."""
+        pageid = getattr(page, '_pageid', 0)
+        if pageid:
+            if page.site not in self._ids:
+                self._ids[page.site] = IntegerSet()
+            self._ids[page.site].add(pageid)
+        else:
+            self._titles.add(page)
+
+    def __contains__(self, page):
+        """Return whether the page was added."""
+        pageid = getattr(page, '_pageid', 0)
+        if pageid:
+            return page.site in self._ids and pageid in self._ids[page.site]
+        return page in self._titles
+
+
+def seen_pages_container(mode=None):
+    """
+    Return a new container for the pages seen by a generator.
+
+    @param mode: 'exact', 'hash', 'pageid' or 'bloom', see config.dedupe_mode
+        which is the default
+    @type mode: str
+    @return: the container or None for the default of
+        L{pywikibot.tools.filter_unique}
+    @rtype: object or None
+    """
+    if mode is None:
+        mode = config.dedupe_mode
+    if mode == 'exact':
+        return None
+    elif mode == 'hash':
+        return HashedSet()
+    elif mode == 'pageid':
+        return PageIdSet()
+    elif mode == 'bloom':
+        return BloomFilter(config.dedupe_bloom_capacity,
+                           config.dedupe_bloom_error_rate)
+    raise ValueError('Unknown mode "{0}" to remember seen pages'.format(mode))
+
+
+def DuplicateFilterPageGenerator(generator, container=None, key=None,
+                                 add=None, **kwargs):
+    """
+    Yield each page of the generator only once.
+
+    The arguments except mode are those of
+    L{pywikibot.tools.filter_unique}.
+
+    @param generator: pages to iterate over
+    @kwarg mode: how the seen pages are remembered when neither container
+        nor key are given, see L{seen_pages_container}
+    @type mode: str
+    """
+    mode = kwargs.pop('mode', None)
+    if kwargs:
+        raise TypeError('DuplicateFilterPageGenerator got unexpected keyword '
+                        'arguments: {0}'.format(', '.join(sorted(kwargs))))
+    if isinstance(container, basestring):
+        issue_deprecation_warning('Mode as positional argument', 'mode=', 2)
+        container, mode = None, container
+    if container is None and key is None:
+        container = seen_pages_container(mode)
+    elif mode is not None:
+        raise ValueError('mode can only be used without container and key')
+    return filter_unique(generator, container=container, key=key, add=add)
 
 
 class ItemClaimFilter(object):
@@ -1615,7 +1745,7 @@ def DequePreloadingGenerator(generator, step=50):
             yield page
 
 
-def PreloadingItemGenerator(generator, step=50):
+def PreloadingItemGenerator(generator, step=50, props=None):
     """
     Yield preloaded pages taken from another generator.
 
@@ -1624,6 +1754,8 @@ def PreloadingItemGenerator(generator, step=50):
     @param generator: pages to iterate over
     @param step: how many pages to preload at once
     @type step: int
+    @param props: the parts of the items to fetch, all when it's None
+    @type props: iterable of str or None
     """
     sites = {}
     for page in generator:
@@ -1643,12 +1775,12 @@ def PreloadingItemGenerator(generator, step=50):
             # if this site is at the step, process it
             group = sites[site]
             sites[site] = []
-            for i in site.preloaditempages(group, step):
+            for i in site.preloaditempages(group, step, props):
                 yield i
     for site in sites:
         if sites[site]:
             # process any leftover sites that never reached the step
-            for i in site.preloaditempages(sites[site], step):
+            for i in site.preloaditempages(sites[site], step, props):
                 yield i
 
 
@@ -2067,6 +2199,147 @@ def LiveRCPageGenerator(site=None, total=None):
         yield page
 
 
+class RecentChangesCheckpoint(object):
+
+    """
+    Position in the recent changes which is stored in a file.
+
+    The position is the id and the timestamp of the last processed change.
+    """
+
+    def __init__(self, filename=None):
+        """
+        Constructor.
+
+        @param filename: the file of the position. If None, the position is
+            only kept in memory.
+        @type filename: str
+        """
+        self.filename = filename
+        self.rcid = None
+        self.timestamp = None
+        if filename and os.path.exists(filename):
+            with codecs.open(filename, 'r', 'utf-8') as f:
+                data = json.load(f)
+            self.rcid = data['rcid']
+            self.timestamp = data['timestamp']
+
+    def update(self, entry):
+        """Move the position to the recent changes entry."""
+        self.rcid = entry['rcid']
+        self.timestamp = entry['timestamp']
+
+    def save(self):
+        """Write the position to the file."""
+        if not self.filename:
+            return
+        # replace the file at once, so it is never half written
+        temp = self.filename + '.tmp'
+        with codecs.open(temp, 'w', 'utf-8') as f:
+            json.dump({'rcid': self.rcid, 'timestamp': self.timestamp}, f)
+        try:
+            os.rename(temp, self.filename)
+        except OSError:
+            # Windows doesn't replace an existing file
+            os.remove(self.filename)
+            os.rename(temp, self.filename)
+
+
+def IncrementalRCPageGenerator(site=None, checkpoint=None, namespaces=None,
+                               step=500, sleep_duration=60, preload=False,
+                               total=None, **kwargs):
+    """
+    Yield the pages changed after a position in the recent changes.
+
+    The recent changes after the checkpoint are queried in batches of step
+    changes. The changes of a batch to the same page are combined, so each
+    page is yielded once for the latest of these changes, which is stored
+    in its ._rcinfo property. Once the pages of a batch were processed,
+    i.e. the next page is requested, the checkpoint is moved behind them
+    and saved. If the bot stops before, the pages are yielded again by a
+    generator resuming from the same checkpoint.
+
+    If the checkpoint has no position yet, it starts at the newest change.
+    If there are no new changes the generator waits sleep_duration seconds
+    before querying again. When more than step changes have the timestamp
+    of the checkpoint, the size of the batch is doubled until it reaches
+    the changes after them.
+
+    Other parameters are passed to site.recentchanges().
+
+    @param site: site to return recent changes for
+    @type site: pywikibot.BaseSite
+    @param checkpoint: the position in the recent changes
+    @type checkpoint: RecentChangesCheckpoint
+    @param step: the number of changes queried at once
+    @type step: int
+    @param preload: whether to preload the pages of a batch
+    @type preload: bool
+    @param total: the maximum number of pages to return. Otherwise, iterate
+        forever.
+    @type total: int or None
+    """
+    if site is None:
+        site = pywikibot.Site()
+    if checkpoint is None:
+        checkpoint = RecentChangesCheckpoint()
+    for name in ('start', 'end', 'reverse'):
+        kwargs.pop(name, None)
+
+    if checkpoint.rcid is None:
+        for entry in site.recentchanges(total=1):
+            checkpoint.update(entry)
+            checkpoint.save()
+
+    count = 0
+    batch = step
+    while total is None or count < total:
+        changes = OrderedDict()
+        last = None
+        query = 0
+        for entry in site.recentchanges(start=checkpoint.timestamp,
+                                        reverse=True, namespaces=namespaces,
+                                        total=batch, **kwargs):
+            query += 1
+            # several changes may have the timestamp of the checkpoint
+            if (entry['timestamp'] == checkpoint.timestamp and
+                    checkpoint.rcid and entry['rcid'] <= checkpoint.rcid):
+                continue
+            title = entry.get('title')
+            if (total is not None and title not in changes and
+                    count + len(changes) == total):
+                break
+            last = entry
+            # the title in a log entry may have been suppressed
+            if title is not None:
+                # the page is moved behind the later changes
+                changes.pop(title, None)
+                changes[title] = entry
+
+        pages = []
+        for title, entry in changes.items():
+            page = pywikibot.Page(site, title)
+            page._rcinfo = entry
+            pages.append(page)
+        if preload and pages:
+            pages = site.preloadpages(pages, groupsize=min(len(pages), 50))
+        for page in pages:
+            count += 1
+            yield page
+
+        if last is not None:
+            if last['timestamp'] != checkpoint.timestamp:
+                batch = step
+            checkpoint.update(last)
+            checkpoint.save()
+        elif query == batch:
+            # all changes of the batch were processed before
+            batch *= 2
+            continue
+        if query < batch and (total is None or count < total):
+            time.sleep(sleep_duration)
+
+
 # following classes just ported from version 1 without revision; not tested
 
 
@@ -16,6 +16,7 @@ __version__ = '$Id$'
 #
 
 import datetime
+import hashlib
 import itertools
 import os
 import re
@@ -571,6 +572,9 @@ class BaseSite(ComparableMixin):
         self._pagemutex = threading.Lock()
         self._locked_pages = []
 
+        # memo of link prefixes, see _link_prefix
+        self._link_prefixes = (None, None, {})
+
     @deprecated
     def has_api(self):
         """Return whether this site has an API."""
@@ -657,12 +661,14 @@ class BaseSite(ComparableMixin):
         # site cache contains exception information, which cant be pickled
         if '_iw_sites' in new:
             del new['_iw_sites']
+        del new['_link_prefixes']
         return new
 
     def __setstate__(self, attrs):
         """Restore things removed in __getstate__."""
         self.__dict__.update(attrs)
         self._pagemutex = threading.Lock()
+        self._link_prefixes = (None, None, {})
 
     def user(self):
         """Return the currently-logged in bot user, or None."""
@@ -787,6 +793,49 @@ class BaseSite(ComparableMixin):
         self.interwiki(prefix)
         return self._iw_sites[prefix][1]
 
+    def _link_prefix(self, prefix, interwiki=True):
+        """
+        Return the namespace or site which a link prefix refers to.
+
+        The result is memoized per site. The memo is discarded when the
+        namespaces or the interwiki map of this site are replaced.
+
+        @param prefix: lowercase text before the first colon of a link
+        @type prefix: unicode
+        @param interwiki: look up the prefix in the interwiki map if it is
+            not a namespace
+        @type interwiki: bool
+        @return: the namespace on this site or the site of the interwiki
+            prefix, or None if the prefix is neither
+        @rtype: Namespace, BaseSite or None
+        @raise SiteDefinitionError: if the url given in the interwiki table
+            doesn't match any of the existing families.
+        """
+        namespaces = self.namespaces
+        # _iw_sites is looked up directly to bypass __getattr__
+        iw_sites = self.__dict__.get('_iw_sites')
+        if (self._link_prefixes[0] is not namespaces or
+                self._link_prefixes[1] is not iw_sites):
+            self._link_prefixes = (namespaces, iw_sites, {})
+        memo = self._link_prefixes[2]
+
+        # the second item stays False until the interwiki map was consulted
+        if prefix not in memo:
+            memo[prefix] = [self.ns_index(prefix), False]
+        entry = memo[prefix]
+        if entry[0] or not interwiki:
+            return entry[0]
+
+        if entry[1] is False:
+            try:
+                entry[1] = self.interwiki(prefix)
+            except KeyError:
+                entry[1] = None
+            # The interwiki map may have been loaded just now
+            self._link_prefixes = (namespaces,
+                                   self.__dict__.get('_iw_sites'), memo)
+        return entry[1]
+
     def ns_index(self, namespace):
         """
         Return the Namespace for a given namespace name.
@@ -1527,6 +1576,69 @@ class TokenWallet(object):
         return self._tokens.__repr__()
 
 
+class ChunkedUploadState(object):
+
+    """
+    Progress of chunked uploads which is stored in a file.
+
+    For each upload the file key of the stash, the number of uploaded bytes
+    and their SHA-1 checksum are stored, so an interrupted upload can be
+    continued after it is verified that the file didn't change.
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        @param filename: the JSON file of the state
+        @type filename: str
+        """
+        self.filename = filename
+        self._uploads = {}
+        if os.path.exists(filename):
+            with open(filename) as f:
+                self._uploads = json.load(f)
+
+    @staticmethod
+    def _key(site, title):
+        return '%s:%s:%s' % (site.family.name, site.code, title)
+
+    def get(self, site, title):
+        """
+        Return the progress of the upload to the file title on site.
+
+        @return: dict with the keys filekey, offset, sha1 and filesize or
+            None if there is no unfinished upload
+        @rtype: dict
+        """
+        return self._uploads.get(self._key(site, title))
+
+    def set(self, site, title, filekey, offset, sha1, filesize):
+        """Store the progress of an upload."""
+        self._uploads[self._key(site, title)] = {
+            'filekey': filekey, 'offset': offset, 'sha1': sha1,
+            'filesize': filesize}
+        self.save()
+
+    def remove(self, site, title):
+        """Forget an upload."""
+        if self._uploads.pop(self._key(site, title), None):
+            self.save()
+
+    def save(self):
+        """Write the state to the file."""
+        # replace the file at once, so it is never half written
+        temp = self.filename + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self._uploads, f)
+        try:
+            os.rename(temp, self.filename)
+        except OSError:
+            # Windows doesn't replace an existing file
+            os.remove(self.filename)
+            os.rename(temp, self.filename)
+
+
 class NonMWAPISite(BaseSite):
 
     """API interface to non MediaWiki sites."""
@@ -3572,6 +3684,8 @@ class APISite(BaseSite):
                 apgen.request["gapprlevel"] = protect_level
         if reverse:
             apgen.request["gapdir"] = "descending"
+        else:
+            apgen.sort_key = api.PageGenerator.title_sort_key
         return apgen
 
     @deprecated("Site.allpages()")
@@ -3644,6 +3758,8 @@ class APISite(BaseSite):
             acgen.request["gacprefix"] = prefix
         if reverse:
             acgen.request["gacdir"] = "descending"
+        else:
+            acgen.sort_key = api.PageGenerator.title_sort_key
         return acgen
 
     @deprecated("Site.allcategories()")
@@ -5064,7 +5180,7 @@ class APISite(BaseSite):
     @deprecate_arg('imagepage', 'filepage')
     def upload(self, filepage, source_filename=None, source_url=None,
                comment=None, text=None, watch=False, ignore_warnings=False,
-               chunk_size=0, _file_key=None, _offset=0):
+               chunk_size=0, upload_state=None, _file_key=None, _offset=0):
         """Upload a file to the wiki.
 
         Either source_filename or source_url, but not both, must be provided.
@@ -5085,7 +5201,12 @@ class APISite(BaseSite):
             U{https://www.mediawiki.org/wiki/API:Upload#Chunked_uploading}). It
             will only upload in chunks, if the version number is 1.20 or higher
             and the chunk size is positive but lower than the file size.
+            The chunks get smaller if uploading one takes longer than
+            config.upload_chunk_time seconds.
         @type chunk_size: int
+        @param upload_state: stores the progress of a chunked upload, so it
+            can be continued if it was interrupted.
+        @type upload_state: ChunkedUploadState
         @param _file_key: Reuses an already uploaded file using the filekey. If
             None (default) it will upload the file.
         @type _file_key: str or None
@@ -5130,6 +5251,8 @@ class APISite(BaseSite):
             text = comment
         token = self.tokens['edit']
         result = None
+        # the file which is streamed into the final request
+        upload_file = None
         file_page_title = filepage.title(withNamespace=False)
         if _file_key and _offset is False:
             pywikibot.log('Reused already upload file using '
@@ -5158,12 +5281,32 @@ class APISite(BaseSite):
                         'filename': file_page_title, 'comment': comment})
                 if chunked_upload:
                     offset = _offset
+                    saved = None
+                    if upload_state is not None and not _file_key:
+                        saved = upload_state.get(self, file_page_title)
+                        if saved and saved['filesize'] == filesize:
+                            _file_key = saved['filekey']
+                            offset = saved['offset']
+                        else:
+                            saved = None
+                    # checksum of the uploaded part of the file
+                    sha1 = hashlib.sha1()
+                    f.seek(0)
+                    while f.tell() < offset:
+                        sha1.update(f.read(min(offset - f.tell(), 1 << 20)))
+                    if saved and sha1.hexdigest() != saved['sha1']:
+                        pywikibot.warning('The file changed since the upload '
+                                          'was interrupted; starting again.')
+                        saved = _file_key = None
+                        offset = 0
+                        sha1 = hashlib.sha1()
                     if offset > 0:
                         pywikibot.log('Continuing upload from byte '
                                       '{0}'.format(offset))
+                    size = chunk_size
                     while True:
                         f.seek(offset)
-                        chunk = f.read(chunk_size)
+                        chunk = f.read(size)
                         req = self._request(
                             throttle=throttle, mime=True,
                             parameters={
@@ -5179,6 +5322,7 @@ class APISite(BaseSite):
                                                     {'filename': mime_filename})
                         if _file_key:
                             req['filekey'] = _file_key
+                        start = time.time()
                         try:
                             data = req.submit()['upload']
                             self._uploaddisabled = False
@@ -5186,7 +5330,19 @@ class APISite(BaseSite):
                             # TODO: catch and process foreseeable errors
                             if error.code == u'uploaddisabled':
                                 self._uploaddisabled = True
+                            elif saved:
+                                # the stash may have expired meanwhile
+                                pywikibot.warning(
+                                    'Continuing the upload failed ({0}); '
+                                    'starting again.'.format(error.code))
+                                upload_state.remove(self, file_page_title)
+                                saved = _file_key = None
+                                offset = 0
+                                sha1 = hashlib.sha1()
+                                continue
                             raise error
+                        elapsed = time.time() - start
+                        saved = None
                         if 'warnings' in data and not ignore_warnings:
                             result = data
                             if 'offset' not in result:
@@ -5202,6 +5358,8 @@ class APISite(BaseSite):
                                               '{2}'.format(offset, new_offset,
                                                            len(chunk)))
                                 pywikibot.warning('Unexpected offset.')
+                                # the checksum doesn't match the offset
+                                sha1 = None
                             offset = new_offset
                         else:
                             pywikibot.warning('Offset was not supplied.')
@@ -5209,13 +5367,32 @@ class APISite(BaseSite):
                         if data['result'] != 'Continue':  # finished
                             pywikibot.log('Finished uploading last chunk.')
                             final_request['filekey'] = _file_key
+                            if upload_state is not None:
+                                upload_state.remove(self, file_page_title)
                             break
+                        if sha1 is not None:
+                            sha1.update(chunk)
+                            if upload_state is not None:
+                                upload_state.set(self, file_page_title,
+                                                 _file_key, offset,
+                                                 sha1.hexdigest(), filesize)
+                        elif upload_state is not None:
+                            upload_state.remove(self, file_page_title)
+                        chunk_time = pywikibot.config.upload_chunk_time
+                        if chunk_time and elapsed > 0:
+                            # aim at the configured time per chunk, changing
+                            # the size by a factor of two at most
+                            target = int(size * chunk_time / elapsed)
+                            size = max(size // 2, min(size * 2, target))
+                            size = max(min(chunk_size, 1 << 16),
+                                       min(chunk_size, size))
                 else:  # not chunked upload
-                    file_contents = f.read()
+                    # the request body reads the file while it is sent
+                    upload_file = open(source_filename, 'rb')
                     filetype = (mimetypes.guess_type(source_filename)[0] or
                                 'application/octet-stream')
                     final_request.mime_params = {
-                        'file': (file_contents, filetype.split('/'),
+                        'file': (upload_file, filetype.split('/'),
                                  {'filename': mime_filename})
                     }
         else:
@@ -5238,6 +5415,9 @@ class APISite(BaseSite):
                 if error.code == u'uploaddisabled':
                     self._uploaddisabled = True
                 raise error
+            finally:
+                if upload_file:
+                    upload_file.close()
             result = result["upload"]
             pywikibot.debug(result, _logger)
 
@@ -5848,17 +6028,26 @@ class DataSite(APISite):
             raise api.APIError(data['errors'])
         return data['entities']
 
-    def preloaditempages(self, pagelist, groupsize=50):
+    def preloaditempages(self, pagelist, groupsize=50, props=None):
         """Yield ItemPages with content prefilled.
 
         Note that pages will be iterated in a different order
         than in the underlying pagelist.
 
+        When props is given only those parts of the entities are
+        transferred. The 'info' part is always requested as it is needed
+        to determine whether an item exists.
+
         @param pagelist: an iterable that yields either WikibasePage objects,
                          or Page objects linked to an ItemPage.
         @param groupsize: how many pages to query at a time
         @type groupsize: int
+        @param props: the parts of the entities to fetch, e.g. 'claims',
+            'labels' or 'sitelinks'. All are fetched when it's None.
+        @type props: iterable of str or None
         """
+        if props is not None:
+            props = sorted(set(props) | set(['info']))
         for sublist in itergroup(pagelist, groupsize):
             req = {'ids': [], 'titles': [], 'sites': []}
             for p in sublist:
@@ -5876,6 +6065,8 @@ class DataSite(APISite):
                         req['sites'].append(p.site.dbName())
                         req['titles'].append(p._link._text)
 
+            if props is not None:
+                req['props'] = props
             req = self._simple_request(action='wbgetentities', **req)
             data = req.submit()
             for qid in data['entities']:
@@ -16,6 +16,7 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
+import bisect
 import collections
 import datetime
 import re
@@ -43,6 +44,8 @@ from pywikibot.tools import OrderedDict, DeprecatedRegex
 # cache for replaceExcept to avoid recompile or regexes each call
 _regex_cache = {}
 
+_disabled_parts_cache = {}
+
 # This regex is only for use by extract_templates_and_params_regex.
 # It does not support template variables consisting of nested templates,
 # system variables like {{CURRENTYEAR}}, or template variables like {{{1}}}.
@@ -349,23 +352,62 @@ def removeDisabledParts(text, tags=['*'], include=[]):
     specified in the 'include' param.
 
     """
-    regexes = {
-        'comments':        r'<!--.*?-->',
-        'includeonly':     r'<includeonly>.*?</includeonly>',
-        'nowiki':          r'<nowiki>.*?</nowiki>',
-        'pre':             r'<pre>.*?</pre>',
-        'source':          r'<source .*?</source>',
-        'syntaxhighlight': r'<syntaxhighlight .*?</syntaxhighlight>',
-    }
-    if '*' in tags:
-        tags = list(regexes.keys())
-    # add alias
-    tags = set(tags) - set(include)
-    if 'source' in tags:
-        tags.add('syntaxhighlight')
-    toRemoveR = re.compile('|'.join([regexes[tag] for tag in tags]),
-                           re.IGNORECASE | re.DOTALL)
-    return toRemoveR.sub('', text)
+    return _get_disabled_parts_regex(tags, include).sub('', text)
+
+
+def _get_disabled_parts_regex(tags, include=[]):
+    """Return the cached regex which matches all the disabled parts."""
+    key = (frozenset(tags), frozenset(include))
+    if key not in _disabled_parts_cache:
+        regexes = {
+            'comments':        r'<!--.*?-->',
+            'includeonly':     r'<includeonly>.*?</includeonly>',
+            'nowiki':          r'<nowiki>.*?</nowiki>',
+            'pre':             r'<pre>.*?</pre>',
+            'source':          r'<source .*?</source>',
+            'syntaxhighlight': r'<syntaxhighlight .*?</syntaxhighlight>',
+        }
+        if '*' in tags:
+            tags = list(regexes.keys())
+        # add alias
+        tags = set(tags) - set(include)
+        if 'source' in tags:
+            tags.add('syntaxhighlight')
+        _disabled_parts_cache[key] = re.compile(
+            '|'.join([regexes[tag] for tag in sorted(tags)]),
+            re.IGNORECASE | re.DOTALL)
+    return _disabled_parts_cache[key]
+
+
+class DisabledParts(object):
+
+    """
+    The parts of a text where wiki markup is disabled.
+
+    The parts are searched once, so it can be asked for many positions in
+    the text whether they are disabled. For the tags and include parameters,
+    see L{removeDisabledParts}.
+    """
+
+    def __init__(self, text, tags=['*'], include=[]):
+        """Constructor."""
+        self.spans = [match.span() for match in
+                      _get_disabled_parts_regex(tags, include).finditer(text)]
+        self._starts = [start for start, end in self.spans]
+
+    def isDisabled(self, index):
+        """
+        Return True if text[index] is disabled.
+
+        The first character of a disabled part, like the < of a comment, is
+        not disabled itself.
+        """
+        position = bisect.bisect_left(self._starts, index) - 1
+        return position >= 0 and index < self.spans[position][1]
+
+    def __contains__(self, index):
+        """Return whether text[index] is disabled."""
+        return self.isDisabled(index)
 
 
 def removeHTMLParts(text, keeptags=['tt', 'nowiki', 'small', 'sup']):
@@ -409,13 +451,10 @@ def isDisabled(text, index, tags=['*']):
     """
     Return True if text[index] is disabled, e.g. by a comment or by nowiki tags.
 
-    For the tags parameter, see L{removeDisabledParts}.
+    For the tags parameter, see L{removeDisabledParts}. To check several
+    positions in the same text use L{DisabledParts}.
     """
-    # Find a marker that is not already in the text.
-    marker = findmarker(text)
-    text = text[:index] + marker + text[index:]
-    text = removeDisabledParts(text, tags)
-    return (marker not in text)
+    return DisabledParts(text, tags).isDisabled(index)
 
 
 def findmarker(text, startwith=u'@@', append=None):
@@ -1595,10 +1634,22 @@ class tzoneFixedOffset(datetime.tzinfo):
         )
 
 
+# Translation table of all non-latin digits to latin digits
+_digits_table = dict((ord(digit), '%d' % number)
+                     for digits in NON_LATIN_DIGITS.values()
+                     for number, digit in enumerate(digits))
+
+# Patterns of the TimeStripper, created once per site
+_timestripper_patterns = {}
+
+
 class TimeStripper(object):
 
     """Find timestamp in page and return it as timezone aware datetime object."""
 
+    comment_pattern = re.compile(r'<!--(.*?)-->')
+    digit_pattern = re.compile(r'[0-9]')
+
     def __init__(self, site=None):
         """Constructor."""
         if site is None:
@@ -1606,6 +1657,20 @@ class TimeStripper(object):
         else:
             self.site = site
 
+        if self.site not in _timestripper_patterns:
+            _timestripper_patterns[self.site] = self._create_patterns()
+        self.__dict__.update(_timestripper_patterns[self.site])
+
+    def _create_patterns(self):
+        """
+        Create the month names and patterns of the site.
+
+        They only depend on the site so all instances for the same site share
+        them.
+
+        @return: the attributes which are set on the instance
+        @rtype: dict
+        """
         self.origNames2monthNum = {}
         for n, (_long, _short) in enumerate(self.site.months_names, start=1):
             self.origNames2monthNum[_long] = n
@@ -1656,11 +1721,15 @@ class TimeStripper(object):
         ]
 
         self.linkP = compileLinkR()
-        self.comment_pattern = re.compile(r'<!--(.*?)-->')
 
         self.tzinfo = tzoneFixedOffset(self.site.siteinfo['timeoffset'],
                                        self.site.siteinfo['timezone'])
 
+        return dict((name, getattr(self, name)) for name in (
+            'origNames2monthNum', 'groups', 'is_digit_month', 'ptimeR',
+            'ptimeznR', 'pyearR', 'pmonthR', 'pdayR', 'patterns', 'linkP',
+            'tzinfo'))
+
     def findmarker(self, text, base=u'@@', delta='@'):
         """Find a string which is not part of text."""
         while base in text:
@@ -1669,10 +1738,7 @@ class TimeStripper(object):
 
     def fix_digits(self, line):
         """Make non-latin digits like Persian to latin to parse."""
-        for system in NON_LATIN_DIGITS.values():
-            for i in range(0, 10):
-                line = line.replace(system[i], str(i))
-        return line
+        return line.translate(_digits_table)
 
     def last_match_and_replace(self, txt, pat):
         """
@@ -1710,6 +1776,11 @@ class TimeStripper(object):
         All the following items must be matched, otherwise None is returned:
         -. year, month, hour, time, day, minute, tzinfo
         """
+        line = self.fix_digits(line)
+        # without any digit there is neither a date nor a time
+        if not self.digit_pattern.search(line):
+            return None
+
         # match date fields
         dateDict = dict()
         # Analyze comments separately from rest of each line to avoid to skip
@@ -1728,11 +1799,12 @@ class TimeStripper(object):
         line = removeDisabledParts(line)
         line = self.linkP.sub('', line)  # remove external links
 
-        line = self.fix_digits(line)
         for pat in self.patterns:
             line, matchDict = self.last_match_and_replace(line, pat)
-            if matchDict:
-                dateDict.update(matchDict)
+            if not matchDict:
+                # each pattern matches other fields, so no date is complete
+                break
+            dateDict.update(matchDict)
 
         # all fields matched -> date valid
         if all(g in dateDict for g in self.groups):
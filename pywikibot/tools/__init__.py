@@ -11,10 +11,14 @@ __version__ = '$Id$'
 import bz2
 import collections
 import gzip
+import hashlib
 import inspect
+import math
+import mmap
 import re
 import subprocess
 import sys
+import tempfile
 import threading
 import time
 import types
@@ -424,6 +428,9 @@ class ThreadedGenerator(threading.Thread):
 
     Subclasses should override self.generator, I{not} self.run
 
+    L{LookAheadGenerator} hands over the values without waiting in
+    intervals and should be preferred.
+
     Important: the generator thread will stop itself if the generator's
     internal queue is exhausted; but, if the calling program does not use
     all the generated values, it must call the generator's stop() method to
@@ -504,6 +511,131 @@ class ThreadedGenerator(threading.Thread):
         self.stop()
 
 
+class LookAheadGenerator(threading.Thread):
+
+    """Look-ahead generator which hands over the values without polling.
+
+    Like L{ThreadedGenerator} it iterates over an iterable in a separate
+    thread and buffers the values. The consumer is woken up as soon as a
+    value is available and the producer as soon as there is room in the
+    buffer, instead of checking the queue in intervals.
+
+    The buffer is limited to qsize values and, if budget is given, to
+    values whose total size is at most budget. A single value larger than
+    the budget is still handed over. An exception raised by the iterable is
+    raised by the consumer after the values yielded before it. Use stop(),
+    or the generator as a context manager, when not all values are used:
+
+    >>> with LookAheadGenerator(range(20), qsize=5) as gen:
+    ...     data = list(gen)
+    >>> data
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19]
+
+    """
+
+    def __init__(self, iterable, qsize=1000, budget=None, size=None,
+                 name='LookAheadGenerator'):
+        """Constructor.
+
+        @param iterable: the values to iterate over in the thread
+        @type iterable: iterable
+        @param qsize: the maximum number of buffered values
+        @type qsize: int
+        @param budget: the maximum total size of the buffered values or
+            None for no limit
+        @type budget: int or None
+        @param size: callable which returns the size of a value, by default
+            sys.getsizeof. It is only used when budget is given.
+        @type size: callable
+        @param name: name of the thread
+        @type name: str
+        """
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True
+        self.iterable = iterable
+        self.qsize = qsize
+        self.budget = budget
+        self.size = size or sys.getsizeof
+        self._buffer = collections.deque()
+        self._used = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._done = False
+        self._stopped = False
+        self._exception = None
+
+    def __enter__(self):
+        """Return the generator itself."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop the thread."""
+        self.stop()
+
+    def _full(self, size):
+        """Return whether the buffer has no room for a value of size."""
+        if len(self._buffer) >= self.qsize:
+            return True
+        return (self.budget is not None and bool(self._buffer) and
+                self._used + size > self.budget)
+
+    def run(self):
+        """Iterate over the iterable and store the values in the buffer."""
+        iterator = iter(self.iterable)
+        try:
+            for value in iterator:
+                size = self.size(value) if self.budget is not None else 0
+                with self._condition:
+                    while not self._stopped and self._full(size):
+                        self._condition.wait()
+                    if self._stopped:
+                        break
+                    self._buffer.append((value, size))
+                    self._used += size
+                    self._condition.notify_all()
+        except Exception as e:
+            self._exception = e
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def __iter__(self):
+        """Yield the values as soon as they are available."""
+        if not self._running:
+            self._running = True
+            self.start()
+        while True:
+            with self._condition:
+                while not (self._buffer or self._done or self._stopped):
+                    self._condition.wait()
+                if not self._buffer:
+                    break
+                value, size = self._buffer.popleft()
+                self._used -= size
+                self._condition.notify_all()
+            try:
+                yield value
+            except GeneratorExit:
+                self.stop()
+                raise
+        if self._exception is not None and not self._stopped:
+            raise self._exception
+
+    def stop(self):
+        """Stop the thread and discard the buffered values.
+
+        The thread ends when the iterable returns its next value.
+        """
+        with self._condition:
+            self._stopped = True
+            self._buffer.clear()
+            self._used = 0
+            self._condition.notify_all()
+
+
 def itergroup(iterable, size):
     """Make an iterator that returns lists of (up to) size items from iterable.
 
@@ -592,21 +724,38 @@ class ThreadList(list):
                   % (thd, thd.queue.qsize()), self._logger)
 
 
-def intersect_generators(genlist):
+def intersect_generators(genlist, key=None, sorted_by_key=False,
+                         qsize=1000):
     """
     Intersect generators listed in genlist.
 
     Yield items only if they are yielded by all generators in genlist.
-    Threads (via ThreadedGenerator) are used in order to run generators
-    in parallel, so that items can be yielded before generators are
-    exhausted.
 
-    Threads are stopped when they are either exhausted or Ctrl-C is pressed.
-    Quitting before all generators are finished is attempted if
-    there is no more chance of finding an item in all queues.
+    If all generators yield their items in ascending order of key and
+    sorted_by_key is True, they are intersected by a merge join. Only the
+    current item of each generator is kept in memory. A ValueError is
+    raised when a generator yields an item with a smaller key than the
+    previous one.
+
+    Otherwise threads are used in order to run generators in parallel, so
+    that items can be yielded before generators are exhausted. For the
+    items which were not yet yielded by all generators only the key and a
+    bit mask of the generators which yielded it are kept. When a generator
+    is exhausted the keys it did not yield are forgotten, and the
+    intersection ends when none is left.
+
+    In both modes the generators are stopped when the intersection ends and
+    an exception raised by a generator is raised again.
 
     @param genlist: list of page generators
     @type genlist: list
+    @param key: callable which returns the key by which the items are
+        compared, by default the items themselves
+    @type key: callable
+    @param sorted_by_key: whether all generators are sorted by key
+    @type sorted_by_key: bool
+    @param qsize: the number of items buffered by the threads
+    @type qsize: int
     """
     # If any generator is empty, no pages are going to be returned
     for source in genlist:
@@ -615,55 +764,118 @@ def intersect_generators(genlist):
                   'skipped immediately.'.format(source), 'intersect')
             return
 
-    # Item is cached to check that it is found n_gen
-    # times before being yielded.
-    cache = collections.defaultdict(set)
-    n_gen = len(genlist)
+    if key is None:
+        key = _identity
+    if sorted_by_key:
+        intersection = _merge_intersection(genlist, key, qsize)
+    else:
+        intersection = _hash_intersection(genlist, key, qsize)
+    for item in intersection:
+        yield item
 
-    # Class to keep track of alive threads.
-    # Start new threads and remove completed threads.
-    thrlist = ThreadList()
 
-    for source in genlist:
-        threaded_gen = ThreadedGenerator(name=repr(source), target=source)
-        thrlist.append(threaded_gen)
+def _identity(item):
+    """Return the item itself."""
+    return item
 
-    while True:
-        # Get items from queues in a round-robin way.
-        for t in thrlist:
-            try:
-                # TODO: evaluate if True and timeout is necessary.
-                item = t.queue.get(True, 0.1)
-
-                # Cache entry is a set of thread.
-                # Duplicates from same thread are not counted twice.
-                cache[item].add(t)
-                if len(cache[item]) == n_gen:
-                    yield item
-                    # Remove item from cache.
-                    # No chance of seeing it again (see later: early stop).
-                    cache.pop(item)
-
-                active = thrlist.active_count()
-                max_cache = n_gen
-                if cache.values():
-                    max_cache = max(len(v) for v in cache.values())
-                # No. of active threads is not enough to reach n_gen.
-                # We can quit even if some thread is still active.
-                # There could be an item in all generators which has not yet
-                # appeared from any generator. Only when we have lost one
-                # generator, then we can bail out early based on seen items.
-                if active < n_gen and n_gen - max_cache > active:
-                    thrlist.stop_all()
+
+def _merge_intersection(genlist, key, qsize):
+    """Intersect generators sorted by key using a merge join."""
+    end = object()
+    sources = [LookAheadGenerator(gen, qsize=qsize, name=repr(gen))
+               for gen in genlist]
+    try:
+        iterators = [iter(source) for source in sources]
+        items = [next(iterator, end) for iterator in iterators]
+        if any(item is end for item in items):
+            return
+        keys = [key(item) for item in items]
+        while True:
+            largest = max(keys)
+            found = min(keys) == largest
+            if found:
+                yield items[0]
+            for i, iterator in enumerate(iterators):
+                # skip the duplicates of a found key as well
+                while keys[i] < largest or found and keys[i] == largest:
+                    item = next(iterator, end)
+                    if item is end:
+                        return
+                    item_key = key(item)
+                    if item_key < keys[i]:
+                        raise ValueError('{0!r} is not sorted by key'
+                                         .format(genlist[i]))
+                    items[i] = item
+                    keys[i] = item_key
+    finally:
+        for source in sources:
+            source.stop()
+
+
+def _hash_intersection(genlist, key, qsize):
+    """Intersect generators running in threads using the keys seen."""
+    results = Queue.Queue(qsize)
+    stopped = threading.Event()
+    done = object()
+
+    def produce(index, source):
+        try:
+            for item in source:
+                if stopped.isSet():
+                    break
+                results.put((index, item, None))
+        except Exception as e:
+            results.put((index, done, e))
+        else:
+            results.put((index, done, None))
+
+    for index, source in enumerate(genlist):
+        thread = threading.Thread(target=produce, args=(index, source),
+                                  name=repr(source))
+        thread.daemon = True
+        thread.start()
+
+    running = len(genlist)
+    complete = (1 << len(genlist)) - 1
+    # bit mask of the exhausted generators
+    exhausted = 0
+    # bit masks of the generators which yielded a key
+    seen = {}
+    try:
+        while running:
+            index, item, error = results.get()
+            if item is done:
+                running -= 1
+                if error is not None:
+                    raise error
+                exhausted |= 1 << index
+                seen = dict((item_key, mask)
+                            for item_key, mask in seen.items()
+                            if mask & exhausted == exhausted)
+                if not seen:
                     return
-            except Queue.Empty:
-                pass
-            except KeyboardInterrupt:
-                thrlist.stop_all()
-            finally:
-                # All threads are done.
-                if thrlist.active_count() == 0:
+                continue
+
+            item_key = key(item)
+            mask = seen.get(item_key, 0) | 1 << index
+            if mask == complete:
+                seen.pop(item_key, None)
+                yield item
+                # no other generator can yield the keys left for an
+                # exhausted generator
+                if exhausted and not seen:
                     return
+            elif mask & exhausted == exhausted:
+                seen[item_key] = mask
+    finally:
+        stopped.set()
+        # Free the queue for the threads waiting to store an item. A thread
+        # only ends once its source yields again, so don't wait for them.
+        while True:
+            try:
+                results.get_nowait()
+            except Queue.Empty:
+                break
 
 
 def filter_unique(iterable, container=None, key=None, add=None):
@@ -682,7 +894,8 @@ def filter_unique(iterable, container=None, key=None, add=None):
 
     To avoid these issues, it is advisable for the caller to provide their own
     container and set the key parameter to be the function L{hash}, or use a
-    L{weakref} as the key.
+    L{weakref} as the key. L{HashedSet}, L{IntegerSet} and L{BloomFilter}
+    are compact containers which don't keep references to the items.
 
     The container can be any object that supports __contains__.
     If the container is a set or dict, the method add or __setitem__ will be
@@ -722,6 +935,337 @@ def filter_unique(iterable, container=None, key=None, add=None):
             yield item
 
 
+def _item_digest(item):
+    """Return the MD5 digest of an item, using its text if it's not bytes."""
+    if not isinstance(item, bytes):
+        item = unicode(item).encode('utf-8')
+    return hashlib.md5(item).hexdigest()
+
+
+class HashedSet(object):
+
+    """
+    Set which only stores a 64 bit hash of every item.
+
+    Items which are not bytes are hashed using their text, so it can be used
+    for objects like pages without keeping a reference to them. The hash is
+    stable across processes, unlike L{hash}. Two different items are
+    considered equal with a probability of about n / 2 ** 64 for n items.
+
+    It supports add and the in operator, so it can be used as the container
+    of L{filter_unique}.
+    """
+
+    def __init__(self, iterable=None):
+        """
+        Constructor.
+
+        @param iterable: the initial items
+        @type iterable: iterable
+        """
+        self._hashes = set()
+        for item in iterable or ():
+            self.add(item)
+
+    @staticmethod
+    def _hash(item):
+        return int(_item_digest(item)[:16], 16)
+
+    def add(self, item):
+        """Add an item."""
+        self._hashes.add(self._hash(item))
+
+    def __contains__(self, item):
+        """Return whether the item was added."""
+        return self._hash(item) in self._hashes
+
+    def __len__(self):
+        """Return the number of different hashes."""
+        return len(self._hashes)
+
+
+class IntegerSet(object):
+
+    """
+    Set of non-negative integers stored as a bit map.
+
+    It needs one bit for every integer up to the largest one added, which is
+    compact for dense integers like page ids. It supports add and the in
+    operator, so it can be used as the container of L{filter_unique}.
+    """
+
+    def __init__(self, iterable=None):
+        """
+        Constructor.
+
+        @param iterable: the initial integers
+        @type iterable: iterable of int
+        """
+        self._bits = bytearray()
+        self._len = 0
+        for number in iterable or ():
+            self.add(number)
+
+    def add(self, number):
+        """
+        Add an integer.
+
+        @raise ValueError: the integer is negative
+        """
+        if number < 0:
+            raise ValueError('{0} is negative'.format(number))
+        index, bit = divmod(number, 8)
+        if index >= len(self._bits):
+            # grow at least by doubling to avoid copying for every id
+            self._bits.extend(bytearray(max(index + 1 - len(self._bits),
+                                            len(self._bits))))
+        if not self._bits[index] & 1 << bit:
+            self._bits[index] |= 1 << bit
+            self._len += 1
+
+    def __contains__(self, number):
+        """Return whether the integer was added."""
+        index, bit = divmod(number, 8)
+        return (0 <= index < len(self._bits) and
+                bool(self._bits[index] & 1 << bit))
+
+    def __len__(self):
+        """Return the number of integers."""
+        return self._len
+
+
+class BloomFilter(object):
+
+    """
+    Probabilistic set which needs a fixed amount of memory.
+
+    An item which was added is always contained, but an item which was not
+    added is contained with the probability error_rate as long as no more
+    than capacity items were added. The memory needed is about
+    -capacity * ln(error_rate) / ln(2) ** 2 bits, i.e. 1.8 MB for one
+    million items at an error rate of 0.1 %.
+
+    Like L{HashedSet} items which are not bytes are hashed using their
+    text. It supports add and the in operator, so it can be used as the
+    container of L{filter_unique}; but then items which were not yielded
+    before are skipped with the probability error_rate.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        Constructor.
+
+        @param capacity: the number of items which will be added
+        @type capacity: int
+        @param error_rate: the probability that an item is wrongly contained
+        @type error_rate: float
+        """
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError('capacity must be positive and error_rate '
+                             'between 0 and 1')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._size = int(math.ceil(-capacity * math.log(error_rate) /
+                                   math.log(2) ** 2))
+        self._hash_count = max(1, int(round(float(self._size) / capacity *
+                                            math.log(2))))
+        self._bits = bytearray((self._size + 7) // 8)
+        self._len = 0
+
+    def _positions(self, item):
+        """Return the bit positions of the item using double hashing."""
+        digest = _item_digest(item)
+        first = int(digest[:16], 16)
+        second = int(digest[16:], 16) | 1
+        return [(first + i * second) % self._size
+                for i in range(self._hash_count)]
+
+    def add(self, item):
+        """Add an item."""
+        added = False
+        for position in self._positions(item):
+            index, bit = divmod(position, 8)
+            if not self._bits[index] & 1 << bit:
+                self._bits[index] |= 1 << bit
+                added = True
+        if added:
+            self._len += 1
+
+    def __contains__(self, item):
+        """Return whether the item was probably added."""
+        for position in self._positions(item):
+            index, bit = divmod(position, 8)
+            if not self._bits[index] & 1 << bit:
+                return False
+        return True
+
+    def __len__(self):
+        """Return the approximate number of items added."""
+        return self._len
+
+
+class SpillStore(object):
+
+    """
+    Store texts in a temporary file and keep the recently used in memory.
+
+    add() returns a key to get() or remove() the text. The recently used
+    texts are kept in memory as long as they have no more than memory
+    characters together. Beyond that the least recently used texts are
+    written to a temporary file, which is created in directory, and read
+    from it again when needed. The file is mapped into memory, so a text is
+    decoded directly from it without copying it into a buffer first.
+
+    The space of removed texts is reused by rewriting the file when more
+    than half of it is unused. The file is deleted when the store is closed
+    or when the program exits. The store may be used by several threads.
+    """
+
+    # the file isn't rewritten before this many bytes are unused
+    compact_size = 1000000
+
+    def __init__(self, memory=10000000, directory=None):
+        """
+        Constructor.
+
+        @param memory: number of characters of the texts kept in memory
+        @type memory: int
+        @param directory: the directory of the temporary file, defaults to
+            the directory of the tempfile module
+        @type directory: str
+        """
+        self.memory = memory
+        self.directory = directory
+        self._lock = threading.RLock()
+        # key -> text of the texts in memory, the least recently used first
+        self._cache = OrderedDict()
+        self._size = 0
+        # key -> (offset, length) of the texts in the file
+        self._index = {}
+        self._next = 0
+        self._file = None
+        self._map = None
+        self._end = 0
+        self._unused = 0
+
+    def add(self, text):
+        """
+        Store a text.
+
+        @type text: unicode
+        @return: the key of the text
+        @rtype: int
+        """
+        with self._lock:
+            key = self._next
+            self._next += 1
+            self._cache[key] = text
+            self._size += len(text)
+            self._evict()
+        return key
+
+    def get(self, key):
+        """
+        Return a stored text.
+
+        @raise KeyError: there is no text with this key
+        @rtype: unicode
+        """
+        with self._lock:
+            if key in self._cache:
+                text = self._cache.pop(key)
+            else:
+                offset, length = self._index[key]
+                text = self._read(offset, length)
+                self._size += len(text)
+            # mark it as the most recently used
+            self._cache[key] = text
+            self._evict()
+        return text
+
+    def remove(self, key):
+        """Remove a stored text, if it exists."""
+        with self._lock:
+            text = self._cache.pop(key, None)
+            if text is not None:
+                self._size -= len(text)
+            if key in self._index:
+                self._unused += self._index.pop(key)[1]
+                if self._unused > max(self._end // 2, self.compact_size):
+                    self._compact()
+
+    def __contains__(self, key):
+        """Return whether a text with this key is stored."""
+        return key in self._cache or key in self._index
+
+    def __len__(self):
+        """Return the number of texts stored."""
+        with self._lock:
+            return len(set(self._cache).union(self._index))
+
+    def close(self):
+        """Remove all texts and delete the file."""
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+            self._index.clear()
+            self._unmap()
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._end = self._unused = 0
+
+    def _evict(self):
+        """Write the least recently used texts to the file."""
+        while self._size > self.memory and self._cache:
+            key, text = self._cache.popitem(last=False)
+            self._size -= len(text)
+            if key not in self._index:
+                data = text.encode('utf-8')
+                if self._file is None:
+                    # it is deleted when closed, even at exit
+                    self._file = tempfile.TemporaryFile(dir=self.directory)
+                self._file.seek(self._end)
+                self._file.write(data)
+                self._index[key] = (self._end, len(data))
+                self._end += len(data)
+
+    def _unmap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _read(self, offset, length):
+        """Decode a text from the file."""
+        if self._map is None or len(self._map) < offset + length:
+            self._unmap()
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        if PY2:
+            return unicode(buffer(self._map, offset, length),  # noqa
+                           'utf-8')
+        with memoryview(self._map) as view:
+            return str(view[offset:offset + length], 'utf-8')
+
+    def _compact(self):
+        """Rewrite the file with only the texts which weren't removed."""
+        new = tempfile.TemporaryFile(dir=self.directory)
+        if self._index:
+            self._read(0, self._end)
+        index = {}
+        for key, (offset, length) in sorted(self._index.items(),
+                                            key=lambda item: item[1]):
+            index[key] = (new.tell(), length)
+            new.write(self._map[offset:offset + length])
+        self._unmap()
+        self._file.close()
+        self._file = new
+        self._index = index
+        self._end = new.tell()
+        self._unused = 0
+
+
 class CombinedError(KeyError, IndexError):
 
     """An error that gets caught by both KeyError and IndexError."""
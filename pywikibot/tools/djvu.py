@@ -11,10 +11,56 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 
 import os.path
+import re
 import subprocess
 
 import pywikibot
 
+_SEXP_TOKEN = re.compile(br'[()]|"(?:[^"\\]|\\.)*"|[^\s()"]+', re.S)
+_SEXP_ESCAPE = re.compile(br'\\([0-7]{1,3}|x[0-9a-fA-F]{1,2}|.)', re.S)
+_SEXP_ESCAPES = {b'a': 7, b'b': 8, b't': 9, b'n': 10, b'v': 11, b'f': 12,
+                 b'r': 13}
+
+
+def _unescape(match):
+    """Return the byte of an escape sequence in a djvulibre string."""
+    code = match.group(1)
+    if code[:1].isdigit():
+        value = int(code, 8)
+    elif code[:1] == b'x' and len(code) > 1:
+        value = int(code[1:], 16)
+    else:
+        value = _SEXP_ESCAPES.get(code, ord(code))
+    return bytes(bytearray([value & 0xff]))
+
+
+def _parse_page_texts(data):
+    """
+    Return the text of each page in the output of djvutxt --detail=page.
+
+    Each page is written as an expression (page x0 y0 x1 y1 "text"), or as
+    () if it has no text layer.
+
+    @param data: the output of djvutxt
+    @type data: bytes
+    @return: the undecoded text of each page
+    @rtype: list of bytes
+    """
+    texts = []
+    depth = 0
+    text = None
+    for token in _SEXP_TOKEN.findall(data):
+        if token == b'(':
+            depth += 1
+        elif token == b')':
+            depth -= 1
+            if depth == 0:
+                texts.append(text or b'')
+                text = None
+        elif depth == 1 and text is None and token[:1] == b'"':
+            text = _SEXP_ESCAPE.sub(_unescape, token[1:-1])
+    return texts
+
 
 class DjVuFile(object):
 
@@ -39,6 +85,7 @@ class DjVuFile(object):
         # Check file exists and has read permissions.
         with open(file_djvu):
             self.file_djvu = file_djvu
+        self._page_texts = {}
 
     def number_of_images(self):
         """Return the (cached) number of images in the djvu file."""
@@ -79,8 +126,49 @@ class DjVuFile(object):
         txt = txt.strip('\x0c\n ')
         return txt
 
+    def load_pages(self, start=1, end=None):
+        """
+        Load the text of the pages start to end with a single djvutxt call.
+
+        The texts are cached and returned by get_page. If the output doesn't
+        contain the text of each page, nothing is cached and get_page
+        loads the pages one by one.
+
+        @param start: the first page
+        @type start: int
+        @param end: the last page, by default the last page of the file
+        @type end: int
+        @return: whether the pages were loaded
+        @rtype: bool
+        """
+        if not self.has_text():
+            raise ValueError('Djvu file %s has no text layer.' % self.file_djvu)
+        if end is None:
+            end = self.number_of_images()
+        start = max(start, 1)
+        end = min(end, self.number_of_images())
+        if start > end:
+            return False
+        dp = subprocess.Popen(['djvutxt', '--detail=page',
+                               '--page=%d-%d' % (start, end), self.file_djvu],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (stdoutdata, stderrdata) = dp.communicate()
+        if dp.returncode != 0:
+            pywikibot.error('djvulibre library error!\n%s' % stderrdata)
+            return False
+        texts = _parse_page_texts(stdoutdata)
+        if len(texts) != end - start + 1:
+            pywikibot.log('djvutxt returned %d pages instead of %d for %s'
+                          % (len(texts), end - start + 1, self.file_djvu))
+            return False
+        for n, text in enumerate(texts, start):
+            self._page_texts[n] = self._remove_control_chars(text)
+        return True
+
     def get_page(self, n):
         """Get page n for djvu file."""
+        if n in self._page_texts:
+            return self._page_texts[n]
         if not self.has_text():
             raise ValueError('Djvu file %s has no text layer.' % self.file_djvu)
         if not (1 <= n <= self.number_of_images()):
@@ -25,6 +25,12 @@ This script understands the following command-line arguments:
 -duplicatesreport   Report the duplicates in a log *AND* put the template in
                     the images.
 
+-hashindex          Look for duplicates in a local index of the SHA-1
+                    checksums of the files, which is updated from the list of
+                    files and the deletion log before each run. Only files
+                    which aren't in the index yet and possible duplicates are
+                    looked up on the wiki.
+
 -sendemail          Send an email after tagging.
 
 -break              To break the bot after the first check (default: recursive)
@@ -90,17 +96,21 @@ __version__ = '$Id$'
 #
 
 import re
+import sqlite3
 import time
 import sys
 
 import pywikibot
 
+from pywikibot import config
 from pywikibot import pagegenerators as pg
 from pywikibot import i18n
 
+from pywikibot.data import api
+
 from pywikibot.exceptions import NotEmailableError
 from pywikibot.family import Family
-from pywikibot.tools import deprecated
+from pywikibot.tools import deprecated, itergroup
 
 if sys.version_info[0] > 2:
     basestring = (str, )
@@ -594,14 +604,196 @@ def printWithTimeZone(message):
     pywikibot.output(u"%s%s" % (message, time_zone))
 
 
+class FileHashIndex(object):
+
+    """
+    Index of the SHA-1 checksums of the files of a site.
+
+    The checksum of the current version of each file is kept in a SQLite
+    database together with the time it was uploaded. update() adds the files
+    uploaded since the last update, removes the deleted files and reloads the
+    restored files, so after the first complete update only the changes are
+    loaded.
+    """
+
+    def __init__(self, site, filename=None):
+        """
+        Constructor.
+
+        @param site: the site of the files
+        @type site: APISite
+        @param filename: the database file, defaults to
+            filehashes-<family>-<code>.sqlite3 in the data directory.
+            ':memory:' keeps the index in memory.
+        @type filename: str
+        """
+        if filename is None:
+            filename = config.datafilepath('filehashes-%s-%s.sqlite3'
+                                           % (site.family.name, site.code))
+        self.site = site
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                title TEXT PRIMARY KEY, sha1 TEXT NOT NULL,
+                timestamp TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS files_sha1 ON files (sha1);
+            CREATE TABLE IF NOT EXISTS progress (
+                name TEXT PRIMARY KEY, timestamp TEXT NOT NULL);
+            ''')
+
+    def add(self, title, sha1, timestamp):
+        """Store the checksum of the current version of a file."""
+        self.connection.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+            (title, sha1, timestamp))
+
+    def remove(self, title):
+        """Remove a file from the index."""
+        self.connection.execute('DELETE FROM files WHERE title = ?',
+                                (title, ))
+
+    def titles(self, sha1):
+        """
+        Return the titles of the files with the checksum.
+
+        @param sha1: the hexadecimal SHA-1 checksum
+        @type sha1: str
+        @rtype: list of unicode
+        """
+        return [title for title, in self.connection.execute(
+            'SELECT title FROM files WHERE sha1 = ? ORDER BY title',
+            (sha1.lower(), ))]
+
+    def _progress(self, name):
+        for timestamp, in self.connection.execute(
+                'SELECT timestamp FROM progress WHERE name = ?', (name, )):
+            return timestamp
+        return None
+
+    def _setProgress(self, name, timestamp):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO progress VALUES (?, ?)', (name, timestamp))
+
+    @staticmethod
+    def _query(site, listaction, step, total=None, **kwargs):
+        """Query a list of the site."""
+        gen = api.ListGenerator(listaction, site=site, **kwargs)
+        gen.set_query_increment(step)
+        if total is not None:
+            gen.set_maximum_items(total)
+        return gen
+
+    @staticmethod
+    def _fileInfo(site, titles, step):
+        """Yield the title, checksum and upload time of the current files."""
+        for group in itergroup(titles, step):
+            for pagedata in api.PropertyGenerator('imageinfo', site=site,
+                                                  titles='|'.join(group),
+                                                  iiprop='sha1|timestamp'):
+                if pagedata.get('imageinfo'):
+                    info = pagedata['imageinfo'][0]
+                    yield pagedata['title'], info['sha1'], info['timestamp']
+
+    def update(self, step=500, total=None):
+        """
+        Add the new files, remove the deleted files and reload the restored.
+
+        The files are loaded in the order they were uploaded, starting at
+        the last file loaded before. The progress is saved after each batch,
+        so an interrupted update continues where it stopped.
+
+        @param step: the number of files loaded per request
+        @type step: int
+        @param total: the maximum number of files loaded, None for all
+        @type total: int
+        @return: the number of loaded files
+        @rtype: int
+        """
+        count = 0
+        if self._progress('delete') is None:
+            # files deleted before they were loaded aren't in the index
+            self._setProgress('delete',
+                              pywikibot.Timestamp.utcnow().isoformat())
+        # a restored file keeps its upload time, so allimages doesn't find it
+        restored = set()
+        kwargs = {}
+        start = self._progress('allimages')
+        if start:
+            kwargs['aistart'] = start
+        files = self._query(self.site, 'allimages', step, total,
+                            aisort='timestamp', aidir='newer',
+                            aiprop='sha1|timestamp', **kwargs)
+        for count, data in enumerate(files, 1):
+            self.add(data['title'], data['sha1'], data['timestamp'])
+            if count % step == 0:
+                self._setProgress('allimages', data['timestamp'])
+                self.save()
+        if count:
+            self._setProgress('allimages', data['timestamp'])
+
+        events = self._query(self.site, 'logevents', step, letype='delete',
+                             ledir='newer', lenamespace=6,
+                             lestart=self._progress('delete'),
+                             leprop='title|type|timestamp')
+        for data in events:
+            if data['action'] == 'delete':
+                self.remove(data['title'])
+                restored.discard(data['title'])
+            elif data['action'] == 'restore':
+                restored.add(data['title'])
+            self._setProgress('delete', data['timestamp'])
+        if restored:
+            for title, sha1, timestamp in self._fileInfo(
+                    self.site, sorted(restored), step):
+                self.add(title, sha1, timestamp)
+        self.save()
+        return count
+
+    def duplicates(self, imagePage):
+        """
+        Return the files with the same checksum as the file page.
+
+        A file which is the only one with its checksum in the index has no
+        duplicates and the wiki isn't asked. Otherwise the files with the
+        checksum are loaded from the wiki and the index is updated.
+
+        @type imagePage: FilePage
+        @rtype: list of FilePage
+        """
+        info = imagePage.latest_file_info
+        if self.titles(info.sha1) == [imagePage.title()]:
+            return [imagePage]
+        duplicates = list(self.site.allimages(sha1=info.sha1))
+        for title in self.titles(info.sha1):
+            self.remove(title)
+        for page in duplicates:
+            if page == imagePage:
+                self.add(page.title(), info.sha1.lower(), info.timestamp)
+            else:
+                self.add(page.title(), info.sha1.lower(),
+                         page.latest_file_info.timestamp)
+        self.save()
+        return duplicates
+
+    def save(self):
+        """Commit the changes to the database."""
+        self.connection.commit()
+
+    def close(self):
+        """Save the changes and close the database."""
+        self.save()
+        self.connection.close()
+
+
 class checkImagesBot(object):
 
     """A robot to check recently uploaded files."""
 
     def __init__(self, site, logFulNumber=25000, sendemailActive=False,
-                 duplicatesReport=False, logFullError=True):
+                 duplicatesReport=False, logFullError=True, hashIndex=None):
         """Constructor, define some global variable."""
         self.site = site
+        self.hashIndex = hashIndex
         self.logFullError = logFullError
         self.logFulNumber = logFulNumber
         self.rep_page = i18n.translate(self.site, report_page)
@@ -976,8 +1168,11 @@ class checkImagesBot(object):
         duplicateRegex = (r'\[\[:File:%s\]\] has the following duplicates'
                           % re.escape(self.image.title(asUrl=True)))
         imagePage = pywikibot.FilePage(self.site, self.imageName)
-        hash_found = imagePage.latest_file_info.sha1
-        duplicates = list(self.site.allimages(sha1=hash_found))
+        if self.hashIndex:
+            duplicates = self.hashIndex.duplicates(imagePage)
+        else:
+            hash_found = imagePage.latest_file_info.sha1
+            duplicates = list(self.site.allimages(sha1=hash_found))
 
         if not duplicates:
             return  # Error, image deleted, no hash found. Skip the image.
@@ -1661,6 +1856,7 @@ def main(*args):
     duplicatesReport = False  # Use the duplicate-report option
     sendemailActive = False  # Use the send-email
     logFullError = True  # Raise an error when the log is full
+    useHashIndex = False  # Look for duplicates in the local index
     generator = None
 
     # Here below there are the parameters.
@@ -1691,6 +1887,8 @@ def main(*args):
                 duplicates_rollback = int(arg[12:])
         elif arg == '-duplicatereport':
             duplicatesReport = True
+        elif arg == '-hashindex':
+            useHashIndex = True
         elif arg == '-sendemail':
             sendemailActive = True
         elif arg.startswith('-skip'):
@@ -1780,11 +1978,17 @@ def main(*args):
         else:
             pywikibot.output(u"Retrieving the latest %d files for checking..."
                              % limit)
+    hashIndex = None
+    if duplicatesActive and useHashIndex:
+        hashIndex = FileHashIndex(site)
     while True:
+        if hashIndex:
+            pywikibot.output('Updating the index of file checksums...')
+            hashIndex.update()
         # Defing the Main Class.
         Bot = checkImagesBot(site, sendemailActive=sendemailActive,
                              duplicatesReport=duplicatesReport,
-                             logFullError=logFullError)
+                             logFullError=logFullError, hashIndex=hashIndex)
         if normal:
             generator = pg.NewimagesPageGenerator(total=limit, site=site)
         # if urlUsed and regexGen, get the source for the generator
@@ -4,9 +4,13 @@
 A generic bot to do data ingestion (batch uploading).
 
 usage: data_ingestion.py -csvdir:local_dir/ -page:config_page
+
+  -workers:n    Download the next n files and look for their duplicates
+                while the current file is uploaded. The default is 4; 0
+                handles one file after another.
 """
 #
-# (C) Pywikibot team, 2013
+# (C) Pywikibot team, 2013-2015
 #
 # Distributed under the terms of the MIT license.
 #
@@ -17,10 +21,12 @@ __version__ = '$Id$'
 
 import base64
 import codecs
+import collections
 import hashlib
 import io
 import os
 import sys
+import threading
 
 import posixpath
 
@@ -71,6 +77,7 @@ class Photo(pywikibot.FilePage):
         if ext == filename:
             self.metadata["_ext"] = ext = None
         self.contents = None
+        self._duplicates = None
 
         if not site:
             site = pywikibot.Site('commons', 'commons')
@@ -96,15 +103,18 @@ class Photo(pywikibot.FilePage):
         Find duplicates of the photo.
 
         Calculates the SHA1 hash and asks the MediaWiki api
-        for a list of duplicates.
+        for a list of duplicates. The result is remembered.
 
         TODO: Add exception handling, fix site thing
         """
-        hashObject = hashlib.sha1()
-        hashObject.update(self.downloadPhoto().getvalue())
-        return list(
-            page.title(withNamespace=False) for page in
-            self.site.allimages(sha1=base64.b16encode(hashObject.digest())))
+        if self._duplicates is None:
+            hashObject = hashlib.sha1()
+            hashObject.update(self.downloadPhoto().getvalue())
+            self._duplicates = list(
+                page.title(withNamespace=False) for page in
+                self.site.allimages(
+                    sha1=base64.b16encode(hashObject.digest())))
+        return self._duplicates
 
     def getTitle(self, fmt):
         """
@@ -148,12 +158,49 @@ def CSVReader(fileobj, urlcolumn, site=None, *args, **kwargs):
         yield Photo(line[urlcolumn], line, site=site)
 
 
+def PreparedPhotoGenerator(photos, workers=4):
+    """
+    Yield the photos after they were downloaded and checked for duplicates.
+
+    Up to workers photos are downloaded and hashed, and their duplicates
+    are requested, at the same time in separate threads. The photos are
+    yielded in their original order, so only workers photos are held in
+    memory in advance. If preparing a photo fails, it is yielded anyway and
+    the failing step is repeated when the photo is treated.
+
+    @param photos: the photos to prepare
+    @type photos: iterable of Photo
+    @param workers: the number of photos prepared at the same time
+    @type workers: int
+    """
+    def prepare(photo):
+        try:
+            photo.findDuplicateImages()
+        except Exception as e:
+            pywikibot.log('Preparing %s failed: %r' % (photo.URL, e))
+
+    pending = collections.deque()
+    for photo in photos:
+        thread = threading.Thread(target=prepare, args=(photo, ))
+        thread.daemon = True
+        thread.start()
+        pending.append((photo, thread))
+        if len(pending) >= workers:
+            photo, thread = pending.popleft()
+            thread.join()
+            yield photo
+    while pending:
+        photo, thread = pending.popleft()
+        thread.join()
+        yield photo
+
+
 class DataIngestionBot(pywikibot.Bot):
 
     """Data ingestion bot."""
 
     def __init__(self, reader, titlefmt, pagefmt,
-                 site='deprecated_default_commons'):
+                 site='deprecated_default_commons', workers=0):
         """
         Constructor.
 
@@ -168,12 +215,17 @@ class DataIngestionBot(pywikibot.Bot):
             Defaults to 'deprecated_default_commons' to use Wikimedia Commons
             for backwards compatibility reasons. Deprecated.
         @type site: APISite, 'deprecated_default_commons' or None
+        @param workers: the number of photos which are downloaded and checked
+            for duplicates while a photo is uploaded
+        @type workers: int
         """
         if site == 'deprecated_default_commons':
             warn('site=\'deprecated_default_commons\' is deprecated; '
                  'please specify a site or use site=None',
                  DeprecationWarning, 2)
             site = pywikibot.Site('commons', 'commons')
+        if workers > 0:
+            reader = PreparedPhotoGenerator(reader, workers)
         super(DataIngestionBot, self).__init__(generator=reader, site=site)
 
         self.titlefmt = titlefmt
@@ -261,10 +313,13 @@ def main(*args):
     local_args = pywikibot.handle_args(args)
     genFactory = pagegenerators.GeneratorFactory()
     csv_dir = None
+    workers = 4
 
     for arg in local_args:
         if arg.startswith('-csvdir:'):
             csv_dir = arg[8:]
+        elif arg.startswith('-workers:'):
+            workers = int(arg[9:])
         else:
             genFactory.handleArg(arg)
 
@@ -300,7 +355,7 @@ def main(*args):
             bot = DataIngestionBot(files,
                                    configuration['titleFormat'],
                                    configuration['formattingTemplate'],
-                                   site=None)
+                                   site=None, workers=workers)
 
             bot.run()
         finally:
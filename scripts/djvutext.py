@@ -97,6 +97,10 @@ class DjVuTextBot(SingleSiteBot):
 
     def gen(self):
         """Generate pages from specified page interval."""
+        # load the text of all pages at once instead of page by page
+        for start, end in self._pages:
+            if end > start:
+                self._djvu.load_pages(start, end)
         for page_number in self.page_number_gen():
             title = '{prefix}/{number}'.format(prefix=self._prefix,
                                                number=page_number)
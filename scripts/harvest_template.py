@@ -114,6 +114,12 @@ class HarvestRobot(WikidataBot):
 
         pagetext = page.get()
         templates = textlib.extract_templates_and_params(pagetext)
+        # save the claims and sources of all templates in one edit
+        with item.batch():
+            self.treatTemplates(page, item, templates)
+
+    def treatTemplates(self, page, item, templates):
+        """Add the claims for the fields of the templates to the item."""
         for (template, fielddict) in templates:
             # Clean up template
             try:
@@ -17,13 +17,20 @@ Arguments:
 
   -tofamily:yy Copy the image to a wiki in the family yy
 
+  -all         Copy all images without asking. Images which fail to upload
+               because of a warning, and images whose name would need to be
+               changed on the target site, are skipped.
+
+  -workers:n   Copy up to n images at the same time with -all (default: 4)
+
   -file:zz     Upload many files from textfile: [[Image:xx]]
                                                 [[Image:yy]]
 
 If pagename is an image description page, offers to copy the image to the
 target site. If it is a normal page, it will offer to copy any of the images
 used on that page, or if the -interwiki argument is used, any of the images
-used on a page reachable via interwiki links.
+used on a page reachable via interwiki links. Images whose current version is
+already on the target site are not offered.
 """
 #
 # (C) Andre Engels, 2004
@@ -35,11 +42,22 @@ from __future__ import unicode_literals
 
 __version__ = '$Id$'
 
+import os
 import re
 import sys
+import threading
+
 import pywikibot
-import upload
 from pywikibot import config, i18n, textlib
+from pywikibot.data import api
+from pywikibot.tools import itergroup
+
+from scripts import upload
+
+if sys.version_info[0] > 2:
+    import queue as Queue
+else:
+    import Queue
 
 copy_message = {
     'ar': u"هذه الصورة تم نقلها من %s. الوصف الأصلي كان:\r\n\r\n%s",
@@ -158,12 +176,15 @@ class ImageTransferBot:
     """Image transfer bot."""
 
     def __init__(self, generator, targetSite=None, interwiki=False,
-                 keep_name=False, ignore_warning=False):
+                 keep_name=False, ignore_warning=False, transfer_all=False,
+                 workers=4):
         self.generator = generator
         self.interwiki = interwiki
         self.targetSite = targetSite
         self.keep_name = keep_name
         self.ignore_warning = ignore_warning
+        self.transfer_all = transfer_all
+        self.workers = workers
 
     def transferImage(self, sourceImagePage):
         """
@@ -201,12 +222,14 @@ class ImageTransferBot:
             description = ''
             print("Image description page is redirect.")
         else:
+            keep_name = self.keep_name or self.transfer_all
             bot = upload.UploadRobot(url=url, description=description,
                                      targetSite=self.targetSite,
                                      urlEncoding=sourceSite.encoding(),
-                                     keepFilename=self.keep_name,
-                                     verifyDescription=not self.keep_name,
-                                     ignoreWarning=self.ignore_warning)
+                                     keepFilename=keep_name,
+                                     verifyDescription=not keep_name,
+                                     ignoreWarning=self.ignore_warning,
+                                     aborts=self.transfer_all or [])
             # try to upload
             targetFilename = bot.run()
             if targetFilename and self.targetSite.family.name == 'commons' and \
@@ -229,6 +252,154 @@ class ImageTransferBot:
                                         % targetFilename,
                                         summary=nowCommonsMessage[sourceSite.lang])
 
+    @staticmethod
+    def _query(site, titles, step=50):
+        """Return the page info and the current file version of each page."""
+        pages = {}
+        for group in itergroup(titles, step):
+            for pagedata in api.PropertyGenerator('info|imageinfo', site=site,
+                                                  titles='|'.join(group),
+                                                  iiprop='sha1'):
+                pages[pagedata['title']] = pagedata
+        return pages
+
+    @staticmethod
+    def _sha1(pagedata):
+        """Return the SHA-1 of the current file version, if there is one."""
+        if pagedata and pagedata.get('imageinfo'):
+            return pagedata['imageinfo'][0]['sha1']
+
+    def _targetTitle(self, image):
+        """Return the title of the image on the target site."""
+        return '%s:%s' % (self.targetSite.image_namespace(),
+                          image.title(withNamespace=False))
+
+    def _queryImages(self, imagelist):
+        """Return the page data of the images and of their target pages."""
+        pages = {}
+        sites = {}
+        for image in imagelist:
+            sites.setdefault(image.site, []).append(image)
+        for site, images in sites.items():
+            pages.update(self._query(site,
+                                     [image.title() for image in images]))
+        targetPages = self._query(self.targetSite,
+                                  [self._targetTitle(image)
+                                   for image in imagelist])
+        return pages, targetPages
+
+    def findTransferred(self, imagelist):
+        """
+        Return the images whose current version is on the target site.
+
+        The checksums of the images and of the files with the same names on
+        the target site are loaded in batches. Images whose file name is
+        used for another file on the target site are looked up by their
+        checksum.
+
+        @param imagelist: the images to transfer
+        @type imagelist: list of FilePage
+        @return: the images with their file page on the target site
+        @rtype: dict
+        """
+        found = {}
+        pages, targetPages = self._queryImages(imagelist)
+        for image in imagelist:
+            sha1 = self._sha1(pages.get(image.title()))
+            targetTitle = self._targetTitle(image)
+            targetSha1 = self._sha1(targetPages.get(targetTitle))
+            if not sha1:
+                continue
+            if targetSha1 == sha1:
+                found[image] = pywikibot.FilePage(self.targetSite, targetTitle)
+            elif targetSha1:
+                for targetImage in self.targetSite.allimages(sha1=sha1,
+                                                             total=1):
+                    found[image] = targetImage
+        return found
+
+    def skipTransferred(self, imagelist):
+        """Return the images which aren't on the target site yet."""
+        found = self.findTransferred(imagelist)
+        for image, targetImage in found.items():
+            pywikibot.output('%s is already on %s as %s.'
+                             % (image.title(asLink=True), self.targetSite,
+                                targetImage.title(asLink=True)))
+        return [image for image in imagelist if image not in found]
+
+    def skipUnattended(self, imagelist):
+        """
+        Return the images which can be copied without asking.
+
+        UploadRobot asks for another name if the file name contains
+        forbidden characters or is used on the target site or its shared
+        repository, and asks whether to continue with an unknown file
+        extension. The images without a description page aren't copied at
+        all. These images are skipped, so -all never asks from several
+        worker threads at the same time.
+
+        @param imagelist: the images to transfer
+        @type imagelist: list of FilePage
+        @rtype: list of FilePage
+        """
+        pages, targetPages = self._queryImages(imagelist)
+        unattended = []
+        for image in imagelist:
+            filename = image.title(withNamespace=False)
+            extension = os.path.splitext(filename)[1].lower().strip('.')
+            pagedata = pages.get(image.title(), {})
+            targetPage = targetPages.get(self._targetTitle(image))
+            if 'missing' in pagedata or 'redirect' in pagedata:
+                reason = 'has no description page'
+            elif set(upload.forbidden_characters) & set(filename):
+                reason = 'has forbidden characters in its name'
+            elif extension not in upload.allowed_formats:
+                reason = 'has the unknown file extension "%s"' % extension
+            elif targetPage and ('missing' not in targetPage or
+                                 self._sha1(targetPage)):
+                reason = 'has a name used on %s' % self.targetSite
+            else:
+                unattended.append(image)
+                continue
+            pywikibot.output('Skipping %s: it %s.'
+                             % (image.title(asLink=True), reason))
+        return unattended
+
+    def transferImages(self, imagelist):
+        """
+        Transfer the images with up to self.workers images at a time.
+
+        Each image is downloaded and uploaded in its own worker thread. The
+        requests to each site are still throttled by the site.
+        """
+        if self.workers <= 1 or len(imagelist) <= 1:
+            for image in imagelist:
+                self.transferImage(image)
+            return
+        images = Queue.Queue()
+        for image in imagelist:
+            images.put(image)
+
+        def work():
+            while True:
+                try:
+                    image = images.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    self.transferImage(image)
+                except Exception as e:
+                    pywikibot.error('Transferring %s failed: %r'
+                                    % (image.title(asLink=True), e))
+
+        threads = [threading.Thread(target=work)
+                   for i in range(min(self.workers, len(imagelist)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
     def showImageList(self, imagelist):
         for i in range(len(imagelist)):
             image = imagelist[i]
@@ -279,6 +450,18 @@ class ImageTransferBot:
             else:
                 imagelist = list(page.imagelinks(followRedirects=True))
 
+            imagelist = self.skipTransferred(imagelist)
+            if self.transfer_all:
+                shared = [image for image in imagelist
+                          if image.fileIsShared()]
+                for image in shared:
+                    pywikibot.output(
+                        '%s is already on Wikimedia Commons.'
+                        % image.title(asLink=True))
+                self.transferImages(self.skipUnattended(
+                    [image for image in imagelist if image not in shared]))
+                continue
+
             while len(imagelist) > 0:
                 self.showImageList(imagelist)
                 if len(imagelist) == 1:
@@ -317,6 +500,8 @@ def main(*args):
 
     interwiki = False
     keep_name = False
+    transfer_all = False
+    workers = 4
     targetLang = None
     targetFamily = None
 
@@ -327,6 +512,10 @@ def main(*args):
             interwiki = True
         elif arg.startswith('-keepname'):
             keep_name = True
+        elif arg == '-all':
+            transfer_all = True
+        elif arg.startswith('-workers:'):
+            workers = int(arg[len('-workers:'):])
         elif arg.startswith('-tolang:'):
             targetLang = arg[8:]
         elif arg.startswith('-tofamily:'):
@@ -350,7 +539,8 @@ def main(*args):
             targetFamily = pywikibot.Site().family
         targetSite = pywikibot.Site(targetLang, targetFamily)
     bot = ImageTransferBot(gen, interwiki=interwiki, targetSite=targetSite,
-                           keep_name=keep_name)
+                           keep_name=keep_name, transfer_all=transfer_all,
+                           workers=workers)
     bot.run()
 
 if __name__ == "__main__":
@@ -201,6 +201,14 @@ These arguments are useful to provide hints to the bot:
                    or -hint:all:, -hint:10:, etc. without a name, or
                    an -askhint reply, where only a language is given.
 
+    -langlinksgraph remember the interlanguage links of the loaded pages
+                   in a database and use the pages known to be connected
+                   to a page as hints for it. Only the pages which changed
+                   since they were remembered are queried for their links
+                   before. Can be enabled with the config variable
+                   interwiki_langlinks_graph.
+                   (note: without ending colon)
+
 These arguments define how much user confirmation is required:
 
     -autonomous    run automatically, do not ask any questions. If a question
@@ -305,11 +313,22 @@ The following arguments influence how many pages the bot works on at once:
     -query:        The maximum number of pages that the bot will load at once.
                    Default value is 50.
 
+    -parallel:     The number of sites from which pages are loaded at the
+                   same time. The default is 4, but can be changed in the
+                   config variable interwiki_parallel_sites. Use -parallel:1
+                   to load from one site after another.
+
 Some configuration option can be used to change the working of this bot:
 
 interwiki_min_subjects: the minimum amount of subjects that should be processed
                     at the same time.
 
+interwiki_parallel_sites: the number of sites from which pages are loaded at
+                    the same time.
+
+interwiki_langlinks_graph: remember the interlanguage links in a database,
+                    see -langlinksgraph.
+
 interwiki_backlink: if set to True, all problems in foreign wikis will
                     be reported
 
@@ -355,6 +374,7 @@ import datetime
 import codecs
 import pickle
 import socket
+import threading
 
 import pywikibot
 
@@ -362,7 +382,10 @@ from pywikibot import config, i18n, pagegenerators, textlib, interwiki_graph, ti
 from pywikibot.tools import first_upper
 
 if sys.version_info[0] > 2:
+    import queue as Queue
     unicode = str
+else:
+    import Queue
 
 docuReplacements = {
     '&pagegenerators_help;': pagegenerators.parameterHelp
@@ -495,12 +518,15 @@ class Global(object):
     rememberno = False
     followinterwiki = True
     minsubjects = config.interwiki_min_subjects
+    parallelsites = config.interwiki_parallel_sites
     nobackonly = False
     askhints = False
     hintnobracket = False
     hints = []
     hintsareright = False
     contentsondisk = config.interwiki_contents_on_disk
+    langlinksgraph = config.interwiki_langlinks_graph
+    graph = None
     lacklanguage = None
     minlinks = 0
     quiet = False
@@ -605,6 +631,13 @@ class Global(object):
             self.minsubjects = int(arg[7:])
         elif arg.startswith('-query:'):
             self.maxquerysize = int(arg[7:])
+        elif arg.startswith('-parallel:'):
+            self.parallelsites = int(arg[10:])
+            if self.parallelsites < 1:
+                raise ValueError('-parallel needs at least one site, not %d'
+                                 % self.parallelsites)
+        elif arg == '-langlinksgraph':
+            self.langlinksgraph = True
         elif arg == '-back':
             self.nobackonly = True
         elif arg == '-quiet':
@@ -629,77 +662,6 @@ class Global(object):
         return True
 
 
-class StoredPage(pywikibot.Page):
-
-    """
-    Store the Page contents on disk.
-
-    This is to avoid sucking too much memory when a big number of Page objects
-    will be loaded at the same time.
-    """
-
-    # Please prefix the class members names by SP
-    # to avoid possible name clashes with pywikibot.Page
-
-    # path to the shelve
-    SPpath = None
-    # shelve
-    SPstore = None
-
-    # attributes created by pywikibot.Page.__init__
-    SPcopy = ['_editrestriction',
-              '_site',
-              '_namespace',
-              '_section',
-              '_title',
-              'editRestriction',
-              'moveRestriction',
-              '_permalink',
-              '_userName',
-              '_ipedit',
-              '_editTime',
-              '_startTime',
-              '_revisionId',
-              '_deletedRevs']
-
-    def SPdeleteStore():
-        if StoredPage.SPpath:
-            del StoredPage.SPstore
-            os.unlink(StoredPage.SPpath)
-    SPdeleteStore = staticmethod(SPdeleteStore)
-
-    def __init__(self, page):
-        for attr in StoredPage.SPcopy:
-            setattr(self, attr, getattr(page, attr))
-
-        if not StoredPage.SPpath:
-            import shelve
-            index = 1
-            while True:
-                path = config.datafilepath('cache', 'pagestore' + str(index))
-                if not os.path.exists(path):
-                    break
-                index += 1
-            StoredPage.SPpath = path
-            StoredPage.SPstore = shelve.open(path)
-
-        self.SPkey = str(self)
-        self.SPcontentSet = False
-
-    def SPgetContents(self):
-        return StoredPage.SPstore[self.SPkey]
-
-    def SPsetContents(self, contents):
-        self.SPcontentSet = True
-        StoredPage.SPstore[self.SPkey] = contents
-
-    def SPdelContents(self):
-        if self.SPcontentSet:
-            del StoredPage.SPstore[self.SPkey]
-
-    _contents = property(SPgetContents, SPsetContents, SPdelContents)
-
-
 class PageTree(object):
 
     """
@@ -842,10 +804,6 @@ class Subject(interwiki_graph.Subject):
         Takes as arguments the Page on the home wiki
         plus optionally a list of hints for translation
         """
-        if globalvar.contentsondisk:
-            if originPage:
-                originPage = StoredPage(originPage)
-
         super(Subject, self).__init__(originPage)
 
         self.repoPage = None
@@ -944,13 +902,31 @@ class Subject(interwiki_graph.Subject):
                 site=pywikibot.Site())
         for link in links:
             page = pywikibot.Page(link)
-            if globalvar.contentsondisk:
-                page = StoredPage(page)
             self.todo.add(page)
             self.foundIn[page] = [None]
             if keephintedsites:
                 self.hintedsites.add(page.site)
 
+    def translateFromGraph(self, pages):
+        """
+        Add the pages known to be connected to the origin page to the todo list.
+
+        The found pages are treated like hints.
+
+        @param pages: the pages of the component of the origin page in the
+            langlinks graph, see L{InterwikiBot.translateFromGraph}
+        @type pages: list of Page
+        @return: the pages which were added
+        @rtype: list of Page
+        """
+        added = []
+        for page in pages:
+            if page != self.originPage and page not in self.foundIn:
+                self.todo.add(page)
+                self.foundIn[page] = [None]
+                added.append(page)
+        return added
+
     def openSites(self):
         """
         Iterator.
@@ -1022,8 +998,6 @@ class Subject(interwiki_graph.Subject):
             self.foundIn[page].append(linkingPage)
             return False
         else:
-            if globalvar.contentsondisk:
-                page = StoredPage(page)
             self.foundIn[page] = [linkingPage]
             self.todo.add(page)
             counter.plus(page.site)
@@ -1330,8 +1304,6 @@ u'WARNING: %s is in namespace %i, but %s is in namespace %i. Follow it anyway?'
                     # the 1st existig page becomes the origin page, if none was
                     # supplied
                     if globalvar.initialredirect:
-                        if globalvar.contentsondisk:
-                            redirectTargetPage = StoredPage(redirectTargetPage)
                         # don't follow another redirect; it might be a self loop
                         if not redirectTargetPage.isRedirectPage() \
                            and not redirectTargetPage.isCategoryRedirect():
@@ -1394,6 +1366,8 @@ u'WARNING: %s is in namespace %i, but %s is in namespace %i. Follow it anyway?'
                     pywikibot.output(u"NOTE: site %s does not exist."
                                      % page.site)
                 continue
+            if globalvar.graph:
+                globalvar.graph.update(page)
 
             (skip, alternativePage) = self.disambigMismatch(page, counter)
             if skip:
@@ -1804,22 +1778,20 @@ u'WARNING: %s is in namespace %i, but %s is in namespace %i. Follow it anyway?'
         """
         Delete the contents that are stored on disk for this Subject.
 
-        We cannot afford to define this in a StoredPage destructor because
-        StoredPage instances can get referenced cyclicly: that would stop the
-        garbage collector from destroying some of those objects.
+        The pages can be referenced cyclicly, so their revisions and the
+        stored texts would otherwise only be freed by the garbage collector.
 
-        It's also not necessary to set these lines as a Subject destructor:
+        It's not necessary to set these lines as a Subject destructor:
         deleting all stored content one entry by one entry when bailing out
         after a KeyboardInterrupt for example is redundant, because the
-        whole storage file will be eventually removed.
+        whole storage file will be removed on exit.
         """
         if globalvar.contentsondisk:
             for page in self.foundIn:
-                # foundIn can contain either Page or StoredPage objects
-                # calling the destructor on _contents will delete the
-                # disk records if necessary
-                if hasattr(page, '_contents'):
-                    del page._contents
+                # the stored revisions remove their texts from the store
+                page._revisions.clear()
+        if globalvar.graph:
+            globalvar.graph.save()
 
     def replaceLinks(self, page, newPages):
         """Return True if saving was successful."""
@@ -2119,13 +2091,42 @@ class InterwikiBot(object):
         self.pageGenerator = None
         self.generated = 0
 
-    def add(self, page, hints=None):
-        """Add a single subject to the list."""
+    def add(self, page, hints=None, fromGraph=True):
+        """
+        Add a single subject to the list.
+
+        @param fromGraph: whether to add the pages connected to the page in
+            the langlinks graph now. generateMore adds them for all new
+            subjects together.
+        @type fromGraph: bool
+        @rtype: Subject
+        """
         subj = Subject(page, hints=hints)
         self.subjects.append(subj)
         for site, count in subj.openSites():
             # Keep correct counters
             self.plus(site, count)
+        if fromGraph:
+            self.translateFromGraph([subj])
+        return subj
+
+    def translateFromGraph(self, subjects):
+        """
+        Add the pages connected in the langlinks graph to the subjects.
+
+        The components of all subjects are refreshed together, so the pages
+        which changed since they were stored are queried per site in batches.
+
+        @type subjects: list of Subject
+        """
+        if not globalvar.graph or not subjects:
+            return
+        components = globalvar.graph.refreshComponents(
+            [subject.originPage for subject in subjects])
+        for subject in subjects:
+            for page in subject.translateFromGraph(
+                    components[subject.originPage]):
+                self.plus(page.site)
 
     def setPageGenerator(self, pageGenerator, number=None, until=None):
         """
@@ -2168,6 +2169,7 @@ class InterwikiBot(object):
                              % fs.originPage)
         pywikibot.output(u"NOTE: Number of pages queued is %d, trying to add %d more."
                          % (len(self.subjects), number))
+        added = []
         for i in range(number):
             try:
                 while True:
@@ -2215,7 +2217,8 @@ class InterwikiBot(object):
                         until = first_upper(until)
                     if page.title(withNamespace=False) > until:
                         raise StopIteration
-                self.add(page, hints=globalvar.hints)
+                added.append(self.add(page, hints=globalvar.hints,
+                                      fromGraph=False))
                 self.generated += 1
                 if self.generateNumber:
                     if self.generated >= self.generateNumber:
@@ -2223,6 +2226,7 @@ class InterwikiBot(object):
             except StopIteration:
                 self.pageGenerator = None
                 break
+        self.translateFromGraph(added)
 
     def firstSubject(self):
         """Return the first subject that is still being worked on."""
@@ -2289,6 +2293,102 @@ class InterwikiBot(object):
         # foreign page queries we can find.
         return self.maxOpenSite()
 
+    def selectQuerySites(self):
+        """
+        Select the sites the next queries should go out for.
+
+        The first site is the one selected by selectQuerySite, the others
+        are those with the most open queries, up to globalvar.parallelsites.
+
+        @rtype: list of BaseSite
+        """
+        site = self.selectQuerySite()
+        if site is None:
+            return []
+        others = sorted((other for other, count in self.counts.items()
+                         if count > 0 and other != site),
+                        key=lambda other: self.counts[other], reverse=True)
+        return [site] + others[:globalvar.parallelsites - 1]
+
+    def assembleBatches(self, sites):
+        """
+        Assemble the pages to get from each site.
+
+        The subjects are promised to work on the first of the sites which
+        they have pages of. Each subject works on only one site at a time.
+
+        @param sites: the sites in the order of preference
+        @type sites: list of BaseSite
+        @return: a tuple of site, its pages and the subjects having them
+            for each site with any pages
+        @rtype: list of tuple
+        """
+        batches = [(site, [], []) for site in sites]
+        openBatches = len(batches)
+        for subject in self.subjects:
+            for site, pageGroup, subjectGroup in batches:
+                if len(pageGroup) >= globalvar.maxquerysize:
+                    continue
+                # Promise the subject that we will work on the site.
+                # We will get a list of pages we can do.
+                pages = subject.whatsNextPageBatch(site)
+                if pages:
+                    pageGroup.extend(pages)
+                    subjectGroup.append(subject)
+                    if len(pageGroup) >= globalvar.maxquerysize:
+                        # We have found enough pages to fill the bandwidth.
+                        openBatches -= 1
+                    break
+            if openBatches == 0:
+                break
+        return [batch for batch in batches if batch[1]]
+
+    def preloadBatches(self, batches):
+        """
+        Preload the pages of the batches, each site in its own thread.
+
+        The batches are yielded as soon as their pages are loaded, while the
+        pages of the other sites are still being loaded.
+
+        @param batches: batches as returned by assembleBatches
+        @type batches: list of tuple
+        @rtype: generator of tuple
+        """
+        def preload(batch):
+            try:
+                gen = batch[0].preloadpages(batch[1], templates=True,
+                                            langlinks=True)
+                for page in gen:
+                    # we don't want to do anything with them now. The
+                    # page contents will be read via the Subject class.
+                    pass
+            except Exception as e:
+                loaded.put((batch, e))
+            else:
+                loaded.put((batch, None))
+
+        loaded = Queue.Queue()
+        if len(batches) == 1:
+            preload(batches[0])
+        else:
+            for batch in batches:
+                thread = threading.Thread(target=preload, args=(batch, ))
+                # thread dies when program terminates
+                thread.setDaemon(True)
+                thread.start()
+        for i in range(len(batches)):
+            while True:
+                # waiting without a timeout can't be interrupted by Ctrl+C
+                # on Python 2
+                try:
+                    batch, error = loaded.get(timeout=1)
+                    break
+                except Queue.Empty:
+                    pass
+            if error is not None:
+                raise error
+            yield batch
+
     def oneQuery(self):
         """
         Perform one step in the solution process.
@@ -2296,47 +2396,39 @@ class InterwikiBot(object):
         Returns True if pages could be preloaded, or false
         otherwise.
         """
-        # First find the best language to work on
-        site = self.selectQuerySite()
-        if site is None:
+        # First find the best languages to work on
+        sites = self.selectQuerySites()
+        if not sites:
             pywikibot.output(u"NOTE: Nothing left to do")
             return False
-        # Now assemble a reasonable list of pages to get
-        subjectGroup = []
-        pageGroup = []
-        for subject in self.subjects:
-            # Promise the subject that we will work on the site.
-            # We will get a list of pages we can do.
-            pages = subject.whatsNextPageBatch(site)
-            if pages:
-                pageGroup.extend(pages)
-                subjectGroup.append(subject)
-                if len(pageGroup) >= globalvar.maxquerysize:
-                    # We have found enough pages to fill the bandwidth.
-                    break
-        if len(pageGroup) == 0:
+        # Now assemble a reasonable list of pages to get from each site
+        batches = self.assembleBatches(sites)
+        if not batches:
             pywikibot.output(u"NOTE: Nothing left to do 2")
             return False
-        # Get the content of the assembled list in one blow
-        gen = site.preloadpages(pageGroup, templates=True, langlinks=True)
-        for page in gen:
-            # we don't want to do anything with them now. The
-            # page contents will be read via the Subject class.
-            pass
-        # Tell all of the subjects that the promised work is done
-        for subject in subjectGroup:
-            subject.batchLoaded(self)
+        # Get the content of the assembled lists concurrently
+        for site, pageGroup, subjectGroup in self.preloadBatches(batches):
+            # Tell all of the subjects that the promised work is done
+            for subject in subjectGroup:
+                subject.batchLoaded(self)
+            self.finishSubjects(subjectGroup)
         return True
 
+    def finishSubjects(self, subjects):
+        """Finish and delete the subjects which are done now."""
+        done = [subj for subj in subjects if subj.isDone()]
+        for subj in done:
+            subj.finish()
+            subj.clean()
+        if done:
+            done = set(id(subj) for subj in done)
+            self.subjects = [subj for subj in self.subjects
+                             if id(subj) not in done]
+
     def queryStep(self):
-        self.oneQuery()
-        # Delete the ones that are done now.
-        for i in range(len(self.subjects) - 1, -1, -1):
-            subj = self.subjects[i]
-            if subj.isDone():
-                subj.finish()
-                subj.clean()
-                del self.subjects[i]
+        if not self.oneQuery():
+            # Delete the ones that are done now.
+            self.finishSubjects(self.subjects)
 
     def isDone(self):
         """Check whether there is still more work to do."""
@@ -2531,6 +2623,13 @@ def main(*args):
                 if not singlePageTitle:
                     singlePageTitle = arg
 
+    if globalvar.contentsondisk:
+        # keep the page contents of all subjects in a temporary file
+        config.page_contents_on_disk = True
+
+    if globalvar.langlinksgraph:
+        globalvar.graph = interwiki_graph.LanglinksGraph()
+
     # Do not use additional summary with autonomous mode
     if globalvar.autonomous:
         globalvar.summary = u''
@@ -2619,8 +2718,8 @@ def main(*args):
         dumpFileName = bot.dump(append)
         raise
     finally:
-        if globalvar.contentsondisk:
-            StoredPage.SPdeleteStore()
+        if globalvar.graph:
+            globalvar.graph.close()
         if dumpFileName:
             try:
                 restoredFiles.remove(dumpFileName)
@@ -4,10 +4,15 @@
 Program to match two images based on histograms.
 
 Usage:
-match_images.py ImageA ImageB
+match_images.py ImageA ImageB [ImageC ...]
 It is essential to provide two images to work on.
 example. - match_images.py ImageA.jpg ImageB.jpg
 
+If more than two images are given, ImageA is compared with the perceptual
+hashes of all other images first and only the images with similar hashes are
+compared in detail. The hashes are stored by the SHA-1 of the files, so each
+file is only downloaded once to be hashed.
+
 &params;
 
 Furthermore, the following command line parameters are supported:
@@ -20,6 +25,10 @@ Furthermore, the following command line parameters are supported:
                     fetching file usage details instead of the default
                     mylang retrieved from user-congig.py script.
 
+-distance:n         The number of bits in which the perceptual hashes of
+                    images may differ to be compared in detail. The default
+                    is 10 of 64 bits.
+
 This is just a first version so that other people can play around with it.
 Expect the code to change a lot!
 """
@@ -34,10 +43,21 @@ __version__ = '$Id$'
 
 
 import io
+import json
+import os
+
 from PIL import Image
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import pywikibot
+from pywikibot import config
 from pywikibot.comms import http
+from pywikibot.data import api
+from pywikibot.tools import itergroup
 
 
 def match_image_pages(imagePageA, imagePageB):
@@ -122,15 +142,17 @@ def match_images(imageA, imageB):
     histogramA = imageA.histogram()
     histogramB = imageB.histogram()
 
-    totalMatch = 0
-    totalPixels = 0
-
     if len(histogramA) != len(histogramB):
         return 0
 
-    for i in range(0, len(histogramA)):
-        totalMatch = totalMatch + min(histogramA[i], histogramB[i])
-        totalPixels = totalPixels + max(histogramA[i], histogramB[i])
+    if numpy:
+        histogramA = numpy.array(histogramA)
+        histogramB = numpy.array(histogramB)
+        totalMatch = int(numpy.minimum(histogramA, histogramB).sum())
+        totalPixels = int(numpy.maximum(histogramA, histogramB).sum())
+    else:
+        totalMatch = sum(map(min, histogramA, histogramB))
+        totalPixels = sum(map(max, histogramA, histogramB))
 
     if totalPixels == 0:
         return 0
@@ -138,11 +160,174 @@ def match_images(imageA, imageB):
     return totalMatch / totalPixels
 
 
+def image_hash(image, size=8):
+    """
+    Return the difference hash of an image object.
+
+    The image is reduced to size + 1 by size grey pixels and each bit of
+    the hash tells whether a pixel is brighter than its left neighbour.
+    Similar images have hashes which only differ in a few bits.
+
+    @param image: the image
+    @type image: PIL.Image.Image
+    @param size: the number of rows and of bits per row of the hash
+    @type size: int
+    @rtype: int
+    """
+    image = image.convert('L').resize((size + 1, size), Image.ANTIALIAS)
+    if numpy:
+        pixels = numpy.asarray(image, dtype=numpy.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    else:
+        pixels = list(image.getdata())
+        bits = [pixels[row * (size + 1) + column + 1] >
+                pixels[row * (size + 1) + column]
+                for row in range(size) for column in range(size)]
+    value = 0
+    for bit in bits:
+        value = value << 1 | bool(bit)
+    return value
+
+
+def hash_distances(value, hashes):
+    """
+    Return the number of bits in which each of the hashes differs from value.
+
+    @param value: the hash to compare with
+    @type value: int
+    @param hashes: the 64 bit hashes to compare
+    @type hashes: list of int
+    @rtype: list of int
+    """
+    if numpy and hashes:
+        differences = numpy.array(hashes, dtype=numpy.uint64)
+        differences ^= numpy.uint64(value)
+        bits = numpy.unpackbits(differences.view(numpy.uint8))
+        return bits.reshape(len(hashes), 64).sum(axis=1).tolist()
+    return [bin(value ^ other).count('1') for other in hashes]
+
+
+class ImageHashIndex(object):
+
+    """
+    Perceptual hashes of files, stored by the SHA-1 of the files.
+
+    A file is only downloaded if the hash of its current version is unknown.
+    The SHA-1 of the current versions of the files are loaded in batches.
+    """
+
+    def __init__(self, filename=None):
+        """
+        Constructor.
+
+        @param filename: the JSON file of the hashes, by default
+            image-hashes.json in the data directory. None doesn't store them.
+        @type filename: str
+        """
+        if filename is None:
+            filename = config.datafilepath('image-hashes.json')
+        self.filename = filename
+        self.hashes = {}
+        # the SHA-1 of the current version of each loaded file page
+        self._sha1 = {}
+        self._changed = False
+        if filename and os.path.exists(filename):
+            with open(filename) as f:
+                self.hashes = dict((sha1, int(value, 16))
+                                   for sha1, value in json.load(f).items())
+
+    @staticmethod
+    def _query(site, titles, step=50):
+        """Return the SHA-1 of the current version of each existing file."""
+        hashes = {}
+        for group in itergroup(titles, step):
+            for pagedata in api.PropertyGenerator('imageinfo', site=site,
+                                                  titles='|'.join(group),
+                                                  iiprop='sha1'):
+                if pagedata.get('imageinfo'):
+                    hashes[pagedata['title']] = pagedata['imageinfo'][0]['sha1']
+        return hashes
+
+    def load(self, imagePages):
+        """
+        Load the SHA-1 of the current versions of the file pages.
+
+        @type imagePages: iterable of FilePage
+        """
+        sites = {}
+        for imagePage in imagePages:
+            if imagePage not in self._sha1:
+                sites.setdefault(imagePage.site, []).append(imagePage)
+        for site, pages in sites.items():
+            hashes = self._query(site, [page.title() for page in pages])
+            for page in pages:
+                self._sha1[page] = hashes.get(page.title())
+
+    def get(self, imagePage):
+        """
+        Return the perceptual hash of the current version of a file page.
+
+        @type imagePage: FilePage
+        @rtype: int
+        """
+        sha1 = self._sha1.get(imagePage)
+        if sha1 is None:
+            sha1 = imagePage.latest_file_info.sha1
+        if sha1 not in self.hashes:
+            image = get_image_from_image_page(imagePage)
+            self.hashes[sha1] = image_hash(image)
+            self._changed = True
+        return self.hashes[sha1]
+
+    def similar(self, imagePage, candidates, maxDistance=10):
+        """
+        Return the candidates whose hash is close to the hash of imagePage.
+
+        @param imagePage: the file to compare with
+        @type imagePage: FilePage
+        @param candidates: the files to compare
+        @type candidates: iterable of FilePage
+        @param maxDistance: the number of bits in which the hashes may differ
+        @type maxDistance: int
+        @return: the similar candidates with the distance of their hashes,
+            the most similar first
+        @rtype: list of (FilePage, int)
+        """
+        candidates = list(candidates)
+        self.load([imagePage] + candidates)
+        value = self.get(imagePage)
+        distances = hash_distances(value, [self.get(candidate)
+                                           for candidate in candidates])
+        found = [(candidate, distance)
+                 for candidate, distance in zip(candidates, distances)
+                 if distance <= maxDistance]
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def save(self):
+        """Write the hashes to the file if they changed."""
+        if not self.filename or not self._changed:
+            return
+        # replace the file at once, so it is never half written
+        temp = self.filename + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(dict((sha1, '%016x' % value)
+                           for sha1, value in self.hashes.items()), f)
+        try:
+            os.rename(temp, self.filename)
+        except OSError:
+            # Windows doesn't replace an existing file
+            os.remove(self.filename)
+            os.rename(temp, self.filename)
+        self._changed = False
+
+
 def main(*args):
     """Extracting file page information of images to work on and initiate matching."""
     images = []
     other_family = u''
     other_lang = u''
+    maxDistance = 10
     imagePageA = None
     imagePageB = None
 
@@ -160,10 +345,12 @@ def main(*args):
                 other_lang = pywikibot.input(u'What language do you want to use?')
             else:
                 other_lang = arg[len('otherlang:'):]
+        elif arg.startswith('-distance:'):
+            maxDistance = int(arg[len('-distance:'):])
         else:
             images.append(arg)
 
-    if len(images) != 2:
+    if len(images) < 2:
         pywikibot.showHelp('match_images')
         pywikibot.error('Require two images to work on.')
         return
@@ -175,18 +362,29 @@ def main(*args):
                                          images[0])
     if other_lang:
         if other_family:
-            imagePageB = pywikibot.page.FilePage(pywikibot.Site(
-                                                 other_lang, other_family),
-                                                 images[1])
+            siteB = pywikibot.Site(other_lang, other_family)
         else:
-            imagePageB = pywikibot.page.FilePage(pywikibot.Site(
-                                                 other_lang),
-                                                 images[1])
+            siteB = pywikibot.Site(other_lang)
     else:
-        imagePageB = pywikibot.page.FilePage(pywikibot.Site(),
-                                             images[1])
+        siteB = pywikibot.Site()
+    imagePagesB = [pywikibot.page.FilePage(siteB, image)
+                   for image in images[1:]]
+
+    if len(imagePagesB) == 1:
+        match_image_pages(imagePageA, imagePagesB[0])
+        return
 
-    match_image_pages(imagePageA, imagePageB)
+    index = ImageHashIndex()
+    try:
+        similar = index.similar(imagePageA, imagePagesB, maxDistance)
+    finally:
+        index.save()
+    if not similar:
+        pywikibot.output('No similar images found.')
+    for imagePageB, distance in similar:
+        pywikibot.output('{0} differs in {1} bits of the hash.'.format(
+            imagePageB.title(), distance))
+        match_image_pages(imagePageA, imagePageB)
 
 
 if __name__ == "__main__":
@@ -549,6 +549,7 @@ class NoReferencesBot(Bot):
             pywikibot.output('Repairing references tag')
             return re.sub(pattern, '<references />', oldText)
 
+        disabledParts = textlib.DisabledParts(oldText)
         # Is there an existing section where we can add the references tag?
         for section in i18n.translate(self.site, referencesSections):
             sectionR = re.compile(r'\r?\n=+ *%s *=+ *\r?\n' % section)
@@ -556,7 +557,7 @@ class NoReferencesBot(Bot):
             while index < len(oldText):
                 match = sectionR.search(oldText, index)
                 if match:
-                    if textlib.isDisabled(oldText, match.start()):
+                    if disabledParts.isDisabled(match.start()):
                         pywikibot.output(
                             'Existing  %s section is commented out, skipping.'
                             % section)
@@ -583,7 +584,7 @@ class NoReferencesBot(Bot):
             while index < len(oldText):
                 match = sectionR.search(oldText, index)
                 if match:
-                    if textlib.isDisabled(oldText, match.start()):
+                    if disabledParts.isDisabled(match.start()):
                         pywikibot.output(
                             'Existing %s section is commented out, won\'t add '
                             'the references in front of it.' % section)
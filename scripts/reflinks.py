@@ -36,9 +36,16 @@ See [[:en:User:DumZiBoT/refLinks]] for more information on the bot.
 
 -summary          Use a custom edit summary. Otherwise it uses the default
                   one from i18n/reflinks.py
+
+-cache:n          Reuse the titles fetched for a link during the last n days
+                  (default 30). Use -cache:0 to fetch every link again.
+
+The links of the next pages are fetched in parallel, while the current page
+is processed. The fetched titles are stored in reflinks-metadata.sqlite3 in
+the data directory.
 """
 # (C) Nicolas Dumazet (NicDumZ), 2008
-# (C) Pywikibot team, 2008-2014
+# (C) Pywikibot team, 2008-2015
 #
 # Distributed under the terms of the MIT license.
 #
@@ -49,12 +56,17 @@ __version__ = '$Id$'
 import re
 import socket
 import codecs
+import collections
 import subprocess
 import tempfile
 import os
 import gzip
+import json
+import sqlite3
 import sys
 import io
+import threading
+import time
 
 import pywikibot
 
@@ -68,9 +80,11 @@ if sys.version_info[0] > 2:
     from urllib.request import urlopen
     from urllib.error import HTTPError, URLError
     import http.client as httplib
+    import queue as Queue
 else:
     from urllib2 import quote, urlopen, HTTPError, URLError
     import httplib
+    import Queue
 
 docuReplacements = {
     '&params;': pagegenerators.parameterHelp
@@ -294,6 +308,189 @@ class RefLink(object):
             self.title = self.title.title()
 
 
+class MetadataCache(object):
+
+    """
+    Store the metadata fetched for URLs in a SQLite database.
+
+    The entries are kept for maxage days. It may be used by several threads.
+    """
+
+    def __init__(self, filename, maxage=30):
+        """
+        Constructor.
+
+        @param filename: the database file
+        @type filename: str
+        @param maxage: number of days after which an entry is fetched again
+        @type maxage: int
+        """
+        self.maxage = maxage * 24 * 60 * 60
+        self._lock = threading.Lock()
+        self._changes = 0
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS metadata ('
+            'url TEXT PRIMARY KEY, time REAL NOT NULL, data TEXT NOT NULL)')
+
+    def get(self, url):
+        """Return the metadata of the URL or None if unknown or outdated."""
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT time, data FROM metadata WHERE url = ?',
+                (url, )).fetchone()
+        if row and time.time() - row[0] < self.maxage:
+            return json.loads(row[1])
+        return None
+
+    def set(self, url, metadata):
+        """Store the metadata of the URL unless the cache was closed."""
+        with self._lock:
+            if self.connection is None:
+                return
+            self.connection.execute(
+                'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?)',
+                (url, time.time(), json.dumps(metadata)))
+            self._changes += 1
+            if self._changes >= 100:
+                self.connection.commit()
+                self._changes = 0
+
+    def close(self):
+        """Commit the changes and close the database."""
+        with self._lock:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+
+class MetadataFetcher(object):
+
+    """
+    Fetch the metadata of URLs with a fixed number of worker threads.
+
+    URLs are queued with submit() and the metadata returned by fetch is
+    available from result(), which blocks until it has been fetched. At most
+    perHost URLs of the same host are fetched at the same time. A URL which
+    is submitted several times is only fetched once, and its result is kept
+    until result() was called as often as it was submitted.
+
+    If a cache is given, the metadata is taken from it if possible and the
+    fetched metadata is stored in it unless its 'transient' key is true.
+
+    stop() ends the workers. URLs which are still queued are not fetched.
+    """
+
+    def __init__(self, fetch, workers=10, perHost=2, cache=None):
+        """
+        Constructor.
+
+        @param fetch: function which returns the metadata of a URL as a dict
+        @type fetch: callable
+        @param workers: number of worker threads
+        @type workers: int
+        @param perHost: number of URLs fetched from one host at the same time
+        @type perHost: int
+        @param cache: the cache of the metadata
+        @type cache: MetadataCache
+        """
+        self.fetch = fetch
+        self.perHost = perHost
+        self.cache = cache
+        self.queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # url -> [event, number of submits, metadata]
+        self._entries = {}
+        self._slots = {}
+        self.workers = []
+        for number in range(workers):
+            thread = threading.Thread(target=self._work,
+                                      name='RefLinksFetcher-%d' % number)
+            # thread dies when program terminates
+            thread.setDaemon(True)
+            thread.start()
+            self.workers.append(thread)
+
+    def submit(self, url):
+        """Queue the URL to be fetched."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                entry[1] += 1
+                return
+            entry = self._entries[url] = [threading.Event(), 1, None]
+        metadata = self.cache.get(url) if self.cache else None
+        if metadata is None:
+            self.queue.put(url)
+        else:
+            entry[2] = metadata
+            entry[0].set()
+
+    def result(self, url):
+        """
+        Return the metadata of a submitted URL.
+
+        @rtype: dict
+        """
+        with self._lock:
+            entry = self._entries[url]
+        entry[0].wait()
+        with self._lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._entries[url]
+        return entry[2]
+
+    def stop(self):
+        """Stop the workers and wait until they fetched their current URL."""
+        self._stopped.set()
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            url = self.queue.get()
+            if url is None:
+                break
+            with self._lock:
+                entry = self._entries[url]
+            metadata = None
+            try:
+                if not self._stopped.isSet():
+                    metadata = self._fetch(url)
+            finally:
+                # never leave result() waiting
+                entry[2] = metadata
+                entry[0].set()
+
+    def _fetch(self, url):
+        host = domain.match(url)
+        host = host.group(2) if host else None
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(
+                    self.perHost)
+        with slot:
+            try:
+                metadata = self.fetch(url)
+            except Exception as e:
+                metadata = {'url': url, 'status': 'error',
+                            'transient': True,
+                            'message': 'Can\'t retrieve page %s : %s'
+                                       % (url, e)}
+        if self.cache and not metadata.get('transient'):
+            try:
+                self.cache.set(url, metadata)
+            except sqlite3.Error as e:
+                pywikibot.warning('Could not cache the metadata of %s: %s'
+                                  % (url, e))
+        return metadata
+
+
 class DuplicateReferences(object):
 
     """Helper to de-duplicate references in text.
@@ -411,12 +608,22 @@ class ReferencesRobot(Bot):
 
     """References bot."""
 
+    # number of pages whose links are fetched before the page is processed
+    lookahead = 20
+    # number of threads fetching the links
+    workers = 10
+    # number of links fetched from the same host at the same time
+    perHost = 2
+    # seconds to wait for a server
+    timeout = 20
+
     def __init__(self, generator, **kwargs):
         """- generator : Page generator."""
         self.availableOptions.update({
             'ignorepdf': False,  # boolean
             'limit': None,  # int, stop after n modified pages
             'summary': None,
+            'cache': 30,  # int, days the fetched metadata is reused
         })
 
         super(ReferencesRobot, self).__init__(**kwargs)
@@ -472,27 +679,32 @@ class ReferencesRobot(Bot):
         pywikibot.output(u'HTTP error (%s) for %s on %s'
                          % (err_num, link, pagetitleaslink), toStdout=True)
 
-    def getPDFTitle(self, ref, f):
+    def getPDFTitle(self, f):
         """Use pdfinfo to retrieve title from a PDF.
 
         FIXME: Unix-only, I'm afraid.
 
+        @param f: the opened PDF file
+        @return: the title or None
+        @rtype: unicode
         """
         pywikibot.output(u'PDF file.')
+        title = None
         fd, infile = tempfile.mkstemp()
-        urlobj = os.fdopen(fd, 'r+w')
+        urlobj = os.fdopen(fd, 'w+b')
         urlobj.write(f.read())
+        urlobj.seek(0)
         try:
             pdfinfo_out = subprocess.Popen([r"pdfinfo", "/dev/stdin"],
                                            stdin=urlobj, stdout=subprocess.PIPE,
                                            stderr=subprocess.PIPE,
                                            shell=False).communicate()[0]
+            pdfinfo_out = pdfinfo_out.decode('utf-8', 'replace')
             for aline in pdfinfo_out.splitlines():
                 if aline.lower().startswith('title'):
-                    ref.title = aline.split(None)[1:]
-                    ref.title = ' '.join(ref.title)
-                    if ref.title != '':
-                        pywikibot.output(u'title: %s' % ref.title)
+                    title = ' '.join(aline.split(None)[1:])
+                    if title != '':
+                        pywikibot.output(u'title: %s' % title)
             pywikibot.output(u'PDF done.')
         except ValueError:
             pywikibot.output(u'pdfinfo value error.')
@@ -504,6 +716,285 @@ class ReferencesRobot(Bot):
         finally:
             urlobj.close()
             os.unlink(infile)
+        return title
+
+    def fetchMetadata(self, url):
+        """
+        Load a referenced URL and return what is needed to replace its link.
+
+        It only depends on the URL and not on the page containing the link,
+        so it runs in the worker threads and its result is cached.
+
+        @param url: the URL without fragment
+        @type url: unicode
+        @return: the metadata with the key 'status' which is 'html' with the
+            found 'titles', 'media' with the PDF 'title' (or None) and whether
+            it is a 'pdf', 'httperror' with the HTTP status 'code', 'badlink',
+            or 'skip' and 'error' with a 'message' (which may be None). 'url'
+            is the URL which was loaded. If 'transient' is true, the metadata
+            must not be cached.
+        @rtype: dict
+        """
+        metadata = {'url': url}
+
+        def skip(message, transient=False):
+            metadata.update(status='skip', message=message,
+                            transient=transient)
+            return metadata
+
+        f = None
+        try:
+            try:
+                url.encode('ascii')
+            except UnicodeError:
+                url = quote(url.encode('utf8'), '://')
+                metadata['url'] = url
+            f = urlopen(url, timeout=self.timeout)
+            # Try to get Content-Type from server
+            headers = f.info()
+            if sys.version_info[0] > 2:
+                contentType = headers.get_content_type()
+            else:
+                contentType = headers.getheader('Content-Type')
+            if contentType and not self.MIME.search(contentType):
+                metadata.update(status='media', title=None,
+                                pdf=url.lower().endswith('.pdf'))
+                if metadata['pdf']:
+                    if self.getOption('ignorepdf'):
+                        # the title might be fetched in another run
+                        metadata['transient'] = True
+                    else:
+                        # If file has a PDF suffix
+                        metadata['title'] = self.getPDFTitle(f)
+                return metadata
+            # Get the real url where we end (http redirects !)
+            redir = f.geturl()
+            if redir != url and domain.findall(redir) == domain.findall(url):
+                if soft404.search(redir) and not soft404.search(url):
+                    return skip(u'\03{lightyellow}WARNING\03{default} : '
+                                u'Redirect 404 : %s ' % url)
+                if dirIndex.match(redir) and not dirIndex.match(url):
+                    return skip(u'\03{lightyellow}WARNING\03{default} : '
+                                u'Redirect to root : %s ' % url)
+
+            # uncompress if necessary
+            if headers.get('Content-Encoding') in ('gzip', 'x-gzip'):
+                # XXX: small issue here: the whole page is downloaded
+                # through f.read(). It might fetch big files/pages.
+                # However, truncating an encoded gzipped stream is not
+                # an option, or unzipping will fail.
+                compressed = io.BytesIO(f.read())
+                f = gzip.GzipFile(fileobj=compressed)
+
+            # Read the first 1,000,000 bytes (0.95 MB)
+            linkedpagetext = f.read(1000000)
+
+        except UnicodeError:
+            # example : http://www.adminet.com/jo/20010615¦/ECOC0100037D.html
+            # in [[fr:Cyanure]]
+            metadata['status'] = 'badlink'
+            return metadata
+        except HTTPError as e:
+            # server errors and rate limits are only temporary
+            metadata.update(status='httperror', code=e.code,
+                            transient=e.code >= 500 or e.code == 429)
+            return metadata
+        except (URLError,
+                socket.error,
+                IOError,
+                httplib.error) as e:
+            metadata.update(status='error', transient=True,
+                            message=u'Can\'t retrieve page %s : %s' % (url, e))
+            return metadata
+        except ValueError:
+            # Known bug of httplib, google for :
+            # "httplib raises ValueError reading chunked content"
+            return skip(None, transient=True)
+        finally:
+            if f:
+                f.close()
+
+        # remove <script>/<style>/comments/CDATA tags
+        linkedpagetext = self.NON_HTML.sub(b'', linkedpagetext)
+
+        meta_content = self.META_CONTENT.search(linkedpagetext)
+        enc = []
+        s = None
+        if contentType:
+            # use charset from http header
+            s = self.CHARSET.search(contentType)
+        if meta_content:
+            tag = meta_content.group()
+            # Prefer the contentType from the HTTP header :
+            if not contentType:
+                contentType = tag
+            if not s:
+                # use charset from html
+                s = self.CHARSET.search(tag)
+        if s:
+            tmp = s.group('enc').strip("\"' ").lower()
+            naked = re.sub(r'[ _\-]', '', tmp)
+            # Convert to python correct encoding names
+            if naked == "gb2312":
+                enc.append("gbk")
+            elif naked == "shiftjis":
+                enc.append("shift jis 2004")
+                enc.append("cp932")
+            elif naked == "xeucjp":
+                enc.append("euc-jp")
+            else:
+                enc.append(tmp)
+        else:
+            pywikibot.output(u'No charset found for %s' % url)
+        if not contentType:
+            return skip(u'No content-type found for %s' % url)
+        elif not self.MIME.search(contentType):
+            metadata.update(status='media', title=None, pdf=False)
+            return metadata
+
+        # Ugly hacks to try to survive when both server and page
+        # return no encoding.
+        # Uses most used encodings for each national suffix
+        if u'.ru' in url or u'.su' in url:
+            # see http://www.sci.aha.ru/ATL/ra13a.htm : no server
+            # encoding, no page encoding
+            enc = enc + ['koi8-r', 'windows-1251']
+        elif u'.jp' in url:
+            enc.append("shift jis 2004")
+            enc.append("cp932")
+        elif u'.kr' in url:
+            enc.append("euc-kr")
+            enc.append("cp949")
+        elif u'.zh' in url:
+            enc.append("gbk")
+
+        if 'utf-8' not in enc:
+            enc.append('utf-8')
+        try:
+            u = linkedpagetext.decode(enc[0])   # Bug 67410
+        except (UnicodeDecodeError, LookupError) as e:
+            return skip(u'%s : Decoding error - %s' % (url, e))
+
+        # All non empty strings inside <title> tags
+        metadata.update(status='html',
+                        titles=[m.group() for m in self.TITLE.finditer(u)
+                                if m.group()])
+        return metadata
+
+    def getReplacement(self, ref, metadata, page, deadLinks):
+        """
+        Return the new reference using the fetched metadata.
+
+        @param ref: the bare reference
+        @type ref: RefLink
+        @param metadata: the metadata returned by fetchMetadata
+        @type metadata: dict
+        @param page: the page containing the reference
+        @type page: pywikibot.Page
+        @param deadLinks: the content of the list of dead links
+        @type deadLinks: unicode
+        @return: the new reference or None if it isn't changed
+        @rtype: unicode
+        """
+        ref.url = metadata['url']
+        status = metadata['status']
+        if status == 'badlink':
+            pywikibot.output(
+                u'\03{lightred}Bad link\03{default} : %s in %s'
+                % (ref.url, page.title(asLink=True)))
+            return None
+        elif status == 'httperror':
+            pywikibot.output(u'HTTP error (%s) for %s on %s'
+                             % (metadata['code'], ref.url,
+                                page.title(asLink=True)),
+                             toStdout=True)
+            # 410 Gone, indicates that the resource has been purposely
+            # removed
+            if (metadata['code'] == 410 or
+                    (metadata['code'] == 404 and
+                     u'\t%s\t' % ref.url in deadLinks)):
+                return ref.refDead()
+            return None
+        elif status in ('skip', 'error'):
+            if metadata['message']:
+                pywikibot.output(metadata['message'])
+            return None
+        elif status == 'media':
+            if not metadata['pdf'] or self.getOption('ignorepdf'):
+                pywikibot.output(
+                    u'\03{lightyellow}WARNING\03{default} : '
+                    u'media : %s ' % ref.link)
+            ref.title = metadata['title']
+            if ref.title:
+                if not re.match(u'(?i) *microsoft (word|excel|visio)',
+                                ref.title):
+                    ref.transform(ispdf=True)
+                    return ref.refTitle()
+                else:
+                    pywikibot.output(
+                        u'\03{lightyellow}WARNING\03{default} : '
+                        u'PDF title blacklisted : %s ' % ref.title)
+            return ref.refLink()
+
+        # Retrieves the first non empty string inside <title> tags
+        for t in metadata['titles']:
+            ref.title = t
+            ref.transform()
+            if ref.title:
+                break
+
+        if not ref.title:
+            pywikibot.output(u'%s : No title found...' % ref.link)
+            return ref.refLink()
+
+        # XXX Ugly hack
+        if u'Ã©' in ref.title:
+            pywikibot.output(u'%s : Hybrid encoding...' % ref.link)
+            return ref.refLink()
+
+        if self.titleBlackList.match(ref.title):
+            pywikibot.output(u'\03{lightred}WARNING\03{default} %s : '
+                             u'Blacklisted title (%s)'
+                             % (ref.link, ref.title))
+            return ref.refLink()
+
+        # Truncate long titles. 175 is arbitrary
+        if len(ref.title) > 175:
+            ref.title = ref.title[:175] + "..."
+
+        return ref.refTitle()
+
+    def prefetch(self, fetcher):
+        """
+        Yield the pages with their bare references.
+
+        The references of the next lookahead pages are submitted to the
+        fetcher before a page is yielded.
+
+        @rtype: generator of (pywikibot.Page, list of (match, RefLink))
+        """
+        window = collections.deque()
+        for page in self.generator:
+            refs = []
+            try:
+                if page.canBeEdited():
+                    for match in linksInRef.finditer(
+                            textlib.removeDisabledParts(page.get())):
+                        link = match.group(u'url')
+                        if u'jstor.org' in link:
+                            # TODO: Clean URL blacklist
+                            continue
+                        ref = RefLink(link, match.group('name'))
+                        fetcher.submit(ref.url)
+                        refs.append((match, ref))
+            except (pywikibot.NoPage, pywikibot.IsRedirectPage):
+                # reported when the page is processed
+                pass
+            window.append((page, refs))
+            if len(window) > self.lookahead:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
 
     def run(self):
         """Run the Bot."""
@@ -515,9 +1006,24 @@ class ReferencesRobot(Bot):
                 'http://www.twoevils.org/files/wikipedia/404-links.txt.gz '
                 'and to ungzip it in the same directory')
             raise
-        socket.setdefaulttimeout(30)
+        if self.getOption('cache'):
+            cache = MetadataCache(
+                pywikibot.config.datafilepath('reflinks-metadata.sqlite3'),
+                self.getOption('cache'))
+        else:
+            cache = None
+        fetcher = MetadataFetcher(self.fetchMetadata, self.workers,
+                                  self.perHost, cache)
+        try:
+            self._run(fetcher, deadLinks)
+        finally:
+            fetcher.stop()
+            if cache:
+                cache.close()
+
+    def _run(self, fetcher, deadLinks):
         editedpages = 0
-        for page in self.generator:
+        for page, refs in self.prefetch(fetcher):
             try:
                 # Load the page's text from the wiki
                 new_text = page.get()
@@ -534,222 +1040,11 @@ class ReferencesRobot(Bot):
                 continue
 
             # for each link to change
-            for match in linksInRef.finditer(
-                    textlib.removeDisabledParts(page.get())):
-
-                link = match.group(u'url')
-                # debugging purpose
-                # print link
-                if u'jstor.org' in link:
-                    # TODO: Clean URL blacklist
-                    continue
-
-                ref = RefLink(link, match.group('name'))
-                f = None
-                try:
-                    socket.setdefaulttimeout(20)
-                    try:
-                        f = urlopen(ref.url.decode("utf8"))
-                    except UnicodeError:
-                        ref.url = quote(ref.url.encode("utf8"), "://")
-                        f = urlopen(ref.url)
-                    # Try to get Content-Type from server
-                    headers = f.info()
-                    if sys.version_info[0] > 2:
-                        contentType = headers.get_content_type()
-                    else:
-                        contentType = headers.getheader('Content-Type')
-                    if contentType and not self.MIME.search(contentType):
-                        if ref.link.lower().endswith('.pdf') and \
-                           not self.getOption('ignorepdf'):
-                            # If file has a PDF suffix
-                            self.getPDFTitle(ref, f)
-                        else:
-                            pywikibot.output(
-                                u'\03{lightyellow}WARNING\03{default} : '
-                                u'media : %s ' % ref.link)
-                        if ref.title:
-                            if not re.match(
-                                    u'(?i) *microsoft (word|excel|visio)',
-                                    ref.title):
-                                ref.transform(ispdf=True)
-                                repl = ref.refTitle()
-                            else:
-                                pywikibot.output(
-                                    u'\03{lightyellow}WARNING\03{default} : '
-                                    u'PDF title blacklisted : %s ' % ref.title)
-                                repl = ref.refLink()
-                        else:
-                            repl = ref.refLink()
-                        new_text = new_text.replace(match.group(), repl)
-                        continue
-                    # Get the real url where we end (http redirects !)
-                    redir = f.geturl()
-                    if redir != ref.link and \
-                       domain.findall(redir) == domain.findall(link):
-                        if soft404.search(redir) and \
-                           not soft404.search(ref.link):
-                            pywikibot.output(
-                                u'\03{lightyellow}WARNING\03{default} : '
-                                u'Redirect 404 : %s ' % ref.link)
-                            continue
-                        if dirIndex.match(redir) and \
-                           not dirIndex.match(ref.link):
-                            pywikibot.output(
-                                u'\03{lightyellow}WARNING\03{default} : '
-                                u'Redirect to root : %s ' % ref.link)
-                            continue
-
-                    # uncompress if necessary
-                    if headers.get('Content-Encoding') in ('gzip', 'x-gzip'):
-                        # XXX: small issue here: the whole page is downloaded
-                        # through f.read(). It might fetch big files/pages.
-                        # However, truncating an encoded gzipped stream is not
-                        # an option, or unzipping will fail.
-                        compressed = io.BytesIO(f.read())
-                        f = gzip.GzipFile(fileobj=compressed)
-
-                    # Read the first 1,000,000 bytes (0.95 MB)
-                    linkedpagetext = f.read(1000000)
-                    socket.setdefaulttimeout(None)
-
-                except UnicodeError:
-                    # example : http://www.adminet.com/jo/20010615¦/ECOC0100037D.html
-                    # in [[fr:Cyanure]]
-                    pywikibot.output(
-                        u'\03{lightred}Bad link\03{default} : %s in %s'
-                        % (ref.url, page.title(asLink=True)))
-                    continue
-                except HTTPError as e:
-                    pywikibot.output(u'HTTP error (%s) for %s on %s'
-                                     % (e.code, ref.url,
-                                        page.title(asLink=True)),
-                                     toStdout=True)
-                    # 410 Gone, indicates that the resource has been purposely
-                    # removed
-                    if e.code == 410 or \
-                       (e.code == 404 and (u'\t%s\t' % ref.url in deadLinks)):
-                        repl = ref.refDead()
-                        new_text = new_text.replace(match.group(), repl)
-                    continue
-                except (URLError,
-                        socket.error,
-                        IOError,
-                        httplib.error) as e:
-                    pywikibot.output(u'Can\'t retrieve page %s : %s'
-                                     % (ref.url, e))
-                    continue
-                except ValueError:
-                    # Known bug of httplib, google for :
-                    # "httplib raises ValueError reading chunked content"
-                    continue
-                finally:
-                    if f:
-                        f.close()
-
-                # remove <script>/<style>/comments/CDATA tags
-                linkedpagetext = self.NON_HTML.sub(b'', linkedpagetext)
-
-                meta_content = self.META_CONTENT.search(linkedpagetext)
-                enc = []
-                s = None
-                if contentType:
-                    # use charset from http header
-                    s = self.CHARSET.search(contentType)
-                if meta_content:
-                    tag = meta_content.group()
-                    # Prefer the contentType from the HTTP header :
-                    if not contentType:
-                        contentType = tag
-                    if not s:
-                        # use charset from html
-                        s = self.CHARSET.search(tag)
-                if s:
-                    tmp = s.group('enc').strip("\"' ").lower()
-                    naked = re.sub(r'[ _\-]', '', tmp)
-                    # Convert to python correct encoding names
-                    if naked == "gb2312":
-                        enc.append("gbk")
-                    elif naked == "shiftjis":
-                        enc.append("shift jis 2004")
-                        enc.append("cp932")
-                    elif naked == "xeucjp":
-                        enc.append("euc-jp")
-                    else:
-                        enc.append(tmp)
-                else:
-                    pywikibot.output(u'No charset found for %s' % ref.link)
-                if not contentType:
-                    pywikibot.output(u'No content-type found for %s' % ref.link)
-                    continue
-                elif not self.MIME.search(contentType):
-                    pywikibot.output(
-                        u'\03{lightyellow}WARNING\03{default} : media : %s '
-                        % ref.link)
-                    repl = ref.refLink()
-                    new_text = new_text.replace(match.group(), repl)
-                    continue
-
-                # Ugly hacks to try to survive when both server and page
-                # return no encoding.
-                # Uses most used encodings for each national suffix
-                if u'.ru' in ref.link or u'.su' in ref.link:
-                    # see http://www.sci.aha.ru/ATL/ra13a.htm : no server
-                    # encoding, no page encoding
-                    enc = enc + ['koi8-r', 'windows-1251']
-                elif u'.jp' in ref.link:
-                    enc.append("shift jis 2004")
-                    enc.append("cp932")
-                elif u'.kr' in ref.link:
-                    enc.append("euc-kr")
-                    enc.append("cp949")
-                elif u'.zh' in ref.link:
-                    enc.append("gbk")
-
-                if 'utf-8' not in enc:
-                    enc.append('utf-8')
-                try:
-                    u = linkedpagetext.decode(enc[0])   # Bug 67410
-                except (UnicodeDecodeError, LookupError) as e:
-                    pywikibot.output(u'%s : Decoding error - %s' % (ref.link, e))
-                    continue
-
-                # Retrieves the first non empty string inside <title> tags
-                for m in self.TITLE.finditer(u):
-                    t = m.group()
-                    if t:
-                        ref.title = t
-                        ref.transform()
-                        if ref.title:
-                            break
-
-                if not ref.title:
-                    repl = ref.refLink()
-                    new_text = new_text.replace(match.group(), repl)
-                    pywikibot.output(u'%s : No title found...' % ref.link)
-                    continue
-
-                # XXX Ugly hack
-                if u'Ã©' in ref.title:
-                    repl = ref.refLink()
+            for match, ref in refs:
+                repl = self.getReplacement(ref, fetcher.result(ref.url),
+                                           page, deadLinks)
+                if repl is not None:
                     new_text = new_text.replace(match.group(), repl)
-                    pywikibot.output(u'%s : Hybrid encoding...' % ref.link)
-                    continue
-
-                if self.titleBlackList.match(ref.title):
-                    repl = ref.refLink()
-                    new_text = new_text.replace(match.group(), repl)
-                    pywikibot.output(u'\03{lightred}WARNING\03{default} %s : '
-                                     u'Blacklisted title (%s)'
-                                     % (ref.link, ref.title))
-                    continue
-
-                # Truncate long titles. 175 is arbitrary
-                if len(ref.title) > 175:
-                    ref.title = ref.title[:175] + "..."
-
-                repl = ref.refTitle()
-                new_text = new_text.replace(match.group(), repl)
 
             # Add <references/> when needed, but ignore templates !
             if page.namespace != 10:
@@ -814,6 +1109,8 @@ def main(*args):
             options['ignorepdf'] = True
         elif arg.startswith('-limit:'):
             options['limit'] = int(arg[7:])
+        elif arg.startswith('-cache:'):
+            options['cache'] = int(arg[7:])
         elif arg.startswith('-xmlstart'):
             if len(arg) == 9:
                 xmlStart = pywikibot.input(
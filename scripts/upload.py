@@ -22,6 +22,8 @@ Arguments:
                   'Ki': Kibibytes (1024 B)
                   'Mi': Mebibytes (1024x1024 B)
                 The suffixes are case insensitive.
+                An interrupted upload continues where it stopped when the
+                script is run again with the same file.
 
 If any other arguments are given, the first is either URL, filename or directory
 to upload, and the rest is a proposed description to go with the upload. If none
@@ -64,6 +66,14 @@ else:
     from urlparse import urlparse
     from urllib import URLopener
 
+# FIXME: these 2 belong somewhere else, presumably in family
+# forbidden characters are handled by pywikibot/page.py
+forbidden_characters = ':*?/\\'  # to be extended
+allowed_formats = (u'gif', u'jpg', u'jpeg', u'mid', u'midi',
+                   u'ogg', u'png', u'svg', u'xcf', u'djvu',
+                   u'ogv', u'oga', u'tif', u'tiff', u'webm',
+                   u'flac', u'wav')
+
 
 class UploadRobot:
 
@@ -122,6 +132,11 @@ class UploadRobot:
         self.ignoreWarning = ignoreWarning
         self.aborts = aborts
         self.chunk_size = chunk_size
+        if chunk_size:
+            self.upload_state = pywikibot.site.ChunkedUploadState(
+                config.datafilepath('upload-state.json'))
+        else:
+            self.upload_state = None
         if config.upload_to_commons:
             self.targetSite = targetSite or pywikibot.Site('commons',
                                                            'commons')
@@ -221,13 +236,6 @@ class UploadRobot:
                 u'Enter a better name, or press enter to accept:')
             if newfn != "":
                 filename = newfn
-        # FIXME: these 2 belong somewhere else, presumably in family
-        # forbidden characters are handled by pywikibot/page.py
-        forbidden = ':*?/\\'  # to be extended
-        allowed_formats = (u'gif', u'jpg', u'jpeg', u'mid', u'midi',
-                           u'ogg', u'png', u'svg', u'xcf', u'djvu',
-                           u'ogv', u'oga', u'tif', u'tiff', u'webm',
-                           u'flac', u'wav')
         # ask until it's valid
         first_check = True
         while True:
@@ -239,7 +247,7 @@ class UploadRobot:
             first_check = False
             ext = os.path.splitext(filename)[1].lower().strip('.')
             # are any chars in forbidden also in filename?
-            invalid = set(forbidden) & set(filename)
+            invalid = set(forbidden_characters) & set(filename)
             if invalid:
                 c = "".join(invalid)
                 pywikibot.output(
@@ -367,6 +375,7 @@ class UploadRobot:
                 site.upload(imagepage, source_filename=temp,
                             ignore_warnings=apiIgnoreWarnings,
                             chunk_size=self.chunk_size,
+                            upload_state=self.upload_state,
                             _file_key=_file_key, _offset=_offset)
 
         except pywikibot.data.api.UploadWarning as warn:
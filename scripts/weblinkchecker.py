@@ -3,13 +3,20 @@
 """
 This bot is used for checking external links found at the wiki.
 
-It checks several pages at once, with a limit set by the config variable
-max_external_links, which defaults to 50.
+It checks several links at once using a fixed number of worker threads set by
+the config variable max_external_links, which defaults to 50. Connections are
+kept alive and reused for further links to the same host, and the number of
+simultaneous requests to one host is limited by max_external_links_per_host.
+Each link is checked with a HEAD request first, and only if that fails with a
+GET request.
+
+A link which is used on several pages is only checked once, and links which
+were already checked within the time given by -day are skipped.
 
 The bot won't change any wiki pages, it will only report dead links such that
 people can fix or remove the links themselves.
 
-The bot will store all links found dead in a .dat file in the deadlinks
+The bot will store all links found dead in a database file in the deadlinks
 subdirectory. To avoid the removing of links which are only temporarily
 unavailable, the bot ONLY reports links which were reported dead at least
 two times, with a time lag of at least one week. Such links will be logged to a
@@ -24,7 +31,7 @@ feature, set report_dead_links_on_talk = True in your user-config.py, or
 specify "-talk" on the command line. Adding "-notalk" switches this off
 irrespective of the configuration variable.
 
-When a link is found alive, it will be removed from the .dat file.
+When a link is found alive, it will be removed from the database.
 
 These command line parameters can be used to specify which pages to work on:
 
@@ -55,6 +62,7 @@ Furthermore, the following command line parameters are supported:
              the feature.
 -day         the first time found dead link longer than x day ago, it should
              probably be fixed or removed. if no set, default is 7 day.
+             Links which were checked less than x days ago are skipped.
 
 The following config variables are supported:
 
@@ -66,6 +74,12 @@ max_external_links        - The maximum number of web pages that should be
                             is congested, and will then think that the page
                             is offline.
 
+max_external_links_per_host - The maximum number of web pages that should be
+                            loaded simultaneously from the same host.
+
+external_links_host_delay - The minimum time in seconds between the start of
+                            two requests to the same host.
+
 report_dead_links_on_talk - If set to true, causes the script to report dead
                             links on the article's talk page if (and ONLY if)
                             the linked page has been unavailable at least two
@@ -91,7 +105,7 @@ Syntax examples:
 """
 #
 # (C) Daniel Herding, 2005
-# (C) Pywikibot team, 2005-2014
+# (C) Pywikibot team, 2005-2015
 #
 # Distributed under the terms of the MIT license.
 #
@@ -101,8 +115,11 @@ __version__ = '$Id$'
 
 import re
 import codecs
+import collections
+import os
 import pickle
 import socket
+import sqlite3
 import threading
 import time
 import sys
@@ -115,12 +132,14 @@ if sys.version_info[0] > 2:
     import urllib.parse as urlparse
     import urllib.request as urllib
     import http.client as httplib
+    import queue as Queue
     basestring = (str, )
     unicode = str
 else:
     import urlparse
     import urllib
     import httplib
+    import Queue
 
 docuReplacements = {
     '&params;': pagegenerators.parameterHelp
@@ -262,13 +281,18 @@ class LinkChecker(object):
     """
 
     def __init__(self, url, redirectChain=[], serverEncoding=None,
-                 HTTPignore=[]):
+                 HTTPignore=[], pool=None):
         """
         Constructor.
 
         redirectChain is a list of redirects which were resolved by
         resolveRedirect(). This is needed to detect redirect loops.
+
+        If pool is a HostConnectionPool, the connections are taken from it
+        and are given back to it to be reused for the next URL on the same
+        host.
         """
+        self.pool = pool
         self.url = url
         self.serverEncoding = serverEncoding
         self.header = {
@@ -288,12 +312,60 @@ class LinkChecker(object):
         self.HTTPignore = HTTPignore
 
     def getConnection(self):
-        if self.scheme == 'http':
-            return httplib.HTTPConnection(self.host)
-        elif self.scheme == 'https':
-            return httplib.HTTPSConnection(self.host)
-        else:
+        """Return a connection to the host of the URL."""
+        if self.scheme not in ('http', 'https'):
             raise NotAnURLError(self.url)
+        if self.pool:
+            return self.pool.acquire(self.scheme, self.host)
+        else:
+            return HostConnectionPool.connect(self.scheme, self.host)
+
+    def releaseConnection(self, conn, reusable=False):
+        """Give the connection back to the pool or close it."""
+        if self.pool:
+            self.pool.release(self.scheme, self.host, conn, reusable)
+        else:
+            conn.close()
+
+    def request(self, method, path=None):
+        """
+        Send a request for the URL and return the response.
+
+        The body is only read for HEAD requests and redirects, so that the
+        connection can be used again. Otherwise the connection is closed as
+        soon as the status and the headers have arrived.
+
+        @param method: the HTTP method
+        @type method: str
+        @param path: the path and query, defaults to the one of the URL
+        @type path: unicode
+        @rtype: httplib.HTTPResponse
+        """
+        if path is None:
+            path = '%s%s' % (self.path, self.query)
+        conn = self.getConnection()
+        reusable = False
+        try:
+            # a new connection doesn't have a socket before the first request
+            reused = conn.sock is not None
+            try:
+                conn.request(method, path, None, self.header)
+                response = conn.getresponse()
+            except (httplib.HTTPException, socket.error):
+                if not reused:
+                    raise
+                # the server closed the kept-alive connection in the meantime
+                conn.close()
+                conn.request(method, path, None, self.header)
+                response = conn.getresponse()
+            if method == 'HEAD' or 300 <= response.status <= 399:
+                response.read()
+                reusable = not response.will_close
+        finally:
+            self.releaseConnection(conn, reusable)
+        self.response = response
+        self.responseMethod = method
+        return response
 
     def getEncodingUsedByServer(self):
         if not self.serverEncoding:
@@ -301,10 +373,7 @@ class LinkChecker(object):
                 pywikibot.output(
                     u'Contacting server %s to find out its default encoding...'
                     % self.host)
-                conn = self.getConnection()
-                conn.request('HEAD', '/', None, self.header)
-                self.response = conn.getresponse()
-                self.readEncodingFromResponse(self.response)
+                self.readEncodingFromResponse(self.request('HEAD', '/'))
             except:
                 pass
             if not self.serverEncoding:
@@ -355,15 +424,8 @@ class LinkChecker(object):
 
         @rtype: unicode or None
         """
-        conn = self.getConnection()
         try:
-            if useHEAD:
-                conn.request('HEAD', '%s%s' % (self.path, self.query), None,
-                             self.header)
-            else:
-                conn.request('GET', '%s%s' % (self.path, self.query), None,
-                             self.header)
-            self.response = conn.getresponse()
+            self.request('HEAD' if useHEAD else 'GET')
             # read the server's encoding, in case we need it later
             self.readEncodingFromResponse(self.response)
         except httplib.BadStatusLine:
@@ -415,6 +477,9 @@ class LinkChecker(object):
         """
         Return True and the server status message if the page is alive.
 
+        If useHEAD is true, the page is only loaded with a GET request when
+        the HEAD request failed.
+
         @rtype: tuple of (bool, unicode)
         """
         try:
@@ -433,12 +498,11 @@ class LinkChecker(object):
             # accompanying os.error
             if isinstance(error, basestring):
                 msg = error
+            elif error.args:
+                # e.g. socket.timeout only has the message
+                msg = error.args[-1]
             else:
-                try:
-                    msg = error[1]
-                except IndexError:
-                    print(u'### DEBUG information for #2972249')
-                    raise IndexError(type(error))
+                msg = error
             # TODO: decode msg. On Linux, it's encoded in UTF-8.
             # How is it encoded in Windows? Or can we somehow just
             # get the English message?
@@ -453,7 +517,7 @@ class LinkChecker(object):
                     redirChecker = LinkChecker(
                         self.redirectChain[0],
                         serverEncoding=self.serverEncoding,
-                        HTTPignore=self.HTTPignore)
+                        HTTPignore=self.HTTPignore, pool=self.pool)
                     return redirChecker.check(useHEAD=False)
                 else:
                     urlList = ['[%s]' % url
@@ -469,7 +533,7 @@ class LinkChecker(object):
                     redirChecker = LinkChecker(
                         self.redirectChain[0],
                         serverEncoding=self.serverEncoding,
-                        HTTPignore=self.HTTPignore)
+                        HTTPignore=self.HTTPignore, pool=self.pool)
                     return redirChecker.check(useHEAD=False)
                 else:
                     urlList = ['[%s]' % url
@@ -480,24 +544,23 @@ class LinkChecker(object):
             else:
                 redirChecker = LinkChecker(self.url, self.redirectChain,
                                            self.serverEncoding,
-                                           HTTPignore=self.HTTPignore)
+                                           HTTPignore=self.HTTPignore,
+                                           pool=self.pool)
                 return redirChecker.check(useHEAD=useHEAD)
         else:
-            try:
-                conn = self.getConnection()
-            except httplib.error as error:
-                return False, u'HTTP Error: %s' % error.__class__.__name__
-            try:
-                conn.request('GET', '%s%s'
-                             % (self.path, self.query), None, self.header)
-            except socket.error as error:
-                return False, u'Socket Error: %s' % repr(error[1])
-            try:
-                self.response = conn.getresponse()
-            except Exception as error:
-                return False, u'Error: %s' % error
-            # read the server's encoding, in case we need it later
-            self.readEncodingFromResponse(self.response)
+            if self.responseMethod == 'HEAD' and self.response.status >= 400:
+                # Some servers refuse HEAD requests, e.g. with 405 Method Not
+                # Allowed, so the result is only trusted after a GET request.
+                try:
+                    self.request('GET')
+                except httplib.error as error:
+                    return False, u'HTTP Error: %s' % error.__class__.__name__
+                except socket.error as error:
+                    return False, u'Socket Error: %r' % (error.args[-1], )
+                except Exception as error:
+                    return False, u'Error: %s' % error
+                # read the server's encoding, in case we need it later
+                self.readEncodingFromResponse(self.response)
             # site down if the server status is between 400 and 499
             alive = self.response.status not in range(400, 500)
             if self.response.status in self.HTTPignore:
@@ -505,46 +568,210 @@ class LinkChecker(object):
             return alive, '%s %s' % (self.response.status, self.response.reason)
 
 
-class LinkCheckThread(threading.Thread):
+class HostConnectionPool(object):
 
-    """A thread responsible for checking one URL.
+    """
+    Keep-alive connections and politeness limits per host.
 
-    After checking the page, it will die.
+    At most per_host requests are sent to the same host at the same time and
+    the requests to a host are started at least delay seconds apart. After a
+    request the connection is kept and used again for the next request to the
+    same host. Only the maxidle connections used last are kept.
     """
 
-    def __init__(self, page, url, history, HTTPignore, day):
-        threading.Thread.__init__(self)
-        self.page = page
-        self.url = url
+    def __init__(self, per_host=None, delay=None, maxidle=None):
+        """
+        Constructor.
+
+        @param per_host: number of simultaneous requests to one host, defaults
+            to config.max_external_links_per_host
+        @type per_host: int
+        @param delay: seconds between the start of two requests to one host,
+            defaults to config.external_links_host_delay
+        @type delay: float
+        @param maxidle: number of unused connections which are kept, defaults
+            to config.max_external_links
+        @type maxidle: int
+        """
+        if per_host is None:
+            per_host = config.max_external_links_per_host
+        if delay is None:
+            delay = config.external_links_host_delay
+        if maxidle is None:
+            maxidle = config.max_external_links
+        self.per_host = per_host
+        self.delay = delay
+        self.maxidle = maxidle
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next = {}
+        # pairs of ((scheme, host), connection), the oldest first
+        self._idle = collections.deque()
+
+    @staticmethod
+    def connect(scheme, host):
+        """Return a new connection to the host."""
+        timeout = config.socket_timeout
+        if isinstance(timeout, tuple):
+            # httplib uses the same timeout to connect and to read
+            timeout = max(timeout)
+        if scheme == 'https':
+            return httplib.HTTPSConnection(host, timeout=timeout)
+        else:
+            return httplib.HTTPConnection(host, timeout=timeout)
+
+    def acquire(self, scheme, host):
+        """
+        Return a connection to the host.
+
+        Blocks until fewer than per_host requests are running on the host and
+        the delay since the last request to it has passed.
+        """
+        with self._lock:
+            slot = self._slots.get(host)
+            if slot is None:
+                slot = self._slots[host] = threading.BoundedSemaphore(
+                    self.per_host)
+        slot.acquire()
+        with self._lock:
+            now = time.time()
+            start = max(self._next.get(host, 0), now)
+            self._next[host] = start + self.delay
+            conn = None
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == (scheme, host):
+                    conn = self._idle[i][1]
+                    del self._idle[i]
+                    break
+        if start > now:
+            time.sleep(start - now)
+        if conn is None:
+            conn = self.connect(scheme, host)
+        return conn
+
+    def release(self, scheme, host, conn, reusable=False):
+        """Give back the connection returned by acquire()."""
+        if reusable:
+            with self._lock:
+                self._idle.append(((scheme, host), conn))
+                if len(self._idle) > self.maxidle:
+                    self._idle.popleft()[1].close()
+        else:
+            conn.close()
+        self._slots[host].release()
+
+    def close(self):
+        """Close all unused connections."""
+        with self._lock:
+            while self._idle:
+                self._idle.popleft()[1].close()
+
+
+class LinkCheckPool(object):
+
+    """
+    Check URLs with a fixed number of worker threads.
+
+    URLs are queued with add(). A URL is only checked once even if it is found
+    on several pages, and URLs which the history says were checked within the
+    last day days are skipped. The workers share a HostConnectionPool.
+    """
+
+    def __init__(self, history, HTTPignore=None, day=7, workers=None):
+        """
+        Constructor.
+
+        @param history: the history of dead links
+        @type history: History
+        @param HTTPignore: HTTP status codes which are considered dead
+        @type HTTPignore: list of int
+        @param day: number of days in which a URL isn't checked again
+        @type day: int
+        @param workers: the number of worker threads, defaults to
+            config.max_external_links
+        @type workers: int
+        """
+        if workers is None:
+            workers = config.max_external_links
         self.history = history
-        # identification for debugging purposes
-        self.setName((u'%s - %s' % (page.title(), url)).encode('utf-8',
-                                                               'replace'))
-        self.HTTPignore = HTTPignore
+        self.HTTPignore = HTTPignore or []
         self.day = day
+        self.connections = HostConnectionPool(maxidle=workers)
+        self.queue = Queue.Queue(workers * 2)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.workers = []
+        for number in range(workers):
+            thread = threading.Thread(target=self._work,
+                                      name='LinkCheckWorker-%d' % number)
+            # thread dies when program terminates
+            thread.setDaemon(True)
+            thread.start()
+            self.workers.append(thread)
 
-    def run(self):
-        linkChecker = LinkChecker(self.url, HTTPignore=self.HTTPignore)
+    @property
+    def pending(self):
+        """Return the number of URLs which are queued or being checked."""
+        return len(self._pending)
+
+    def add(self, page, url):
+        """
+        Queue a URL found on a page to be checked.
+
+        Blocks while the queue is full.
+
+        @return: whether the URL was queued
+        @rtype: bool
+        """
+        checked = self.history.lastChecked(url)
+        if checked is not None and (
+                checked >= self.started or
+                time.time() - checked < 60 * 60 * 24 * self.day):
+            return False
+        with self._lock:
+            if url in self._pending:
+                return False
+            self._pending.add(url)
+        self.queue.put((page, url))
+        return True
+
+    def _work(self):
+        while True:
+            page, url = self.queue.get()
+            try:
+                self.checkURL(page, url)
+            except Exception:
+                pywikibot.exception(
+                    'Exception while processing URL %s in page %s'
+                    % (url, page.title()), tb=True)
+            finally:
+                with self._lock:
+                    self._pending.discard(url)
+
+    def checkURL(self, page, url):
+        """Check the URL and record the result in the history."""
+        linkChecker = LinkChecker(url, HTTPignore=self.HTTPignore,
+                                  pool=self.connections)
         try:
-            ok, message = linkChecker.check()
+            ok, message = linkChecker.check(useHEAD=True)
         except NotAnURLError:
             ok = False
-            message = i18n.twtranslate(self.page.site,
+            message = i18n.twtranslate(page.site,
                                        'weblinkchecker-badurl_msg',
-                                       {'URL': self.url})
-
-        except:
-            pywikibot.output('Exception while processing URL %s in page %s'
-                             % (self.url, self.page.title()))
-            raise
+                                       {'URL': url})
         if ok:
-            if self.history.setLinkAlive(self.url):
+            if self.history.setLinkAlive(url):
                 pywikibot.output('*Link to %s in [[%s]] is back alive.'
-                                 % (self.url, self.page.title()))
+                                 % (url, page.title()))
         else:
             pywikibot.output('*[[%s]] links to %s - %s.'
-                             % (self.page.title(), self.url, message))
-            self.history.setLinkDead(self.url, message, self.page, self.day)
+                             % (page.title(), url, message))
+            self.history.setLinkDead(url, message, page, self.day)
+
+    def stop(self):
+        """Close the unused connections; running checks are abandoned."""
+        self.connections.close()
 
 
 class History:
@@ -552,40 +779,151 @@ class History:
     """
     Store previously found dead links.
 
-    The URLs are dictionary keys, and
-    values are lists of tuples where each tuple represents one time the URL was
-    found dead. Tuples have the form (title, date, error) where title is the
-    wiki page where the URL was found, date is an instance of time, and error is
-    a string with error code and message.
-
-    We assume that the first element in the list represents the first time we
-    found this dead link, and the last element represents the last time.
+    The links are stored in a SQLite database in the deadlinks subdirectory,
+    so that only the entries of the URLs which are checked are read and
+    every change only updates the entries of one URL.
 
-    Example:
+    Every time a URL was found dead, an entry of (title, date, error) is
+    stored where title is the wiki page where the URL was found, date is a
+    time as returned by time.time(), and error is a string with error code
+    and message. The first entry of a URL represents the first time we found
+    this dead link, and the last entry represents the last time.
 
-    dict = {
-        'https://www.example.org/page': [
-            ('WikiPageTitle', DATE, '404: File not found'),
-            ('WikiPageName2', DATE, '404: File not found'),
-        ]
+    Additionally the time of the last check of every URL, dead or alive, is
+    stored.
 
+    The dead links of the former pickled .dat file are imported when the
+    database is created.
     """
 
-    def __init__(self, reportThread):
+    # number of changes after which they are committed
+    commitInterval = 100
+
+    def __init__(self, reportThread, site=None, filename=None):
+        """
+        Constructor.
+
+        @param reportThread: the thread reporting dead links on talk pages
+        @type reportThread: DeadLinkReportThread or None
+        @param site: the site of the pages, defaults to the default site
+        @type site: BaseSite
+        @param filename: the database file, defaults to
+            deadlinks-<family>-<code>.sqlite3 in the deadlinks subdirectory,
+            into which the pickled history of the site is imported
+        @type filename: str
+        """
         self.reportThread = reportThread
-        self.site = pywikibot.Site()
-        self.semaphore = threading.Semaphore()
-        self.datfilename = pywikibot.config.datafilepath(
-            'deadlinks', 'deadlinks-%s-%s.dat' % (self.site.family.name, self.site.code))
+        self.site = site or pywikibot.Site()
+        self.semaphore = threading.Lock()
+        # the workers log dead links to the same text file
+        self.logLock = threading.Lock()
         # Count the number of logged links, so that we can insert captions
         # from time to time
         self.logCount = 0
+        self._changes = 0
+        if filename is None:
+            filename = pywikibot.config.datafilepath(
+                'deadlinks', 'deadlinks-%s-%s.sqlite3'
+                % (self.site.family.name, self.site.code))
+            importPickle = not os.path.exists(filename)
+        else:
+            importPickle = False
+        self.filename = filename
+        # the workers share the connection, access it only with the semaphore
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS deadlinks (
+                url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                time REAL NOT NULL,
+                error TEXT);
+            CREATE INDEX IF NOT EXISTS deadlinks_url ON deadlinks (url, time);
+            CREATE INDEX IF NOT EXISTS deadlinks_title ON deadlinks (title);
+            CREATE TABLE IF NOT EXISTS checked (
+                url TEXT PRIMARY KEY,
+                time REAL NOT NULL);
+        """)
+        if importPickle:
+            self._importPickle()
+
+    def _importPickle(self):
+        """Import the dead links of the pickled .dat file."""
+        datfilename = pywikibot.config.datafilepath(
+            'deadlinks', 'deadlinks-%s-%s.dat'
+            % (self.site.family.name, self.site.code))
         try:
-            with open(self.datfilename, 'rb') as datfile:
-                self.historyDict = pickle.load(datfile)
+            with open(datfilename, 'rb') as datfile:
+                historyDict = pickle.load(datfile)
         except (IOError, EOFError):
             # no saved history exists yet, or history dump broken
-            self.historyDict = {}
+            return
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO deadlinks VALUES (?, ?, ?, ?)',
+                ((url, title, date, error)
+                 for url, entries in historyDict.items()
+                 for title, date, error in entries))
+
+    def _changed(self):
+        """Commit after every commitInterval changes."""
+        self._changes += 1
+        if self._changes >= self.commitInterval:
+            self.connection.commit()
+            self._changes = 0
+
+    def getEntries(self, url):
+        """
+        Return the entries of a URL, the oldest first.
+
+        @return: tuples of (title, date, error)
+        @rtype: list of tuple
+        """
+        with self.semaphore:
+            return self.connection.execute(
+                'SELECT title, time, error FROM deadlinks WHERE url = ? '
+                'ORDER BY time', (url, )).fetchall()
+
+    def getDeadLinks(self, start=None, end=None):
+        """
+        Return the URLs which were found dead first in a time window.
+
+        @param start: only URLs found dead first at this time or later
+        @type start: float
+        @param end: only URLs found dead first before this time
+        @type end: float
+        @return: tuples of (url, first time, last time)
+        @rtype: list of tuple
+        """
+        query = ('SELECT url, MIN(time), MAX(time) FROM deadlinks '
+                 'GROUP BY url HAVING MIN(time) >= ? AND MIN(time) < ? '
+                 'ORDER BY MIN(time)')
+        if start is None:
+            start = float('-inf')
+        if end is None:
+            end = float('inf')
+        with self.semaphore:
+            return self.connection.execute(query, (start, end)).fetchall()
+
+    def getPageTitles(self, step=100):
+        """
+        Iterate over the titles of the pages where dead links were found.
+
+        The titles are sorted and queried in groups of step titles, so the
+        database isn't locked while iterating.
+
+        @rtype: generator of unicode
+        """
+        last = ''
+        while True:
+            with self.semaphore:
+                titles = [title for title, in self.connection.execute(
+                    'SELECT DISTINCT title FROM deadlinks WHERE title > ? '
+                    'ORDER BY title LIMIT ?', (last, step))]
+            for title in titles:
+                yield title
+            if len(titles) < step:
+                break
+            last = titles[-1]
 
     def log(self, url, error, containingPage, archiveURL):
         """Log an error report to a text file in the deadlinks subdirectory."""
@@ -593,7 +931,7 @@ class History:
             errorReport = u'* %s ([%s archive])\n' % (url, archiveURL)
         else:
             errorReport = u'* %s\n' % url
-        for (pageTitle, date, error) in self.historyDict[url]:
+        for (pageTitle, date, error) in self.getEntries(url):
             # ISO 8601 formulation
             isoDate = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(date))
             errorReport += "** In [[%s]] on %s, %s\n" % (pageTitle, isoDate,
@@ -603,66 +941,79 @@ class History:
                                                     'results-%s-%s.txt'
                                                     % (self.site.family.name,
                                                        self.site.lang))
-        txtfile = codecs.open(txtfilename, 'a', 'utf-8')
-        self.logCount += 1
-        if self.logCount % 30 == 0:
-            # insert a caption
-            txtfile.write('=== %s ===\n' % containingPage.title()[:3])
-        txtfile.write(errorReport)
-        txtfile.close()
+        with self.logLock:
+            txtfile = codecs.open(txtfilename, 'a', 'utf-8')
+            self.logCount += 1
+            if self.logCount % 30 == 0:
+                # insert a caption
+                txtfile.write('=== %s ===\n' % containingPage.title()[:3])
+            txtfile.write(errorReport)
+            txtfile.close()
 
         if self.reportThread and not containingPage.isTalkPage():
             self.reportThread.report(url, errorReport, containingPage,
                                      archiveURL)
 
     def setLinkDead(self, url, error, page, day):
-        """Add the fact that the link was found dead to the .dat file."""
-        self.semaphore.acquire()
+        """Add the fact that the link was found dead to the history."""
         now = time.time()
-        if url in self.historyDict:
-            timeSinceFirstFound = now - self.historyDict[url][0][1]
-            timeSinceLastFound = now - self.historyDict[url][-1][1]
+        with self.semaphore:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO checked VALUES (?, ?)', (url, now))
+            firstFound, lastFound = self.connection.execute(
+                'SELECT MIN(time), MAX(time) FROM deadlinks WHERE url = ?',
+                (url, )).fetchone()
             # if the last time we found this dead link is less than an hour
             # ago, we won't save it in the history this time.
-            if timeSinceLastFound > 60 * 60:
-                self.historyDict[url].append((page.title(), now, error))
-            # if the first time we found this link longer than x day ago
-            # (default is a week), it should probably be fixed or removed.
-            # We'll list it in a file so that it can be removed manually.
-            if timeSinceFirstFound > 60 * 60 * 24 * day:
-                # search for archived page
-                archiveURL = weblib.getInternetArchiveURL(url)
-                if archiveURL is None:
-                    archiveURL = weblib.getWebCitationURL(url)
-                self.log(url, error, page, archiveURL)
-        else:
-            self.historyDict[url] = [(page.title(), now, error)]
-        self.semaphore.release()
+            if firstFound is None or now - lastFound > 60 * 60:
+                self.connection.execute(
+                    'INSERT INTO deadlinks VALUES (?, ?, ?, ?)',
+                    (url, page.title(), now, error))
+            self._changed()
+        # if the first time we found this link longer than x day ago
+        # (default is a week), it should probably be fixed or removed.
+        # We'll list it in a file so that it can be removed manually.
+        if firstFound is not None and now - firstFound > 60 * 60 * 24 * day:
+            # search for archived page
+            archiveURL = weblib.getInternetArchiveURL(url)
+            if archiveURL is None:
+                archiveURL = weblib.getWebCitationURL(url)
+            self.log(url, error, page, archiveURL)
 
     def setLinkAlive(self, url):
         """
         Record that the link is now alive.
 
-        If link was previously found dead, remove it from the .dat file.
+        If link was previously found dead, remove it from the history.
 
         @return: True if previously found dead, else returns False.
         """
-        if url in self.historyDict:
-            self.semaphore.acquire()
-            try:
-                del self.historyDict[url]
-            except KeyError:
-                # Not sure why this can happen, but I guess we can ignore this.
-                pass
-            self.semaphore.release()
-            return True
-        else:
-            return False
+        with self.semaphore:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO checked VALUES (?, ?)',
+                (url, time.time()))
+            removed = self.connection.execute(
+                'DELETE FROM deadlinks WHERE url = ?', (url, )).rowcount
+            self._changed()
+        return removed > 0
+
+    def lastChecked(self, url):
+        """
+        Return when the URL was checked the last time.
+
+        @return: the time as seconds since the epoch or None if never checked
+        @rtype: float or None
+        """
+        with self.semaphore:
+            row = self.connection.execute(
+                'SELECT time FROM checked WHERE url = ?', (url, )).fetchone()
+        return row[0] if row else None
 
     def save(self):
-        """Save the .dat file to disk."""
-        with open(self.datfilename, 'wb') as f:
-            pickle.dump(self.historyDict, f, protocol=config.pickle_protocol)
+        """Commit the changes to the database."""
+        with self.semaphore:
+            self.connection.commit()
+            self._changes = 0
 
 
 class DeadLinkReportThread(threading.Thread):
@@ -671,7 +1022,8 @@ class DeadLinkReportThread(threading.Thread):
     A Thread that is responsible for posting error reports on talk pages.
 
     There is only one DeadLinkReportThread, and it is using a semaphore to make
-    sure that two LinkCheckerThreads can not access the queue at the same time.
+    sure that two link checking workers can not access the queue at the same
+    time.
     """
 
     def __init__(self):
@@ -767,7 +1119,7 @@ class WeblinkCheckerRobot:
     """
     Bot which will search for dead weblinks.
 
-    It uses several LinkCheckThreads at once to process pages from generator.
+    It uses a LinkCheckPool to check the links of the pages from generator.
     """
 
     def __init__(self, generator, HTTPignore=None, day=7):
@@ -786,6 +1138,7 @@ class WeblinkCheckerRobot:
         else:
             self.HTTPignore = HTTPignore
         self.day = day
+        self.pool = LinkCheckPool(self.history, self.HTTPignore, day)
 
     def run(self):
         for page in self.generator:
@@ -803,42 +1156,15 @@ class WeblinkCheckerRobot:
                 if ignoreR.match(url):
                     ignoreUrl = True
             if not ignoreUrl:
-                # Limit the number of threads started at the same time. Each
-                # thread will check one page, then die.
-                while threading.activeCount() >= config.max_external_links:
-                    # wait 100 ms
-                    time.sleep(0.1)
-                thread = LinkCheckThread(page, url, self.history,
-                                         self.HTTPignore, self.day)
-                # thread dies when program terminates
-                thread.setDaemon(True)
-                thread.start()
+                self.pool.add(page, url)
 
 
-def RepeatPageGenerator():
+def RepeatPageGenerator(history=None):
     """Generator for pages in History."""
-    history = History(None)
-    pageTitles = set()
-    for value in history.historyDict.values():
-        for entry in value:
-            pageTitles.add(entry[0])
-    for pageTitle in sorted(pageTitles):
-        page = pywikibot.Page(pywikibot.Site(), pageTitle)
-        yield page
-
-
-def countLinkCheckThreads():
-    """
-    Count LinkCheckThread threads.
-
-    @return: number of LinkCheckThread threads
-    @rtype: int
-    """
-    i = 0
-    for thread in threading.enumerate():
-        if isinstance(thread, LinkCheckThread):
-            i += 1
-    return i
+    if history is None:
+        history = History(None)
+    for pageTitle in history.getPageTitles():
+        yield pywikibot.Page(history.site, pageTitle)
 
 
 def check(url):
@@ -910,22 +1236,23 @@ def main(*args):
             bot.run()
         finally:
             waitTime = 0
-            # Don't wait longer than 30 seconds for threads to finish.
-            while countLinkCheckThreads() > 0 and waitTime < 30:
+            # Don't wait longer than 30 seconds for the checks to finish.
+            while bot.pool.pending > 0 and waitTime < 30:
                 try:
-                    pywikibot.output(u"Waiting for remaining %i threads to "
-                                     u"finish, please wait..."
-                                     % countLinkCheckThreads())
+                    pywikibot.output(u"Waiting for remaining %i links to be "
+                                     u"checked, please wait..."
+                                     % bot.pool.pending)
                     # wait 1 second
                     time.sleep(1)
                     waitTime += 1
                 except KeyboardInterrupt:
                     pywikibot.output(u'Interrupted.')
                     break
-            if countLinkCheckThreads() > 0:
-                pywikibot.output(u'Remaining %i threads will be killed.'
-                                 % countLinkCheckThreads())
+            if bot.pool.pending > 0:
+                pywikibot.output(u'Remaining %i links will not be checked.'
+                                 % bot.pool.pending)
                 # Threads will die automatically because they are daemonic.
+            bot.pool.stop()
             if bot.history.reportThread:
                 bot.history.reportThread.shutdown()
                 # wait until the report thread is shut down; the user can
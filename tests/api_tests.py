@@ -538,6 +538,13 @@ class TestDryPageGenerator(TestCase):
         """Test that PageGenerator yields pages with expected attributes."""
         self.assertPagelistTitles(self.gen, self.titles)
 
+    def test_release_pages(self):
+        """Test that yielded pages are removed from the response."""
+        gen = iter(self.gen)
+        self.assertEqual(next(gen).title(), self.titles[0])
+        self.assertEqual(len(self.gen.data['query']['pages']), 3)
+        self.assertEqual(len(list(gen)), 3)
+
     def test_initial_limit(self):
         self.assertEqual(self.gen.limit, None)  # limit is initally None
 
@@ -0,0 +1 @@
+"""Benchmarks of Pywikibot components, which are not run as tests."""
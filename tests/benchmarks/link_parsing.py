@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Benchmark parsing the links found in the pages of tests/pages.
+
+It uses a DrySite so it does not need network access:
+
+    python -m tests.benchmarks.link_parsing [repeat]
+
+The default is to repeat the parsing 200 times.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import codecs
+import glob
+import os
+import re
+import sys
+import time
+
+import pywikibot
+
+from pywikibot.page import Link
+
+from tests import _tests_dir
+from tests.utils import DrySite
+
+LINK_REGEX = re.compile(r'\[\[([^\[\]]+)\]\]')
+
+
+def load_link_texts():
+    """Return the text inside all links of the pages in tests/pages."""
+    texts = []
+    for filename in glob.glob(os.path.join(_tests_dir, 'pages', '*.page')):
+        with codecs.open(filename, 'r', 'utf-8') as f:
+            texts += LINK_REGEX.findall(f.read())
+    return texts
+
+
+def main(repeat=200):
+    """Parse all links repeatedly and print the timings."""
+    site = DrySite('en', 'wikipedia', None, None)
+    # No interwiki prefixes are known to the dry site
+    site._iw_sites = {}
+    texts = load_link_texts()
+
+    start = time.time()
+    for i in range(repeat):
+        for text in texts:
+            Link(text, site)
+    constructed = time.time()
+    for i in range(repeat):
+        for text in texts:
+            try:
+                Link(text, site).parse()
+            except pywikibot.Error:
+                pass
+    parsed = time.time()
+
+    count = len(texts) * repeat
+    print('%d links, %d repetitions' % (len(texts), repeat))
+    print('construct: %.3f s (%.1f us per link)'
+          % (constructed - start, (constructed - start) * 1e6 / count))
+    print('parse:     %.3f s (%.1f us per link)'
+          % (parsed - constructed, (parsed - constructed) * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
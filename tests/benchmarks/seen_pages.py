@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Benchmark the memory used to remember the pages seen by a generator.
+
+It uses a DrySite so it does not need network access, and tracemalloc so it
+needs Python 3.4 or later:
+
+    python -m tests.benchmarks.seen_pages [count]
+
+The pages are created by a generator like an API generator does and are
+filtered by filter_unique with the container of every mode of
+DuplicateFilterPageGenerator. The memory which is still allocated after the
+pages were iterated is the memory of the seen pages. The default is 100000 pages.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import gc
+import sys
+import time
+import tracemalloc
+
+import pywikibot
+
+from pywikibot import config
+from pywikibot.pagegenerators import seen_pages_container
+from pywikibot.tools import filter_unique
+
+from tests.utils import DrySite
+
+
+def pages(site, count):
+    """Yield count pages with a page id."""
+    for i in range(count):
+        page = pywikibot.Page(site, 'Page number {0}'.format(i))
+        page._pageid = i + 1
+        yield page
+
+
+def measure(site, count, mode):
+    """Return the memory and time needed for the seen pages."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    container = seen_pages_container(mode)
+    if container is None:
+        # the default of filter_unique
+        container = {}
+    for page in filter_unique(pages(site, count), container=container):
+        pass
+    elapsed = time.time() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del container
+    return size, elapsed
+
+
+def main(count=100000):
+    """Measure every mode and print the memory per page."""
+    site = DrySite('en', 'wikipedia', None, None)
+    config.dedupe_bloom_capacity = count
+    print('%d pages, Bloom filter error rate %s'
+          % (count, config.dedupe_bloom_error_rate))
+    for mode in ('exact', 'hash', 'pageid', 'bloom'):
+        size, elapsed = measure(site, count, mode)
+        print('%-6s %10d bytes %7.1f bytes per page %6.2f s'
+              % (mode, size, float(size) / count, elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Benchmark the hand-over latency of the look-ahead generators.
+
+It compares ThreadedGenerator with LookAheadGenerator:
+
+    python -m tests.benchmarks.threaded_generator [count]
+
+Three cases are measured with count values each (default 20):
+ - slow: the producer waits 10 ms between the values and the time
+   between producing and consuming each value is measured,
+ - full: the buffer has room for one value only,
+ - end: the time until a short generator is exhausted.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import sys
+import time
+
+from pywikibot.tools import LookAheadGenerator, ThreadedGenerator
+
+
+def slow_producer(count):
+    """Yield the time when each value was produced."""
+    for i in range(count):
+        time.sleep(0.01)
+        yield time.time()
+
+
+def threaded(iterable, qsize):
+    """Return a started ThreadedGenerator."""
+    gen = ThreadedGenerator(target=iterable, qsize=qsize)
+    gen.start()
+    return gen
+
+
+def look_ahead(iterable, qsize):
+    """Return a LookAheadGenerator."""
+    return LookAheadGenerator(iterable, qsize=qsize)
+
+
+def measure(create, count):
+    """Return the latencies of the three cases in ms."""
+    gen = create(slow_producer(count), 1000)
+    latencies = [time.time() - produced for produced in gen]
+    gen.stop()
+    slow = sum(latencies) * 1000 / len(latencies)
+
+    start = time.time()
+    gen = create(range(count), 1)
+    assert list(gen) == list(range(count))
+    gen.stop()
+    full = (time.time() - start) * 1000 / count
+
+    start = time.time()
+    for i in range(count):
+        gen = create(range(3), 1000)
+        assert list(gen) == [0, 1, 2]
+        gen.stop()
+    end = (time.time() - start) * 1000 / count
+    return slow, full, end
+
+
+def main(count=20):
+    """Measure both generators and print the latencies."""
+    print('%d values per case, milliseconds per value or generator' % count)
+    print('%-20s %8s %8s %8s' % ('', 'slow', 'full', 'end'))
+    for name, create in (('ThreadedGenerator', threaded),
+                         ('LookAheadGenerator', look_ahead)):
+        print('%-20s %8.3f %8.3f %8.3f' % ((name, ) + measure(create, count)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Benchmark finding the timestamps in the lines of a large archive page.
+
+It uses a DrySite so it does not need network access:
+
+    python -m tests.benchmarks.timestripper [threads]
+
+The archive page has the given number of threads (default 2000) with a few
+signed comments and unsigned lines each, like a talk page which is archived
+by archivebot.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import sys
+import time
+
+from pywikibot.textlib import TimeStripper
+
+from tests.utils import DrySite
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+
+def archive_lines(threads):
+    """Return the lines of an archive page with the given number of threads."""
+    lines = []
+    for number in range(threads):
+        lines += [
+            '== Thread %d ==' % number,
+            'Some question about [[Foo]] and [http://example.org bar].',
+            '[[User:Foo|Foo]] ([[User talk:Foo|talk]]) '
+            '%02d:%02d, %d %s %d (UTC)' % (number % 24, number % 60,
+                                           number % 28 + 1,
+                                           MONTHS[number % 12],
+                                           2000 + number % 15),
+            ':An answer without a signature.',
+            '::Another answer. <!-- hidden 12:00, 1 May 2015 (UTC) --> '
+            '[[User:Bar|Bar]] 10:15, 2 June 2015 (UTC)',
+            '',
+        ]
+    return lines
+
+
+def main(threads=2000):
+    """Create TimeStrippers, find the timestamps and print the timings."""
+    site = DrySite('en', 'wikipedia', None, None)
+    site._months_names = [(month, month[:3]) for month in MONTHS]
+    site.siteinfo._cache['timeoffset'] = (0, True)
+    site.siteinfo._cache['timezone'] = ('UTC', True)
+    lines = archive_lines(threads)
+
+    start = time.time()
+    for number in range(threads):
+        TimeStripper(site)
+    constructed = time.time()
+    timestripper = TimeStripper(site)
+    found = sum(1 for line in lines if timestripper.timestripper(line))
+    stripped = time.time()
+
+    print('%d threads, %d lines, %d timestamps'
+          % (threads, len(lines), found))
+    print('construct: %.3f s (%.1f us per instance)'
+          % (constructed - start, (constructed - start) * 1e6 / threads))
+    print('strip:     %.3f s (%.1f us per line)'
+          % (stripped - constructed,
+             (stripped - constructed) * 1e6 / len(lines)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
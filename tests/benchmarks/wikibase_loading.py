@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""
+Benchmark loading the Wikibase item in tests/pages/Q60.wd.
+
+It uses a DryDataSite so it does not need network access:
+
+    python -m tests.benchmarks.wikibase_loading [repeat]
+
+It compares converting all claims of the item, like ItemPage.get did
+before the claims were converted lazily, with accessing a single property
+and shows how much smaller the JSON is when only the claims are fetched.
+The default is to repeat the loading 20 times.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import json
+import os
+import sys
+import time
+
+import pywikibot
+
+from tests import _tests_dir
+from tests.utils import DryDataSite
+
+
+def load_item(repo, content):
+    """Return the item Q60 with the given content."""
+    item = pywikibot.ItemPage(repo, 'Q60')
+    item._content = content
+    item.get()
+    return item
+
+
+def main(repeat=20):
+    """Load the item repeatedly and print the timings."""
+    repo = DryDataSite('wikidata', 'wikidata', None, None)
+    with open(os.path.join(_tests_dir, 'pages', 'Q60.wd')) as f:
+        content = json.load(f)
+    # Do not convert the commonsMedia claims, as those need a commons site
+    claims = dict((pid, values) for pid, values in content['claims'].items()
+                  if values[0]['mainsnak'].get('datatype') != 'commonsMedia')
+    content['claims'] = claims
+
+    start = time.time()
+    for i in range(repeat):
+        item = load_item(repo, content)
+        for pid in item.claims:
+            item.claims[pid]
+    eager = time.time()
+    for i in range(repeat):
+        item = load_item(repo, content)
+        item.claims['P17']
+    lazy = time.time()
+
+    full = len(json.dumps(content))
+    info = ('claims', 'id', 'type', 'lastrevid', 'pageid', 'ns', 'title',
+            'modified')
+    only_claims = len(json.dumps(dict((key, content[key]) for key in info
+                                      if key in content)))
+
+    print('%d properties with %d claims, %d repetitions'
+          % (len(claims), sum(len(values) for values in claims.values()),
+             repeat))
+    print('all claims:   %.3f s (%.1f ms per item)'
+          % (eager - start, (eager - start) * 1e3 / repeat))
+    print('one property: %.3f s (%.1f ms per item)'
+          % (lazy - eager, (lazy - eager) * 1e3 / repeat))
+    print('JSON size: %d bytes, %d bytes with props=claims|info'
+          % (full, only_claims))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 
 from scripts import checkimages
 
-from tests.aspects import unittest, TestCase
+from tests.aspects import unittest, TestCase, DefaultDrySiteTestCase
 
 
 class TestSettings(TestCase):
@@ -25,5 +25,86 @@ class TestSettings(TestCase):
         self.assertEqual(item1[1], 'a deprecated template')
 
 
+class TestFileHashIndex(DefaultDrySiteTestCase):
+
+    """Test the index of the file checksums."""
+
+    def setUp(self):
+        """Create an index in memory."""
+        super(TestFileHashIndex, self).setUp()
+        self.index = checkimages.FileHashIndex(self.get_site(), ':memory:')
+        self.queries = []
+        self.lists = {'allimages': [], 'logevents': []}
+        self.files = {}
+        self.index._query = self.query
+        self.index._fileInfo = self.fileInfo
+
+    def tearDown(self):
+        """Close the index."""
+        self.index.close()
+        super(TestFileHashIndex, self).tearDown()
+
+    def query(self, site, listaction, step, total=None, **kwargs):
+        self.queries.append((listaction, kwargs.get('aistart') or
+                             kwargs.get('lestart')))
+        return self.lists[listaction][:total]
+
+    def fileInfo(self, site, titles, step):
+        self.queries.append(('imageinfo', titles))
+        return [(title, ) + self.files[title] for title in titles
+                if title in self.files]
+
+    def test_update(self):
+        """Test that the index continues at the last loaded file."""
+        index = self.index
+        self.lists['allimages'] = [
+            {'title': 'File:A.png', 'sha1': 'aaa',
+             'timestamp': '2015-01-01T00:00:00Z'},
+            {'title': 'File:B.png', 'sha1': 'bbb',
+             'timestamp': '2015-01-02T00:00:00Z'},
+            {'title': 'File:C.png', 'sha1': 'aaa',
+             'timestamp': '2015-01-03T00:00:00Z'}]
+        self.assertEqual(index.update(step=2, total=2), 2)
+        self.assertEqual(index.titles('aaa'), ['File:A.png'])
+        self.assertEqual(self.queries[0], ('allimages', None))
+        self.assertEqual(index.update(step=2), 3)
+        self.assertEqual(index.titles('AAA'), ['File:A.png', 'File:C.png'])
+        self.assertEqual(self.queries[2],
+                         ('allimages', '2015-01-02T00:00:00Z'))
+        self.lists['allimages'] = []
+        self.lists['logevents'] = [
+            {'title': 'File:A.png', 'action': 'delete',
+             'timestamp': '2015-01-04T00:00:00Z'},
+            {'title': 'File:B.png', 'action': 'delete',
+             'timestamp': '2015-01-05T00:00:00Z'}]
+        self.assertEqual(index.update(), 0)
+        self.assertEqual(index.titles('aaa'), ['File:C.png'])
+        self.assertEqual(index.titles('bbb'), [])
+
+    def test_update_restored(self):
+        """Test that restored files are loaded with their upload time."""
+        index = self.index
+        index.add('File:C.png', 'ccc', '2015-01-03T00:00:00Z')
+        self.lists['logevents'] = [
+            {'title': 'File:A.png', 'action': 'restore',
+             'timestamp': '2015-01-04T00:00:00Z'},
+            {'title': 'File:C.png', 'action': 'restore',
+             'timestamp': '2015-01-05T00:00:00Z'},
+            {'title': 'File:C.png', 'action': 'delete',
+             'timestamp': '2015-01-06T00:00:00Z'},
+            {'title': 'File:D.png', 'action': 'restore',
+             'timestamp': '2015-01-07T00:00:00Z'}]
+        self.files['File:A.png'] = ('aaa', '2015-01-01T00:00:00Z')
+        self.assertEqual(index.update(), 0)
+        self.assertEqual(index.titles('aaa'), ['File:A.png'])
+        self.assertEqual(index.titles('ccc'), [])
+        self.assertEqual(self.queries[-1],
+                         ('imageinfo', ['File:A.png', 'File:D.png']))
+        self.lists['logevents'] = []
+        index.update()
+        self.assertEqual(self.queries[-1],
+                         ('logevents', '2015-01-07T00:00:00Z'))
+
+
 if __name__ == "__main__":
     unittest.main()
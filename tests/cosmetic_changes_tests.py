@@ -9,9 +9,11 @@ from __future__ import unicode_literals
 
 __version__ = '$Id$'
 
+from pywikibot import config
 from pywikibot.cosmetic_changes import CosmeticChangesToolkit
 
-from tests.aspects import unittest, TestCase
+from tests.aspects import unittest, TestCase, DefaultDrySiteTestCase
+from tests.utils import DrySite
 
 
 class TestCosmeticChanges(TestCase):
@@ -197,6 +199,28 @@ class TestCosmeticChanges(TestCase):
                          self.cct.fixTypo('42 ºC'))
 
 
+class TestCosmeticChangesPrefilter(DefaultDrySiteTestCase):
+
+    """Test that methods which can't change the text are skipped."""
+
+    def setUp(self):
+        """Create the toolkit."""
+        super(TestCosmeticChangesPrefilter, self).setUp()
+        # replaceExcept uses the default site
+        config.site_interface = DrySite
+        self.cct = CosmeticChangesToolkit(self.get_site(), namespace=0,
+                                          pageTitle='Test')
+        self.cct.common_methods = (self.cct.fixHtml, self.cct.fixStyle,
+                                   self.cct.removeNonBreakingSpaceBeforePercent)
+
+    def test_prefilter(self):
+        """Test that only fixHtml is executed and timed."""
+        self.assertEqual(self.cct.change('<b>Foo</b> 42 %'), "'''Foo''' 42 %")
+        self.assertEqual(list(self.cct.timings), ['fixHtml'])
+        self.assertEqual(self.cct.change('Foo'), 'Foo')
+        self.assertEqual(list(self.cct.timings), [])
+
+
 if __name__ == '__main__':
     try:
         unittest.main()
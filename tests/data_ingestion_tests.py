@@ -6,6 +6,9 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 
 import os
+import threading
+import time
+
 from tests import _data_dir
 from tests import _images_dir
 from tests.aspects import unittest, TestCase, ScriptMainTestCase
@@ -95,6 +98,69 @@ class TestCSVReader(TestCase):
 }}""")  # noqa
 
 
+class DummyPhoto(object):
+
+    """Photo which records how many are prepared at the same time."""
+
+    lock = threading.Lock()
+    running = 0
+    maxRunning = 0
+
+    def __init__(self, URL, fail=False):
+        self.URL = URL
+        self.fail = fail
+        self.prepared = False
+
+    def findDuplicateImages(self):
+        with DummyPhoto.lock:
+            DummyPhoto.running += 1
+            DummyPhoto.maxRunning = max(DummyPhoto.maxRunning,
+                                        DummyPhoto.running)
+        time.sleep(0.05)
+        with DummyPhoto.lock:
+            DummyPhoto.running -= 1
+        if self.fail:
+            raise ValueError('broken')
+        self.prepared = True
+        return []
+
+
+class TestPreparedPhotoGenerator(TestCase):
+
+    """Test preparing the photos in advance."""
+
+    net = False
+
+    def setUp(self):
+        super(TestPreparedPhotoGenerator, self).setUp()
+        DummyPhoto.maxRunning = 0
+
+    def test_order(self):
+        """Test that the photos keep their order and are prepared."""
+        photos = [DummyPhoto(str(number), fail=number == 2)
+                  for number in range(7)]
+        prepared = []
+        for photo in data_ingestion.PreparedPhotoGenerator(photos, 3):
+            prepared.append(photo)
+            self.assertTrue(photo.prepared or photo.fail)
+        self.assertEqual(prepared, photos)
+        self.assertEqual(DummyPhoto.maxRunning, 3)
+        self.assertFalse(photos[2].prepared)
+
+    def test_lazy(self):
+        """Test that only a few photos are taken from the generator."""
+        taken = []
+
+        def photos():
+            for number in range(10):
+                taken.append(number)
+                yield DummyPhoto(str(number))
+
+        gen = data_ingestion.PreparedPhotoGenerator(photos(), 2)
+        next(gen)
+        self.assertEqual(taken, [0, 1])
+
+
 class TestDataIngestionBot(ScriptMainTestCase):
 
     """Test TestDataIngestionBot class."""
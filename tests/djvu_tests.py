@@ -15,7 +15,7 @@ import subprocess
 
 from tests import _data_dir
 from tests.aspects import unittest, TestCase
-from pywikibot.tools.djvu import DjVuFile
+from pywikibot.tools.djvu import DjVuFile, _parse_page_texts
 
 _djvu_dir = 'djvu'
 
@@ -78,6 +78,34 @@ class TestDjVuFile(TestCase):
         self.assertFalse(djvu.has_text())
         self.assertRaises(ValueError, djvu.get_page, 100)
 
+    def test_load_pages(self):
+        """Test loading the text of several pages at once."""
+        djvu = DjVuFile(self.file_djvu)
+        self.assertTrue(djvu.load_pages())
+        self.assertEqual(sorted(djvu._page_texts), [1, 2, 3, 4])
+        self.assertEqual(djvu.get_page(1), self.test_txt)
+        for n in range(2, 5):
+            self.assertEqual(djvu.get_page(n),
+                             DjVuFile(self.file_djvu).get_page(n))
+
+
+class TestPageTextParser(TestCase):
+
+    """Test parsing the page texts written by djvutxt."""
+
+    net = False
+
+    def test_pages(self):
+        """Test that each page is found, also without text."""
+        data = (b'(page 0 0 2550 3300\n'
+                b'      "A file with non-ASCII characters, \\nlike '
+                b'\\303\\251 or \xc3\xa7\\037")\n'
+                b'()\n(page 0 0 10 10 "(\\"quoted\\")")\n')
+        self.assertEqual(_parse_page_texts(data),
+                         ['A file with non-ASCII characters, \nlike '
+                          'é or ç\x1f'.encode('utf-8'),
+                          b'', b'("quoted")'])
+
 if __name__ == '__main__':
     try:
         unittest.main()
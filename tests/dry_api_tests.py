@@ -10,12 +10,14 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
+import email
 import os
 import datetime
 
 import pywikibot
 from pywikibot.data.api import (
     CachedRequest,
+    MultipartBody,
     ParamInfo,
     Request,
     QueryGenerator,
@@ -245,6 +247,67 @@ class DryMimeTests(TestCase):
         })[1]
         self.assertNotEqual(body.find(file_content), -1)
 
+    def test_multipart_body_file(self):
+        """Test that MultipartBody reads a file in blocks."""
+        local_filename = os.path.join(_images_dir, 'MP_sounds.png')
+        with open(local_filename, 'rb') as f:
+            file_content = f.read()
+            # the file is read from its current position
+            f.seek(0)
+            headers, body = Request._build_multipart_body(
+                {'action': 'upload', 'text': b'\xc3\xa4'},
+                {'file': (f, ('image', 'png'), {'filename': 'FAKE-NAME'})})
+            body.blocksize = 100
+            blocks = list(body)
+        self.assertTrue(all(len(block) <= 100 for block in blocks))
+        data = b''.join(blocks)
+        self.assertEqual(len(body), len(data))
+        header = ('Content-Type: %s\r\n\r\n' % headers['Content-Type'])
+        if hasattr(email, 'message_from_bytes'):
+            message = email.message_from_bytes(header.encode('ascii') + data)
+        else:
+            message = email.message_from_string(header.encode('ascii') + data)
+        parts = dict((part.get_param('name', header='Content-Disposition'),
+                      part) for part in message.get_payload())
+        self.assertEqual(parts['action'].get_payload(), 'upload')
+        self.assertEqual(parts['text'].get_payload(decode=True),
+                         b'\xc3\xa4')
+        self.assertEqual(parts['file'].get_content_type(), 'image/png')
+        self.assertEqual(parts['file'].get_filename(), 'FAKE-NAME')
+        # the email package doesn't decode binary payloads in Python 3
+        self.assertIn(b'\r\n\r\n' + file_content + b'\r\n--', data)
+
+    def test_multipart_body_twice(self):
+        """Test that the body of a retried request contains the file."""
+        local_filename = os.path.join(_images_dir, 'MP_sounds.png')
+        with open(local_filename, 'rb') as f:
+            file_content = f.read()
+            f.seek(10)
+            bodies = []
+            for attempt in range(2):
+                body = Request._build_multipart_body(
+                    {'action': 'upload'},
+                    {'file': (f, ('image', 'png'), {'filename': 'FAKE'})})[1]
+                bodies.append(body.read())
+            self.assertEqual(f.tell(), 10)
+        # the boundaries are random
+        self.assertEqual(len(bodies[0]), len(bodies[1]))
+        for body in bodies:
+            self.assertIn(b'\r\n\r\n' + file_content[10:] + b'\r\n--',
+                          body)
+
+    def test_multipart_body_read(self):
+        """Test that MultipartBody reads the requested number of bytes."""
+        body = MultipartBody('boundary')
+        body.add('name', 'value')
+        body.add('data', bytearray(b'\x00' * 10))
+        body.close()
+        data = body.read(7) + body.read(50) + body.read()
+        self.assertEqual(len(data), len(body))
+        self.assertEqual(body.read(), b'')
+        self.assertTrue(data.startswith(b'--boundary\r\n'))
+        self.assertTrue(data.endswith(b'\x00' * 10 + b'\r\n--boundary--\r\n'))
+
 
 class MimeTests(DefaultDrySiteTestCase):
 
@@ -21,7 +21,6 @@ from pywikibot.comms import http, threadedhttp
 
 from tests import _images_dir
 from tests.aspects import unittest, TestCase
-from tests.utils import expected_failure_if
 
 if sys.version_info[0] > 2:
     unicode = str
@@ -91,7 +90,6 @@ class HttpsCertificateTestCase(TestCase):
                           site=None,
                           uri='https://www.omegawiki.org/')
 
-    @expected_failure_if(sys.version_info[0] > 2)  # bug 72236
     def test_https_ignore_cert_error(self):
         """Test http.request ignoring invalid vikidia SSL certificate."""
         # As the connection is cached, the above test will cause
@@ -323,6 +321,15 @@ class CharsetTestCase(TestCase):
         self.assertEqual(req.raw, CharsetTestCase.LATIN1_BYTES)
         self.assertEqual(req.content, CharsetTestCase.STR)
 
+    def test_content_after_encoding(self):
+        """Test that the content is the same after detecting the encoding."""
+        req = CharsetTestCase._create_request('latin1')
+        self.assertEqual('utf-8', req.encoding)
+        self.assertEqual(req.content, CharsetTestCase.STR)
+        self.assertEqual(req.content, CharsetTestCase.STR)
+        self.assertEqual(req.decode('latin1'),
+                         CharsetTestCase.UTF8_BYTES.decode('latin1'))
+
     def test_invalid_charset(self):
         """Test decoding with different and invalid charsets."""
         req = CharsetTestCase._create_request('utf16',
@@ -333,6 +340,46 @@ class CharsetTestCase(TestCase):
         self.assertRaises(UnicodeDecodeError, lambda: req.content)
 
 
+class StatisticsTestCase(TestCase):
+
+    """Test the transfer statistics and the transport settings."""
+
+    net = False
+
+    def test_host_statistics(self):
+        """Test recording requests in _HostStatistics."""
+        resp = requests.Response()
+        resp._content = b'abc'
+        stats = http._HostStatistics()
+        stats.add(0.05, resp, 'q=1')
+        stats.add(60, None, b'q=2')
+        values = stats.as_dict()
+        self.assertEqual(values['requests'], 2)
+        self.assertEqual(values['errors'], 1)
+        self.assertEqual(values['bytes_out'], 6)
+        self.assertEqual(values['bytes_in'], 3)
+        self.assertEqual(values['latency<=0.1'], 1)
+        self.assertEqual(values['latency<=inf'], 1)
+        self.assertEqual(values['latency<=1'], 0)
+
+    def test_accepted_encodings(self):
+        """Test the Accept-Encoding header of the session."""
+        self.assertEqual(http.session.headers['Accept-Encoding'],
+                         http._accepted_encodings())
+        self.assertIn('gzip', http._accepted_encodings())
+        compression = config.http_compression
+        try:
+            config.http_compression = []
+            self.assertEqual(http._accepted_encodings(), 'identity')
+        finally:
+            config.http_compression = compression
+
+    def test_pool_size(self):
+        """Test that the session uses the configured pool sizes."""
+        adapter = http.session.get_adapter('https://www.wikipedia.org/')
+        self.assertEqual(adapter._pool_maxsize, config.http_pool_maxsize)
+
+
 class BinaryTestCase(TestCase):
 
     """Get binary file using requests and pywikibot."""
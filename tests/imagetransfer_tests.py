@@ -0,0 +1,111 @@
+# -*- coding: utf-8  -*-
+"""Tests for the imagetransfer script."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import pywikibot
+
+from scripts import imagetransfer
+
+from tests.aspects import unittest, TestCase
+
+
+class TestImageTransferBot(TestCase):
+
+    """Test which images the bot skips, with mocked imageinfo results."""
+
+    dry = True
+
+    sites = {
+        'source': {
+            'family': 'wikipedia',
+            'code': 'de',
+        },
+        'target': {
+            'family': 'commons',
+            'code': 'commons',
+        },
+    }
+
+    def setUp(self):
+        """Create a bot which uses the page data of self.pages."""
+        super(TestImageTransferBot, self).setUp()
+        self.source = self.get_site('source')
+        self.target = self.get_site('target')
+        self.bot = imagetransfer.ImageTransferBot(None, self.target,
+                                                  transfer_all=True)
+        self.bot._query = self.query
+        self.pages = {}
+        self.queries = []
+
+    def query(self, site, titles, step=50):
+        self.queries.append((site, titles))
+        return dict((title, self.pages[site, title]) for title in titles
+                    if (site, title) in self.pages)
+
+    def add(self, site, title, sha1=None, **info):
+        """Add the page data and return the file page."""
+        pagedata = dict(info, title=title)
+        if sha1:
+            pagedata['imageinfo'] = [{'sha1': sha1}]
+        self.pages[site, title] = pagedata
+        return pywikibot.FilePage(site, title)
+
+    def test_find_transferred(self):
+        """Test that images are found by their name and by their SHA-1."""
+        sha1_queries = []
+
+        def allimages(sha1, total):
+            sha1_queries.append(sha1)
+            yield copy
+
+        self.target.allimages = allimages
+        same = self.add(self.source, 'File:A.png', 'a')
+        self.add(self.target, 'File:A.png', 'a')
+        renamed = self.add(self.source, 'File:B.png', 'b')
+        self.add(self.target, 'File:B.png', 'x')
+        copy = pywikibot.FilePage(self.target, 'File:B copy.png')
+        new = self.add(self.source, 'File:C.png', 'c')
+        self.add(self.target, 'File:C.png', missing='')
+        missing = self.add(self.source, 'File:D.png', missing='')
+        imagelist = [same, renamed, new, missing]
+        found = self.bot.findTransferred(imagelist)
+        self.assertEqual(found, {same: pywikibot.FilePage(self.target,
+                                                          'File:A.png'),
+                                 renamed: copy})
+        self.assertEqual(sha1_queries, ['b'])
+        titles = ['File:A.png', 'File:B.png', 'File:C.png', 'File:D.png']
+        self.assertEqual(self.queries, [(self.source, titles),
+                                        (self.target, titles)])
+        self.assertEqual(self.bot.skipTransferred(imagelist), [new, missing])
+
+    def test_skip_unattended(self):
+        """Test that images which UploadRobot would ask about are skipped."""
+        new = self.add(self.source, 'File:A.png', 'a')
+        self.add(self.target, 'File:A.png', missing='')
+        imagelist = [
+            new,
+            self.add(self.source, 'File:B.exe', 'b'),
+            self.add(self.source, 'File:C*.png', 'c'),
+            self.add(self.source, 'File:D.png', redirect=''),
+            self.add(self.source, 'File:E.png', missing='', known=''),
+            self.add(self.source, 'File:F.png', 'f'),
+            self.add(self.source, 'File:G.png', 'g'),
+        ]
+        self.add(self.target, 'File:F.png', 'x', missing='', known='')
+        self.add(self.target, 'File:G.png')
+        self.assertEqual(self.bot.skipUnattended(imagelist), [new])
+        self.assertEqual(len(self.queries), 2)
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
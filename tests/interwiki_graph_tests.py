@@ -10,10 +10,10 @@ from __future__ import unicode_literals
 
 __version__ = '$Id$'
 
-from pywikibot import interwiki_graph
+from pywikibot import config, interwiki_graph
 
 from tests.aspects import unittest, SiteAttributeTestCase
-from tests.utils import DryPage
+from tests.utils import DryPage, DrySite
 
 
 class TestWiktionaryGraph(SiteAttributeTestCase):
@@ -89,6 +89,120 @@ class TestWiktionaryGraph(SiteAttributeTestCase):
             'octagon')
 
 
+class TestLanglinksGraph(SiteAttributeTestCase):
+
+    """Test the store of the language links."""
+
+    sites = {
+        'enwikt': {
+            'family': 'wiktionary',
+            'code': 'en',
+        },
+        'frwikt': {
+            'family': 'wiktionary',
+            'code': 'fr',
+        },
+        'plwikt': {
+            'family': 'wiktionary',
+            'code': 'pl',
+        },
+    }
+    dry = True
+    cached = True
+
+    en = 'wiktionary:en'
+    fr = 'wiktionary:fr'
+    pl = 'wiktionary:pl'
+
+    def setUp(self):
+        """Create a graph in memory."""
+        super(TestLanglinksGraph, self).setUp()
+        # the graph creates the sites of the language links
+        config.site_interface = DrySite
+        self.graph = interwiki_graph.LanglinksGraph(':memory:')
+
+    def tearDown(self):
+        """Close the graph."""
+        self.graph.close()
+        super(TestLanglinksGraph, self).tearDown()
+
+    def test_component(self):
+        """Test that the components are merged and split."""
+        graph = self.graph
+        origin = DryPage(self.enwikt, 'origin')
+        self.assertEqual(graph.component(origin), set([(self.en, 'origin')]))
+        graph.store(self.en, 1, 'origin', 10, [(self.fr, 'origin')])
+        self.assertEqual(graph.component(origin),
+                         set([(self.en, 'origin'), (self.fr, 'origin')]))
+        # the links of the pl page are added to the known component
+        graph.store(self.pl, 3, 'origin', 30, [(self.fr, 'origin')])
+        graph.store(self.fr, 2, 'origin', 20, [])
+        self.assertEqual(graph.component(origin),
+                         set([(self.en, 'origin'), (self.fr, 'origin'),
+                              (self.pl, 'origin')]))
+        self.assertEqual(graph.revision(self.fr, 'origin'), 20)
+        # removing the link of the en page splits the component
+        graph.store(self.en, 1, 'origin', 11, [])
+        self.assertEqual(graph.component(origin), set([(self.en, 'origin')]))
+        self.assertEqual(len(graph.component(DryPage(self.plwikt, 'origin'))),
+                         2)
+        self.assertEqual(graph.componentPages(origin), [origin])
+
+    def test_refresh(self):
+        """Test that only the changed pages are loaded."""
+        graph = self.graph
+        graph.store(self.fr, 2, 'origin', 20, [(self.en, 'origin')])
+        queries = []
+
+        def query(site, props, titles, **kwargs):
+            queries.append((props, sorted(titles)))
+            for title in titles:
+                if title == 'missing':
+                    yield {'title': title, 'missing': ''}
+                    continue
+                pagedata = {'title': title, 'pageid': len(title),
+                            'lastrevid': 20}
+                if props != 'info':
+                    pagedata['langlinks'] = [{'lang': 'pl', '*': title}]
+                yield pagedata
+
+        graph._query = query
+        self.assertEqual(
+            graph.refresh(self.frwikt, ['origin', 'new', 'missing']),
+            ['missing', 'new'])
+        self.assertEqual(queries,
+                         [('info', ['missing', 'new', 'origin']),
+                          ('info|langlinks', ['new'])])
+        self.assertEqual(graph.revision(self.fr, 'new'), 20)
+        self.assertEqual(graph.component(DryPage(self.frwikt, 'new')),
+                         set([(self.fr, 'new'), (self.pl, 'new')]))
+
+    def test_refresh_components(self):
+        """Test that the components of several pages are queried together."""
+        graph = self.graph
+        graph.store(self.en, 1, 'first', 10, [(self.fr, 'first')])
+        graph.store(self.en, 2, 'second', 10, [(self.fr, 'second')])
+        queries = []
+
+        def query(site, props, titles, **kwargs):
+            queries.append((site.code, props, sorted(titles)))
+            for title in titles:
+                yield {'title': title, 'pageid': len(title), 'lastrevid': 10}
+
+        graph._query = query
+        first = DryPage(self.enwikt, 'first')
+        second = DryPage(self.enwikt, 'second')
+        components = graph.refreshComponents([first, second])
+        self.assertEqual(queries,
+                         [('en', 'info', ['first', 'second']),
+                          ('fr', 'info', ['first', 'second']),
+                          ('fr', 'info|langlinks', ['first', 'second'])])
+        self.assertEqual(components[first],
+                         [first, DryPage(self.frwikt, 'first')])
+        self.assertEqual(components[second],
+                         [second, DryPage(self.frwikt, 'second')])
+
+
 if __name__ == '__main__':
     try:
         unittest.main()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8  -*-
+"""Tests for scripts/interwiki.py."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import threading
+
+from scripts import interwiki
+
+from tests.aspects import unittest, TestCase
+
+
+class DummySite(object):
+
+    """Site which records how many sites load pages at the same time."""
+
+    lock = threading.Lock()
+    running = 0
+    maxRunning = 0
+
+    def __init__(self, code):
+        self.code = code
+        self.loaded = []
+
+    def __repr__(self):
+        return 'DummySite(%r)' % self.code
+
+    def preloadpages(self, pages, templates=False, langlinks=False):
+        with DummySite.lock:
+            DummySite.running += 1
+            DummySite.maxRunning = max(DummySite.maxRunning,
+                                       DummySite.running)
+        threading.Event().wait(0.1)
+        with DummySite.lock:
+            DummySite.running -= 1
+        self.loaded.extend(pages)
+        for page in pages:
+            yield page
+
+
+class DummySubject(object):
+
+    """Subject with pages on several sites which is done once loaded."""
+
+    def __init__(self, todo):
+        self.todo = todo
+        self.pending = None
+        self.finished = False
+
+    def whatsNextPageBatch(self, site):
+        assert self.pending is None
+        pages = self.todo.pop(site, [])
+        if pages:
+            self.pending = site
+        return pages
+
+    def batchLoaded(self, counter):
+        counter.minus(self.pending)
+        self.pending = None
+
+    def isDone(self):
+        return not self.todo
+
+    def finish(self):
+        self.finished = True
+
+    def clean(self):
+        pass
+
+
+class DummyGraph(object):
+
+    """Langlinks graph which records the refreshed pages."""
+
+    def __init__(self, components):
+        self.components = components
+        self.refreshed = []
+
+    def refreshComponents(self, pages):
+        self.refreshed.append(pages)
+        return dict((page, self.components[page]) for page in pages)
+
+
+class DummyPage(object):
+
+    """Page which only has a site."""
+
+    def __init__(self, site):
+        self.site = site
+
+
+class GraphSubject(object):
+
+    """Subject which adds all pages found in the graph."""
+
+    def __init__(self, originPage):
+        self.originPage = originPage
+
+    def translateFromGraph(self, pages):
+        return pages
+
+
+class TestInterwikiBotScheduler(TestCase):
+
+    """Test that InterwikiBot loads pages from several sites at once."""
+
+    net = False
+
+    def setUp(self):
+        super(TestInterwikiBotScheduler, self).setUp()
+        self._parallelsites = interwiki.globalvar.parallelsites
+        self._maxquerysize = interwiki.globalvar.maxquerysize
+        interwiki.globalvar.parallelsites = 3
+        interwiki.globalvar.maxquerysize = 2
+        DummySite.maxRunning = 0
+        self.sites = [DummySite(code) for code in ('de', 'en', 'fr')]
+        self.bot = interwiki.InterwikiBot()
+
+    def tearDown(self):
+        interwiki.globalvar.parallelsites = self._parallelsites
+        interwiki.globalvar.maxquerysize = self._maxquerysize
+        super(TestInterwikiBotScheduler, self).tearDown()
+
+    def add(self, **pages):
+        subject = DummySubject(dict((site, pages[site.code])
+                                    for site in self.sites
+                                    if site.code in pages))
+        for site, sitePages in subject.todo.items():
+            self.bot.plus(site, len(sitePages))
+        self.bot.subjects.append(subject)
+        return subject
+
+    def test_select_sites(self):
+        """Test that the sites with most open pages are selected."""
+        de, en, fr = self.sites
+        self.add(de=['a'], en=['b', 'c'], fr=['d', 'e', 'f'])
+        self.bot.selectQuerySite = lambda: de
+        self.assertEqual(self.bot.selectQuerySites(), [de, fr, en])
+        interwiki.globalvar.parallelsites = 2
+        self.assertEqual(self.bot.selectQuerySites(), [de, fr])
+
+    def test_assemble_batches(self):
+        """Test that each subject works on one site at a time."""
+        de, en, fr = self.sites
+        first = self.add(de=['a'], en=['b'])
+        second = self.add(en=['c'], fr=['d'])
+        third = self.add(en=['e'], fr=['f'])
+        batches = self.bot.assembleBatches([de, en, fr])
+        self.assertEqual(batches, [(de, ['a'], [first]),
+                                   (en, ['c', 'e'], [second, third])])
+        self.assertEqual(first.todo, {en: ['b']})
+
+    def test_one_query(self):
+        """Test that the sites are loaded concurrently."""
+        de, en, fr = self.sites
+        subjects = [self.add(de=['a']), self.add(en=['b']),
+                    self.add(fr=['c'])]
+        self.bot.selectQuerySite = lambda: de
+        self.assertTrue(self.bot.oneQuery())
+        self.assertEqual(DummySite.maxRunning, 3)
+        self.assertEqual([site.loaded for site in self.sites],
+                         [['a'], ['b'], ['c']])
+        self.assertTrue(all(subject.finished for subject in subjects))
+        self.assertEqual(self.bot.subjects, [])
+        self.assertEqual(self.bot.counts, {de: 0, en: 0, fr: 0})
+
+    def test_one_site(self):
+        """Test that -parallel:1 loads from one site only."""
+        de, en, fr = self.sites
+        self.add(de=['a'], en=['b'])
+        self.add(en=['c'])
+        interwiki.globalvar.parallelsites = 1
+        self.bot.selectQuerySite = lambda: en
+        self.assertTrue(self.bot.oneQuery())
+        self.assertEqual(DummySite.maxRunning, 1)
+        self.assertEqual(en.loaded, ['b', 'c'])
+        self.assertEqual(len(self.bot.subjects), 1)
+
+    def test_parallel_option(self):
+        """Test that -parallel needs at least one site."""
+        options = interwiki.Global()
+        self.assertTrue(options.readOptions('-parallel:2'))
+        self.assertEqual(options.parallelsites, 2)
+        self.assertRaises(ValueError, options.readOptions, '-parallel:0')
+        self.assertRaises(ValueError, options.readOptions, '-parallel:-1')
+
+    def test_error(self):
+        """Test that an error while loading is raised."""
+        de, en, fr = self.sites
+
+        def preloadpages(pages, **kwargs):
+            raise ValueError('broken')
+            yield
+
+        de.preloadpages = fr.preloadpages = preloadpages
+        self.add(de=['a'])
+        self.add(fr=['b'])
+        self.bot.selectQuerySite = lambda: de
+        self.assertRaises(ValueError, self.bot.oneQuery)
+
+    def test_translate_from_graph(self):
+        """Test that the components of the subjects are refreshed at once."""
+        de, en, fr = self.sites
+        first, second = DummyPage(de), DummyPage(de)
+        graph = DummyGraph({first: [DummyPage(en), DummyPage(fr)],
+                            second: [DummyPage(fr)]})
+        oldGraph = interwiki.globalvar.graph
+        interwiki.globalvar.graph = graph
+        try:
+            self.bot.translateFromGraph([GraphSubject(first),
+                                         GraphSubject(second)])
+        finally:
+            interwiki.globalvar.graph = oldGraph
+        self.assertEqual(graph.refreshed, [[first, second]])
+        self.assertEqual(self.bot.counts, {en: 1, fr: 2})
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
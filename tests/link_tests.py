@@ -124,6 +124,37 @@ class TestLink(DefaultDrySiteTestCase):
         l = Link('/bar', self.get_site())
         self.assertEquals(l.title, '/bar')
 
+    def test_normalized_text(self):
+        """Test that normalisation is skipped only for unaffected texts."""
+        site = self.get_site()
+        self.assertEqual(Link('Foo bar', site)._text, 'Foo bar')
+        self.assertEqual(Link('Foo (bar)/Baz|Qux', site)._text,
+                         'Foo (bar)/Baz')
+        self.assertEqual(Link(' Foo', site)._text, 'Foo')
+        self.assertEqual(Link('Foo ', site)._text, 'Foo')
+        self.assertEqual(Link('Foo  bar', site)._text, 'Foo bar')
+        self.assertEqual(Link('Foo_bar', site)._text, 'Foo bar')
+        self.assertEqual(Link('Foo%20bar', site)._text, 'Foo bar')
+        self.assertEqual(Link('Foo&amp;bar', site)._text, 'Foo&bar')
+        self.assertEqual(Link('Foo\tbar', site)._text, 'Foo\tbar')
+        self.assertEqual(Link('Foo\u200ebar', site)._text, 'Foobar')
+        self.assertEqual(Link('Á', site)._text, 'Á')
+
+    def test_prefix_memo(self):
+        """Test that the memo of link prefixes follows the namespaces."""
+        site = self.get_site()
+        self.assertEqual(Link('Talk:Foo', site).namespace, 1)
+        self.assertEqual(Link('Foo:Bar', site).namespace, 0)
+        self.assertIn('talk', site._link_prefixes[2])
+        old_namespaces = site._namespaces
+        try:
+            site._namespaces = site._build_namespaces()
+            site._namespaces[1].aliases.append('Foo')
+            self.assertEqual(Link('Foo:Bar', site).namespace, 1)
+        finally:
+            site._namespaces = old_namespaces
+        self.assertEqual(Link('Foo:Bar', site).namespace, 0)
+
 # ---- The first set of tests are explicit links, starting with a ':'.
 
 
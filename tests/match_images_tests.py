@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+"""Tests for the match_images script."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import os
+import shutil
+import tempfile
+
+import pywikibot
+
+try:
+    from scripts import match_images
+except ImportError as e:
+    match_images = e
+
+from tests.aspects import unittest, TestCase, DefaultDrySiteTestCase
+
+
+def require_pil():
+    """Skip the tests if PIL isn't available."""
+    if isinstance(match_images, ImportError):
+        raise unittest.SkipTest('PIL not available: %s' % match_images)
+
+
+class TestImageComparison(TestCase):
+
+    """Test the hashes and histograms with and without NumPy."""
+
+    net = False
+
+    @classmethod
+    def setUpClass(cls):
+        require_pil()
+        super(TestImageComparison, cls).setUpClass()
+
+    def setUp(self):
+        super(TestImageComparison, self).setUp()
+        self.numpy = match_images.numpy
+
+    def tearDown(self):
+        match_images.numpy = self.numpy
+        super(TestImageComparison, self).tearDown()
+
+    def require_numpy(self):
+        if self.numpy is None:
+            raise unittest.SkipTest('NumPy not available')
+
+    def without_numpy(self, func, *args):
+        match_images.numpy = None
+        try:
+            return func(*args)
+        finally:
+            match_images.numpy = self.numpy
+
+    @staticmethod
+    def image(pixel, size=(64, 48)):
+        image = match_images.Image.new('RGB', size)
+        image.putdata([pixel(x, y) for y in range(size[1])
+                       for x in range(size[0])])
+        return image
+
+    def images(self):
+        return [self.image(lambda x, y: (x * 4, y * 5, x + y)),
+                self.image(lambda x, y: (252 - x * 4, y * 5, 0)),
+                self.image(lambda x, y: ((x * 37 + y * 91) % 256,
+                                         (x * y * 13) % 256, 128))]
+
+    def test_image_hash(self):
+        """Test the hash of gradients without NumPy."""
+        gradient, reversed_gradient = self.images()[:2]
+        self.assertEqual(self.without_numpy(match_images.image_hash,
+                                            gradient), 2 ** 64 - 1)
+        self.assertEqual(self.without_numpy(match_images.image_hash,
+                                            reversed_gradient), 0)
+
+    def test_image_hash_numpy(self):
+        """Test that NumPy calculates the same hashes."""
+        self.require_numpy()
+        for image in self.images():
+            self.assertEqual(
+                match_images.image_hash(image),
+                self.without_numpy(match_images.image_hash, image))
+
+    def test_hash_distances(self):
+        """Test the distances of the hashes without NumPy."""
+        hashes = [0b1011, 0, 2 ** 64 - 1, 2 ** 63]
+        self.assertEqual(self.without_numpy(match_images.hash_distances,
+                                            0b1011, hashes), [0, 3, 61, 4])
+        self.assertEqual(self.without_numpy(match_images.hash_distances,
+                                            0, []), [])
+
+    def test_hash_distances_numpy(self):
+        """Test that NumPy calculates the same distances."""
+        self.require_numpy()
+        hashes = [0b1011, 0, 2 ** 64 - 1, 2 ** 63, 0x0123456789abcdef]
+        for value in (0, 0b1011, 2 ** 64 - 1, 0xfedcba9876543210):
+            self.assertEqual(
+                match_images.hash_distances(value, hashes),
+                self.without_numpy(match_images.hash_distances,
+                                   value, hashes))
+        self.assertEqual(match_images.hash_distances(0, []), [])
+
+    def test_match_images(self):
+        """Test that both histogram comparisons give the same ratio."""
+        first, second = self.images()[::2]
+        self.assertEqual(self.without_numpy(match_images.match_images,
+                                            first, first), 1)
+        ratio = self.without_numpy(match_images.match_images, first, second)
+        self.assertLess(ratio, 1)
+        if self.numpy is not None:
+            self.assertAlmostEqual(match_images.match_images(first, second),
+                                   ratio)
+
+
+class TestImageHashIndex(DefaultDrySiteTestCase):
+
+    """Test the index of the perceptual hashes."""
+
+    @classmethod
+    def setUpClass(cls):
+        require_pil()
+        super(TestImageHashIndex, cls).setUpClass()
+
+    def setUp(self):
+        """Create an index with known hashes."""
+        super(TestImageHashIndex, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'image-hashes.json')
+        self.index = match_images.ImageHashIndex(self.filename)
+        self.index.hashes = {'sha-a': 0, 'sha-b': 0b111, 'sha-c': 2 ** 64 - 1}
+        self.queries = []
+        self.index._query = self.query
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestImageHashIndex, self).tearDown()
+
+    def query(self, site, titles, step=50):
+        self.queries.append(titles)
+        return dict((title, 'sha-' + title[5].lower()) for title in titles)
+
+    def test_similar(self):
+        """Test that the checksums of all files are loaded at once."""
+        site = self.get_site()
+        a, b, c = [pywikibot.FilePage(site, 'File:%s.png' % name)
+                   for name in 'ABC']
+        self.assertEqual(self.index.similar(a, [b, c]), [(b, 3)])
+        self.assertEqual(self.queries, [['File:A.png', 'File:B.png',
+                                         'File:C.png']])
+        self.assertEqual(self.index.similar(c, [a, b], maxDistance=64),
+                         [(b, 61), (a, 64)])
+        self.assertEqual(len(self.queries), 1)
+
+    def test_save(self):
+        """Test that the hashes are read again from the file."""
+        self.index._changed = True
+        self.index.save()
+        index = match_images.ImageHashIndex(self.filename)
+        self.assertEqual(index.hashes, self.index.hashes)
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -17,7 +17,7 @@ import pywikibot.page
 
 from tests.aspects import (
     unittest, TestCase, DefaultSiteTestCase, SiteAttributeTestCase,
-    DeprecationTestCase,
+    DeprecationTestCase, DefaultDrySiteTestCase,
 )
 from tests.utils import expected_failure_if
 
@@ -863,6 +863,48 @@ class TestPageProtect(TestCase):
         self.assertEqual(p1.protection(), {})
 
 
+class TestPageContentsStore(DefaultDrySiteTestCase):
+
+    """Test keeping the revision texts in a store."""
+
+    def test_stored_revision(self):
+        """Test that the loaded texts are kept in the store of the page."""
+        page = pywikibot.Page(self.get_site(), 'Foo')
+        store = pywikibot.tools.SpillStore(memory=5)
+        page.contents_store = store
+        pagedict = {'title': 'Foo', 'ns': 0, 'pageid': 1,
+                    'revisions': [{'revid': 1, 'parentid': 0, '*': 'Bar' * 5,
+                                   'timestamp': '2015-01-01T00:00:00Z'}]}
+        pywikibot.data.api.update_page(page, pagedict)
+        revision = page._revisions[1]
+        self.assertIsInstance(revision, pywikibot.page.StoredRevision)
+        self.assertEqual(len(store), 1)
+        self.assertIsNotNone(store._file)
+        self.assertEqual(revision.text, 'Bar' * 5)
+        revision.text = 'Baz'
+        self.assertEqual(revision.text, 'Baz')
+        self.assertEqual(len(store), 1)
+        del revision
+        page._revisions.clear()
+        self.assertEqual(len(store), 0)
+        store.close()
+
+    def test_default_store(self):
+        """Test that the pages share one store if enabled in the config."""
+        page = pywikibot.Page(self.get_site(), 'Foo')
+        on_disk = config.page_contents_on_disk
+        try:
+            config.page_contents_on_disk = False
+            self.assertIsNone(page.contents_store)
+            config.page_contents_on_disk = True
+            store = page.contents_store
+            self.assertIsInstance(store, pywikibot.tools.SpillStore)
+            other = pywikibot.Page(self.get_site(), 'Bar')
+            self.assertIs(other.contents_store, store)
+        finally:
+            config.page_contents_on_disk = on_disk
+
+
 class HtmlEntity(TestCase):
 
     """Test that HTML entities are correctly decoded."""
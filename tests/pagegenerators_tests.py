@@ -11,7 +11,9 @@ __version__ = '$Id$'
 
 import datetime
 import os
+import shutil
 import sys
+import tempfile
 
 from distutils.version import LooseVersion
 
@@ -30,6 +32,7 @@ from tests.aspects import (
     DeprecationTestCase,
     WikidataTestCase,
     DefaultSiteTestCase,
+    DefaultDrySiteTestCase,
     RecentChangesTestCase,
 )
 from tests.thread_tests import GeneratorIntersectTestCase
@@ -103,6 +106,46 @@ class TestDryPageGenerators(TestCase):
                                                           site)
         self.assertEqual(len(tuple(gen)), 10)
 
+    def test_DuplicateFilterPageGenerator(self):
+        self.assertFunction("DuplicateFilterPageGenerator")
+        for mode in ('exact', 'hash', 'pageid', 'bloom'):
+            gen = pagegenerators.PagesFromTitlesGenerator(
+                self.titles + self.titles[::-1], self.site)
+            gen = pagegenerators.DuplicateFilterPageGenerator(gen, mode=mode)
+            self.assertPagelistTitles(gen, self.titles)
+        self.assertRaises(ValueError,
+                          pagegenerators.DuplicateFilterPageGenerator,
+                          [], mode='unknown')
+        self.assertRaises(ValueError,
+                          pagegenerators.DuplicateFilterPageGenerator,
+                          [], set(), mode='hash')
+
+    def test_DuplicateFilterPageGenerator_container(self):
+        """Test the arguments of filter_unique."""
+        container = set()
+        gen = pagegenerators.PagesFromTitlesGenerator(
+            self.titles + self.titles[::-1], self.site)
+        gen = pagegenerators.DuplicateFilterPageGenerator(gen, container)
+        self.assertPagelistTitles(gen, self.titles)
+        self.assertEqual(len(container), len(self.titles))
+        titles = ['a', 'A', 'b']
+        self.assertEqual(list(pagegenerators.DuplicateFilterPageGenerator(
+            titles, key=lambda title: title.lower())), ['a', 'b'])
+
+    def test_PageIdSet(self):
+        seen = pagegenerators.PageIdSet()
+        page = pywikibot.Page(self.site, 'Foo')
+        page._pageid = 10
+        other = pywikibot.Page(self.site, 'Bar')
+        other._pageid = 11
+        missing = pywikibot.Page(self.site, 'Baz')
+        seen.add(page)
+        seen.add(missing)
+        self.assertIn(pywikibot.Page(self.site, 'Baz'), seen)
+        self.assertIn(page, seen)
+        self.assertNotIn(other, seen)
+        self.assertNotIn(pywikibot.Page(self.site, 'Bar'), seen)
+
     def test_RegexFilterPageGenerator(self):
         self.assertFunction("RegexFilterPageGenerator")
         gen = pagegenerators.PagesFromTitlesGenerator(self.titles, self.site)
@@ -253,6 +296,106 @@ class TestRepeatingGenerator(RecentChangesTestCase):
         self.assertEqual(len(set(item['revid'] for item in items)), self.length)
 
 
+class TestIncrementalRCPageGenerator(DefaultDrySiteTestCase):
+
+    """Test IncrementalRCPageGenerator with fake recent changes."""
+
+    def setUp(self):
+        """Replace the recent changes of the site."""
+        super(TestIncrementalRCPageGenerator, self).setUp()
+        self.site = self.get_site()
+        self.changes = []
+        self.site.recentchanges = self.recentchanges
+
+    def tearDown(self):
+        """Restore the recent changes of the site."""
+        del self.site.recentchanges
+        super(TestIncrementalRCPageGenerator, self).tearDown()
+
+    def recentchanges(self, start=None, reverse=False, total=None, **kwargs):
+        changes = self.changes if reverse else self.changes[::-1]
+        if start:
+            changes = [entry for entry in changes
+                       if entry['timestamp'] >= start]
+        return iter(changes[:total])
+
+    def change(self, title, timestamp):
+        self.changes.append({'rcid': len(self.changes) + 1, 'title': title,
+                             'timestamp': '2015-01-01T00:00:%02dZ' % timestamp})
+
+    def test_coalesce(self):
+        """Test that the changes to a page are combined."""
+        self.change('A', 0)
+        self.change('B', 1)
+        self.change('A', 1)
+        self.change('C', 2)
+        checkpoint = pagegenerators.RecentChangesCheckpoint()
+        checkpoint.rcid = 1
+        checkpoint.timestamp = '2015-01-01T00:00:00Z'
+        pages = list(pagegenerators.IncrementalRCPageGenerator(
+            self.site, checkpoint, total=3))
+        self.assertPageTitlesEqual(pages, ['B', 'A', 'C'])
+        self.assertEqual(pages[1]._rcinfo['rcid'], 3)
+        self.assertEqual(checkpoint.rcid, 4)
+
+    def test_resume(self):
+        """Test that a generator resumes from the stored checkpoint."""
+        filename = os.path.join(tempfile.mkdtemp(), 'rcfeed.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(filename))
+        self.change('A', 0)
+        self.change('B', 1)
+        self.change('C', 1)
+        checkpoint = pagegenerators.RecentChangesCheckpoint(filename)
+        checkpoint.update(self.changes[0])
+        gen = pagegenerators.IncrementalRCPageGenerator(
+            self.site, checkpoint, sleep_duration=0, total=2)
+        self.assertPageTitlesEqual([next(gen)], ['B'])
+        # the checkpoint is saved once the batch is processed
+        self.assertFalse(os.path.exists(filename))
+        self.assertPageTitlesEqual([next(gen)], ['C'])
+        self.assertRaises(StopIteration, next, gen)
+        checkpoint = pagegenerators.RecentChangesCheckpoint(filename)
+        self.assertEqual((checkpoint.rcid, checkpoint.timestamp),
+                         (3, '2015-01-01T00:00:01Z'))
+        self.change('C', 2)
+        self.change('D', 3)
+        gen = pagegenerators.IncrementalRCPageGenerator(
+            self.site, checkpoint, sleep_duration=0, total=1)
+        self.assertPageTitlesEqual(list(gen), ['C'])
+        self.assertEqual(checkpoint.rcid, 4)
+
+    def test_lower_rcid(self):
+        """Test that a later change with a lower rcid is yielded."""
+        self.change('A', 0)
+        self.change('B', 1)
+        checkpoint = pagegenerators.RecentChangesCheckpoint()
+        checkpoint.rcid = 5
+        checkpoint.timestamp = '2015-01-01T00:00:00Z'
+        pages = list(pagegenerators.IncrementalRCPageGenerator(
+            self.site, checkpoint, total=1))
+        self.assertPageTitlesEqual(pages, ['B'])
+        self.assertEqual(checkpoint.rcid, 2)
+
+    def test_full_batch(self):
+        """Test that a batch of processed changes is skipped."""
+        for title in 'ABCD':
+            self.change(title, 0)
+        self.change('E', 1)
+        checkpoint = pagegenerators.RecentChangesCheckpoint()
+        checkpoint.update(self.changes[2])
+        queries = []
+
+        def recentchanges(total=None, **kwargs):
+            queries.append(total)
+            return self.recentchanges(total=total, **kwargs)
+
+        self.site.recentchanges = recentchanges
+        pages = list(pagegenerators.IncrementalRCPageGenerator(
+            self.site, checkpoint, step=2, sleep_duration=0, total=2))
+        self.assertPageTitlesEqual(pages, ['D', 'E'])
+        self.assertEqual(queries, [2, 4, 4, 8])
+
+
 class TestTextfilePageGenerator(DefaultSiteTestCase):
 
     """Test loading pages from a textfile."""
@@ -805,6 +948,25 @@ class PageGeneratorIntersectTestCase(DefaultSiteTestCase,
             [pagegenerators.NewpagesPageGenerator(site=site, total=50),
              pagegenerators.RecentChangesPageGenerator(site=site, total=200)])
 
+    def test_intersect_sorted(self):
+        """Test that generators sorted by title are merged."""
+        site = self.get_site()
+
+        def gens():
+            return [pagegenerators.AllpagesPageGenerator(start='B', site=site,
+                                                         total=50),
+                    pagegenerators.PrefixingPageGenerator('B', site=site,
+                                                          total=20)]
+
+        expected = set(gens()[0]) & set(gens()[1])
+        sorted_gens = gens()
+        sort_key = sorted_gens[0].sort_key
+        self.assertIs(sorted_gens[1].sort_key, sort_key)
+        result = list(pagegenerators.GeneratorFactory._intersect_generators(
+            sorted_gens))
+        self.assertEqual(set(result), expected)
+        self.assertEqual(result, sorted(result, key=sort_key))
+
 
 class EnglishWikipediaPageGeneratorIntersectTestCase(GeneratorIntersectTestCase):
 
@@ -1,7 +1,7 @@
 # -*- coding: utf-8  -*-
 """Tests for reflinks script."""
 #
-# (C) Pywikibot team, 2014
+# (C) Pywikibot team, 2014-2015
 #
 # Distributed under the terms of the MIT license.
 #
@@ -10,8 +10,14 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 
 import os
+import sqlite3
+import threading
 
-from scripts.reflinks import XmlDumpPageGenerator, ReferencesRobot, main
+from scripts import reflinks
+from scripts.reflinks import (
+    XmlDumpPageGenerator, ReferencesRobot, MetadataCache, MetadataFetcher,
+    main,
+)
 
 from tests import _data_dir
 from tests.aspects import unittest, TestCase, ScriptMainTestCase
@@ -212,6 +218,163 @@ class TestReferencesBotConstructor(ScriptMainTestCase):
                                   site=self.get_site())
 
 
+class TestMetadataFetcher(TestCase):
+
+    """Test fetching the metadata in worker threads."""
+
+    net = False
+
+    def test_dedupe(self):
+        """Test that a URL submitted several times is fetched once."""
+        fetched = []
+
+        def fetch(url):
+            fetched.append(url)
+            return {'url': url, 'status': 'html', 'titles': [url]}
+
+        fetcher = MetadataFetcher(fetch, workers=2)
+        urls = ['http://a.example.org/1', 'http://b.example.org/2',
+                'http://a.example.org/1']
+        for url in urls:
+            fetcher.submit(url)
+        for url in urls:
+            self.assertEqual(fetcher.result(url)['titles'], [url])
+        self.assertCountEqual(fetched, set(urls))
+        self.assertEqual(fetcher._entries, {})
+
+    def test_per_host(self):
+        """Test that only perHost URLs of a host are fetched at once."""
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def fetch(url):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            threading.Event().wait(0.05)
+            with lock:
+                running[0] -= 1
+            return {'url': url, 'status': 'skip', 'message': None}
+
+        fetcher = MetadataFetcher(fetch, workers=4, perHost=1)
+        urls = ['http://www.example.org/%d' % i for i in range(4)]
+        for url in urls:
+            fetcher.submit(url)
+        for url in urls:
+            fetcher.result(url)
+        self.assertEqual(running[1], 1)
+
+    def test_error(self):
+        """Test that an exception while fetching is a transient error."""
+        def fetch(url):
+            raise ValueError('broken')
+
+        fetcher = MetadataFetcher(fetch, workers=1)
+        fetcher.submit('http://www.example.org')
+        metadata = fetcher.result('http://www.example.org')
+        self.assertEqual(metadata['status'], 'error')
+        self.assertTrue(metadata['transient'])
+        self.assertIn('broken', metadata['message'])
+
+    def test_cache(self):
+        """Test that cached metadata is used and not transient is stored."""
+        cache = MetadataCache(':memory:')
+        cache.set('http://www.example.org/cached',
+                  {'url': 'http://www.example.org/cached', 'status': 'media',
+                   'title': None, 'pdf': False})
+
+        def fetch(url):
+            return {'url': url, 'status': 'skip', 'message': None,
+                    'transient': url.endswith('transient')}
+
+        fetcher = MetadataFetcher(fetch, workers=1, cache=cache)
+        for url in ('cached', 'new', 'transient'):
+            fetcher.submit('http://www.example.org/' + url)
+        self.assertEqual(
+            fetcher.result('http://www.example.org/cached')['status'],
+            'media')
+        fetcher.result('http://www.example.org/new')
+        fetcher.result('http://www.example.org/transient')
+        self.assertEqual(cache.get('http://www.example.org/new')['status'],
+                         'skip')
+        self.assertIsNone(cache.get('http://www.example.org/transient'))
+        cache.maxage = 0
+        self.assertIsNone(cache.get('http://www.example.org/new'))
+        cache.close()
+        # a late worker doesn't write into the closed cache
+        cache.set('http://www.example.org/late', {})
+
+    def test_cache_error(self):
+        """Test that the result is available when it can't be cached."""
+        class LockedCache(object):
+            def get(self, url):
+                return None
+
+            def set(self, url, metadata):
+                raise sqlite3.OperationalError('database is locked')
+
+        def fetch(url):
+            return {'url': url, 'status': 'skip', 'message': None}
+
+        fetcher = MetadataFetcher(fetch, workers=1, cache=LockedCache())
+        fetcher.submit('http://www.example.org')
+        self.assertEqual(fetcher.result('http://www.example.org')['status'],
+                         'skip')
+        fetcher.stop()
+
+    def test_stop(self):
+        """Test that stop ends the workers without fetching queued URLs."""
+        fetched = []
+        started = threading.Event()
+
+        def fetch(url):
+            fetched.append(url)
+            started.set()
+            threading.Event().wait(0.1)
+            return {'url': url, 'status': 'skip', 'message': None}
+
+        fetcher = MetadataFetcher(fetch, workers=1)
+        urls = ['http://www.example.org/%d' % i for i in range(5)]
+        for url in urls:
+            fetcher.submit(url)
+        started.wait(1)
+        fetcher.stop()
+        self.assertFalse(any(worker.is_alive() for worker in fetcher.workers))
+        self.assertEqual(fetched, urls[:1])
+
+
+class TestFetchMetadata(TestCase):
+
+    """Test the metadata of failed requests."""
+
+    net = False
+
+    def setUp(self):
+        """Let urlopen fail with the HTTP status of self.code."""
+        super(TestFetchMetadata, self).setUp()
+        self.bot = ReferencesRobot.__new__(ReferencesRobot)
+        self.bot.timeout = 1
+        self.urlopen = reflinks.urlopen
+        reflinks.urlopen = self.fail_request
+
+    def tearDown(self):
+        reflinks.urlopen = self.urlopen
+        super(TestFetchMetadata, self).tearDown()
+
+    def fail_request(self, url, timeout):
+        raise reflinks.HTTPError(url, self.code, 'Error', {}, None)
+
+    def test_http_error(self):
+        """Test that only permanent HTTP errors may be cached."""
+        for code, transient in ((404, False), (410, False), (429, True),
+                                (500, True), (503, True)):
+            self.code = code
+            metadata = self.bot.fetchMetadata('http://www.example.org/')
+            self.assertEqual(metadata['status'], 'httperror')
+            self.assertEqual(metadata['code'], code)
+            self.assertEqual(metadata['transient'], transient)
+
+
 def dummy_constructor(self, *args, **kwargs):
     TestReferencesBotConstructor.constructor_args = args
     TestReferencesBotConstructor.constructor_kwargs = kwargs
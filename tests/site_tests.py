@@ -10,8 +10,11 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 
 
+import hashlib
 import sys
 import os
+import shutil
+import tempfile
 from collections import Iterable
 from datetime import datetime
 import re
@@ -1974,6 +1977,155 @@ class TestUploadEnabledSite(TestCase):
             self.assertTrue(site.is_uploaddisabled())
 
 
+class TestChunkedUploadState(DefaultDrySiteTestCase):
+
+    """Test storing the progress of chunked uploads."""
+
+    def setUp(self):
+        """Create a temporary directory for the state file."""
+        super(TestChunkedUploadState, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'upload-state.json')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.directory)
+        super(TestChunkedUploadState, self).tearDown()
+
+    def test_persistence(self):
+        """Test that the progress is read again from the file."""
+        site = self.get_site()
+        state = pywikibot.site.ChunkedUploadState(self.filename)
+        self.assertIsNone(state.get(site, 'Foo.png'))
+        state.set(site, 'Foo.png', 'abc.123', 1024, 'da39a3ee', 4096)
+        state.set(site, 'Bar.png', 'def.456', 2048, '5ba93c9d', 8192)
+        state = pywikibot.site.ChunkedUploadState(self.filename)
+        self.assertEqual(state.get(site, 'Foo.png'),
+                         {'filekey': 'abc.123', 'offset': 1024,
+                          'sha1': 'da39a3ee', 'filesize': 4096})
+        state.remove(site, 'Foo.png')
+        state = pywikibot.site.ChunkedUploadState(self.filename)
+        self.assertIsNone(state.get(site, 'Foo.png'))
+        self.assertEqual(state.get(site, 'Bar.png')['offset'], 2048)
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+
+class FakeClock(object):
+
+    """Clock which only advances when told so."""
+
+    def __init__(self):
+        self.now = 0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeUploadRequest(dict):
+
+    """Upload request which simulates a server receiving the chunks."""
+
+    def __init__(self, test, parameters, **kwargs):
+        super(FakeUploadRequest, self).__init__(parameters)
+        self.test = test
+        self.mime_params = {}
+
+    def submit(self):
+        if not self.get('stash'):
+            self.test.assertEqual(self['filekey'], 'key')
+            return {'upload': {'result': 'Success', 'nochange': ''}}
+        chunk = self.mime_params['chunk'][0]
+        self.test.chunks.append((self['offset'], len(chunk),
+                                 self.get('filekey')))
+        # the server receives rate bytes per second
+        self.test.clock.sleep(len(chunk) / self.test.rate)
+        offset = self['offset'] + len(chunk)
+        if offset == self['filesize']:
+            return {'upload': {'result': 'Success', 'filekey': 'key'}}
+        return {'upload': {'result': 'Continue', 'filekey': 'key',
+                           'offset': offset}}
+
+
+class TestChunkedUpload(DefaultDrySiteTestCase):
+
+    """Test the loop of a chunked upload with a simulated server."""
+
+    rate = 10000.0
+
+    def setUp(self):
+        """Create a file to upload and replace the requests and clock."""
+        super(TestChunkedUpload, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'Foo.png')
+        self.content = bytearray(range(256)) * 3906 + bytearray(range(64))
+        with open(self.source, 'wb') as f:
+            f.write(self.content)
+        self.state = pywikibot.site.ChunkedUploadState(
+            os.path.join(self.directory, 'upload-state.json'))
+        self.chunks = []
+        self.clock = FakeClock()
+        self._time = pywikibot.site.time
+        pywikibot.site.time = self.clock
+        self._chunk_time = config.upload_chunk_time
+        config.upload_chunk_time = 10
+        site = self.get_site()
+        site._userinfo = {'rights': ['upload']}
+        site.tokens = {'edit': 'token'}
+        site.version = lambda: '1.25'
+        site._request = lambda **kwargs: FakeUploadRequest(self, **kwargs)
+
+    def tearDown(self):
+        """Restore the site and the clock and remove the file."""
+        site = self.get_site()
+        del site.version
+        del site._request
+        site.tokens = pywikibot.site.TokenWallet(site)
+        site._userinfo = pywikibot.tools.EMPTY_DEFAULT
+        pywikibot.site.time = self._time
+        config.upload_chunk_time = self._chunk_time
+        shutil.rmtree(self.directory)
+        super(TestChunkedUpload, self).tearDown()
+
+    def upload(self):
+        site = self.get_site()
+        filepage = pywikibot.FilePage(site, 'File:Foo.png')
+        site.upload(filepage, source_filename=self.source, comment='Test',
+                    text='Test',
+                    chunk_size=400000, upload_state=self.state)
+
+    def test_adapt_chunk_size(self):
+        """Test that the chunks get smaller on a slow connection."""
+        self.assertEqual(len(self.content), 1000000)
+        self.upload()
+        self.assertEqual(self.chunks,
+                         [(0, 400000, None), (400000, 200000, 'key'),
+                          (600000, 100000, 'key'), (700000, 100000, 'key'),
+                          (800000, 100000, 'key'), (900000, 100000, 'key')])
+        self.assertIsNone(self.state.get(self.get_site(), 'Foo.png'))
+
+    def test_resume(self):
+        """Test that an interrupted upload is continued."""
+        site = self.get_site()
+        self.state.set(site, 'Foo.png', 'key', 600000,
+                       hashlib.sha1(self.content[:600000]).hexdigest(),
+                       len(self.content))
+        self.upload()
+        self.assertEqual(self.chunks[0], (600000, 400000, 'key'))
+        self.assertEqual(len(self.chunks), 1)
+        self.assertIsNone(self.state.get(site, 'Foo.png'))
+
+    def test_changed_file(self):
+        """Test that the upload starts again when the file changed."""
+        site = self.get_site()
+        self.state.set(site, 'Foo.png', 'key', 600000, 'da39a3ee',
+                       len(self.content))
+        self.upload()
+        self.assertEqual(self.chunks[0], (0, 400000, None))
+
+
 class TestPagePreloading(DefaultSiteTestCase):
 
     """Test site.preloadpages()."""
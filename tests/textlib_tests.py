@@ -726,6 +726,37 @@ class TestLocalDigits(TestCase):
                 "299792458", 'km'), u"២៩៩៧៩២៤៥៨")
 
 
+class TestDisabledParts(TestCase):
+
+    """Test finding the parts of a text where wiki markup is disabled."""
+
+    net = False
+
+    text = 'a<!--b-->c<nowiki>d</nowiki>e<pre>f</pre>g'
+
+    def test_remove(self):
+        """Test removing the disabled parts."""
+        self.assertEqual(textlib.removeDisabledParts(self.text), 'aceg')
+        self.assertEqual(textlib.removeDisabledParts(self.text,
+                                                     tags=['comments']),
+                         'ac<nowiki>d</nowiki>e<pre>f</pre>g')
+        self.assertEqual(textlib.removeDisabledParts(self.text,
+                                                     include=['pre']),
+                         'ace<pre>f</pre>g')
+
+    def test_disabled(self):
+        """Test that the positions agree with isDisabled of the marker."""
+        parts = textlib.DisabledParts(self.text)
+        self.assertEqual(parts.spans, [(1, 9), (10, 28), (29, 41)])
+        disabled = [index for index in range(len(self.text) + 1)
+                    if index in parts]
+        self.assertEqual(disabled, list(range(2, 9)) + list(range(11, 28)) +
+                         list(range(30, 41)))
+        self.assertTrue(textlib.isDisabled(self.text, 5))
+        self.assertFalse(textlib.isDisabled(self.text, 9))
+        self.assertFalse(textlib.isDisabled(self.text, 15, tags=['pre']))
+
+
 class TestReplaceExcept(DefaultDrySiteTestCase):
 
     """Test to verify the replacements with exceptions are done correctly."""
@@ -9,8 +9,13 @@ from __future__ import unicode_literals
 
 __version__ = '$Id$'
 
+import threading
+import time
+
 from tests.aspects import unittest, TestCase
-from pywikibot.tools import ThreadedGenerator, intersect_generators
+from pywikibot.tools import (
+    LookAheadGenerator, ThreadedGenerator, intersect_generators,
+)
 
 
 class BasicThreadedGeneratorTestCase(TestCase):
@@ -37,18 +42,98 @@ class BasicThreadedGeneratorTestCase(TestCase):
         self.assertEqual(list(thd_gen), list(iterable))
 
 
+class LookAheadGeneratorTestCase(TestCase):
+
+    """LookAheadGenerator test cases."""
+
+    net = False
+
+    def test_iterable(self):
+        """Test that all values are yielded in order."""
+        with LookAheadGenerator(range(100), qsize=3) as gen:
+            self.assertEqual(list(gen), list(range(100)))
+        self.assertEqual(list(LookAheadGenerator('abcd')), list('abcd'))
+
+    def test_exception(self):
+        """Test that an exception of the generator is raised by the consumer."""
+        def gen_func():
+            yield 1
+            yield 2
+            raise ValueError('failed')
+        gen = iter(LookAheadGenerator(gen_func()))
+        self.assertEqual(next(gen), 1)
+        self.assertEqual(next(gen), 2)
+        self.assertRaisesRegex(ValueError, 'failed', next, gen)
+
+    def test_qsize(self):
+        """Test that the producer waits until there is room in the buffer."""
+        produced = []
+        produced_more = threading.Event()
+
+        def gen_func():
+            for i in range(10):
+                produced.append(i)
+                if len(produced) > 4:
+                    produced_more.set()
+                yield i
+
+        gen = LookAheadGenerator(gen_func(), qsize=2)
+        values = iter(gen)
+        self.assertEqual(next(values), 0)
+        # at most two values are buffered and one is waiting for room
+        self.assertFalse(produced_more.wait(0.2))
+        self.assertEqual(list(values), list(range(1, 10)))
+        gen.join(1)
+        self.assertFalse(gen.is_alive())
+
+    def test_budget(self):
+        """Test that the buffered values stay within the budget."""
+        produced = []
+        produced_more = threading.Event()
+
+        def gen_func():
+            for i in range(10):
+                produced.append(i)
+                if len(produced) > 4:
+                    produced_more.set()
+                yield 'x' * 10
+
+        gen = LookAheadGenerator(gen_func(), budget=20, size=len)
+        values = iter(gen)
+        self.assertEqual(next(values), 'x' * 10)
+        # two values fit in the budget and one is waiting for room
+        self.assertFalse(produced_more.wait(0.2))
+        self.assertEqual(len(list(values)), 9)
+
+    def test_stop(self):
+        """Test that stop ends the producer."""
+        def gen_func():
+            i = 0
+            while True:
+                yield i
+                i += 1
+
+        gen = LookAheadGenerator(gen_func(), qsize=5)
+        values = iter(gen)
+        self.assertEqual(next(values), 0)
+        gen.stop()
+        gen.join(1)
+        self.assertFalse(gen.is_alive())
+        self.assertEqual(list(values), [])
+
+
 class GeneratorIntersectTestCase(TestCase):
 
     """Base class for intersect_generators test cases."""
 
-    def assertEqualItertools(self, gens):
+    def assertEqualItertools(self, gens, **kwargs):
         # If they are a generator, we need to convert to a list
         # first otherwise the generator is empty the second time.
         datasets = [list(gen) for gen in gens]
 
         set_result = set(datasets[0]).intersection(*datasets[1:])
 
-        result = list(intersect_generators(datasets))
+        result = list(intersect_generators(datasets, **kwargs))
 
         self.assertCountEqual(set(result), result)
 
@@ -67,6 +152,84 @@ class BasicGeneratorIntersectTestCase(GeneratorIntersectTestCase):
     def test_intersect_with_dups(self):
         self.assertEqualItertools(['aabc', 'dddb', 'baa'])
 
+    def test_intersect_key(self):
+        result = intersect_generators(['aBc', 'bCd'],
+                                      key=lambda item: item.lower())
+        self.assertCountEqual([item.lower() for item in result], 'bc')
+
+    def test_intersect_exhausted(self):
+        """Test that the intersection ends when nothing can be found."""
+        def endless():
+            i = 0
+            while True:
+                yield i
+                i += 1
+        self.assertEqual(list(intersect_generators([endless(), [3, 1]])),
+                         [3, 1])
+
+    def test_intersect_exhausted_first(self):
+        """Test that the intersection ends after the last key was found."""
+        def endless_slow_start():
+            time.sleep(0.2)
+            i = 0
+            while True:
+                yield i
+                i += 1
+        self.assertEqual(
+            list(intersect_generators([endless_slow_start(), [3, 1]])),
+            [1, 3])
+
+    def test_intersect_close(self):
+        """Test that closing doesn't wait for a blocked generator."""
+        released = threading.Event()
+        self.addCleanup(released.set)
+
+        def blocking():
+            yield 'a'
+            released.wait()
+            yield 'b'
+        result = intersect_generators([blocking(), 'ab'])
+        self.assertEqual(next(result), 'a')
+        start = time.time()
+        result.close()
+        self.assertLess(time.time() - start, 1)
+
+    def test_intersect_exception(self):
+        def failing():
+            yield 'a'
+            raise ValueError('failed')
+        self.assertRaisesRegex(ValueError, 'failed', list,
+                               intersect_generators([failing(), 'ab']))
+
+
+class SortedGeneratorIntersectTestCase(GeneratorIntersectTestCase):
+
+    """Merge join intersect_generators test cases."""
+
+    net = False
+
+    def test_intersect_basic(self):
+        self.assertEqualItertools(['abc', 'bd', 'ab'], sorted_by_key=True)
+
+    def test_intersect_with_dups(self):
+        self.assertEqualItertools(['aabc', 'bddd', 'aab'], sorted_by_key=True)
+
+    def test_intersect_order(self):
+        result = intersect_generators([range(0, 1000, 2), range(0, 1000, 3),
+                                       range(0, 1000, 5)], sorted_by_key=True)
+        self.assertEqual(list(result), list(range(0, 1000, 30)))
+
+    def test_intersect_key(self):
+        result = intersect_generators(['aBc', 'BcD'],
+                                      key=lambda item: item.lower(),
+                                      sorted_by_key=True)
+        self.assertEqual(list(result), ['B', 'c'])
+
+    def test_intersect_not_sorted(self):
+        self.assertRaisesRegex(ValueError, 'not sorted', list,
+                               intersect_generators(['abc', 'bab'],
+                                                    sorted_by_key=True))
+
 
 if __name__ == '__main__':
     try:
@@ -11,6 +11,7 @@ __version__ = '$Id$'
 
 import datetime
 
+from pywikibot import textlib
 from pywikibot.textlib import TimeStripper, tzoneFixedOffset
 from tests.aspects import unittest, TestCase
 
@@ -280,6 +281,57 @@ class TestTimeStripperDoNotArchiveUntil(TestCase):
         self.assertEqual(ts.timestripper(txt_match), res)
 
 
+class TestTimeStripperDry(TestCase):
+
+    """Test the TimeStripper with known month names and without a network."""
+
+    family = 'wikipedia'
+    code = 'fa'
+
+    dry = True
+
+    months = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+              'August', 'September', 'October', 'November', 'December']
+
+    def setUp(self):
+        """Set the month names and the timezone of the site."""
+        super(TestTimeStripperDry, self).setUp()
+        site = self.get_site()
+        # the patterns are shared by equal sites, so don't leave the fake
+        # month names and timezone for the other tests
+        textlib._timestripper_patterns.pop(site, None)
+        self.addCleanup(textlib._timestripper_patterns.pop, site, None)
+        site._months_names = [(month, month[:3]) for month in self.months]
+        site.siteinfo._cache['timeoffset'] = (0, True)
+        site.siteinfo._cache['timezone'] = ('UTC', True)
+        self.ts = TimeStripper(site)
+
+    def test_shared_patterns(self):
+        """Test that the patterns are created once per site."""
+        other = TimeStripper(self.get_site())
+        self.assertIsNot(other, self.ts)
+        self.assertIs(other.pmonthR, self.ts.pmonthR)
+        self.assertIs(other.origNames2monthNum, self.ts.origNames2monthNum)
+
+    def test_fix_digits(self):
+        """Test that non-latin digits are replaced by latin digits."""
+        self.assertEqual(self.ts.fix_digits('۱۲:۳۰ ០៩ ೨೦೧೫ 42'),
+                         '12:30 09 2015 42')
+
+    def test_timestripper(self):
+        """Test that only complete timestamps are found."""
+        tzone = tzoneFixedOffset(0, 'UTC')
+        res = datetime.datetime(2015, 6, 6, 6, 57, tzinfo=tzone)
+        self.assertEqual(self.ts.timestripper('Foo ۰۶:۵۷, 6 June ۲۰۱۵ (UTC)'),
+                         res)
+        self.assertEqual(
+            self.ts.timestripper('<!-- 06:57, 6 June 2015 (UTC) --> Foo'),
+            res)
+        self.assertIsNone(self.ts.timestripper('No timestamp (UTC)'))
+        self.assertIsNone(self.ts.timestripper('06:57, June 2015 (UTC)'))
+        self.assertIsNone(self.ts.timestripper('6 June 2015 (UTC)'))
+
+
 if __name__ == '__main__':
     try:
         unittest.main()
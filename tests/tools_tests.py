@@ -1,6 +1,6 @@
 #!/usr/bin/python
-"""Test tools package alone which don't fit into other tests."""
 # -*- coding: utf-8  -*-
+"""Test tools package alone which don't fit into other tests."""
 #
 # (C) Pywikibot team, 2015
 #
@@ -407,6 +407,129 @@ class TestFilterUnique(TestCase):
         # And it should not resume
         self.assertRaises(StopIteration, next, deduper)
 
+    def _test_dedup_compact(self, deduped):
+        """Test filter_unique with a compact container."""
+        deduper = tools.filter_unique(self.ints, container=deduped)
+        self.assertEqual(list(deduper), [1, 3, 2, 4])
+        self.assertEqual(len(deduped), 4)
+        self.assertIn(3, deduped)
+        self.assertNotIn(5, deduped)
+
+    def test_hashed_set(self):
+        """Test filter_unique with a HashedSet."""
+        self._test_dedup_compact(tools.HashedSet())
+
+    def test_integer_set(self):
+        """Test filter_unique with an IntegerSet."""
+        self._test_dedup_compact(tools.IntegerSet())
+
+    def test_bloom_filter(self):
+        """Test filter_unique with a BloomFilter."""
+        self._test_dedup_compact(tools.BloomFilter(100))
+
+
+class TestCompactSets(TestCase):
+
+    """Test the compact containers."""
+
+    net = False
+
+    def test_hashed_set(self):
+        """Test that HashedSet compares the text of the items."""
+        hashed = tools.HashedSet(['a', 1, b'b'])
+        self.assertEqual(len(hashed), 3)
+        self.assertIn('1', hashed)
+        self.assertIn('b', hashed)
+        self.assertIn(b'a', hashed)
+        self.assertNotIn('c', hashed)
+
+    def test_integer_set(self):
+        """Test adding small and large integers to IntegerSet."""
+        integers = tools.IntegerSet([0, 8, 5000000, 8])
+        self.assertEqual(len(integers), 3)
+        for number in (0, 8, 5000000):
+            self.assertIn(number, integers)
+        for number in (-1, 1, 7, 9, 4999999, 5000001, 10 ** 10):
+            self.assertNotIn(number, integers)
+        self.assertRaises(ValueError, integers.add, -1)
+
+    def test_bloom_filter(self):
+        """Test the error rate of BloomFilter."""
+        bloom = tools.BloomFilter(10000, 0.01)
+        self.assertLess(len(bloom._bits), 12000)
+        for i in range(10000):
+            bloom.add('Page {0}'.format(i))
+        self.assertTrue(all('Page {0}'.format(i) in bloom
+                            for i in range(10000)))
+        errors = sum('Other page {0}'.format(i) in bloom
+                     for i in range(10000))
+        self.assertLess(errors, 200)
+        self.assertRaises(ValueError, tools.BloomFilter, 0)
+        self.assertRaises(ValueError, tools.BloomFilter, 10, 1)
+
+
+class TestSpillStore(TestCase):
+
+    """Test the SpillStore which writes texts to a temporary file."""
+
+    net = False
+
+    def setUp(self):
+        """Create a store which keeps 10 characters in memory."""
+        super(TestSpillStore, self).setUp()
+        self.store = tools.SpillStore(memory=10)
+
+    def tearDown(self):
+        """Close the store."""
+        self.store.close()
+        super(TestSpillStore, self).tearDown()
+
+    def test_spill(self):
+        """Test that the least recently used texts are written to disk."""
+        store = self.store
+        first = store.add('äöü')
+        self.assertIsNone(store._file)
+        second = store.add('abcd')
+        third = store.add('Ω' * 5)
+        self.assertEqual(list(store._cache), [second, third])
+        self.assertEqual(list(store._index), [first])
+        self.assertEqual(store.get(first), 'äöü')
+        self.assertEqual(list(store._cache), [third, first])
+        self.assertEqual(store.get(second), 'abcd')
+        self.assertEqual(store.get(third), 'Ω' * 5)
+        self.assertEqual(len(store), 3)
+        self.assertIn(second, store)
+        # a text longer than the memory is written immediately
+        fourth = store.add('x' * 20)
+        self.assertEqual(store.get(fourth), 'x' * 20)
+        self.assertEqual(store.get(first), 'äöü')
+
+    def test_remove(self):
+        """Test that removed texts are gone and the file is compacted."""
+        store = self.store
+        store.compact_size = 0
+        keys = [store.add(text * 10) for text in 'abcd']
+        store.remove(keys[0])
+        self.assertNotIn(keys[0], store)
+        self.assertRaises(KeyError, store.get, keys[0])
+        size = store._end
+        store.remove(keys[1])
+        self.assertLess(store._end, size)
+        self.assertEqual(store._unused, 0)
+        self.assertEqual(store.get(keys[2]), 'c' * 10)
+        self.assertEqual(store.get(keys[3]), 'd' * 10)
+        self.assertEqual(len(store), 2)
+        store.remove(keys[1])
+
+    def test_close(self):
+        """Test that close removes all texts."""
+        store = self.store
+        key = store.add('a' * 20)
+        store.close()
+        self.assertIsNone(store._file)
+        self.assertNotIn(key, store)
+        self.assertEqual(len(store), 0)
+
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,290 @@
+# -*- coding: utf-8  -*-
+"""Tests for scripts/weblinkchecker.py."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import sys
+import threading
+import time
+
+if sys.version_info[0] > 2:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from scripts import weblinkchecker
+
+from tests.aspects import unittest, TestCase, DefaultDrySiteTestCase
+
+
+class LinkHandler(BaseHTTPRequestHandler):
+
+    """Answer the requests of the test server."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        """Don't log the requests."""
+        pass
+
+    def setup(self):
+        """Count the connections."""
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def _respond(self, method):
+        self.server.requests.append((method, self.path))
+        if self.path == '/missing':
+            status = 404
+        elif self.path == '/nohead' and method == 'HEAD':
+            status = 405
+        elif self.path == '/redirect':
+            status = 301
+        else:
+            status = 200
+        body = b'<html></html>'
+        self.send_response(status)
+        if status == 301:
+            self.send_header('Location', '/ok')
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if method == 'GET':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        """Answer a HEAD request."""
+        self._respond('HEAD')
+
+    def do_GET(self):
+        """Answer a GET request."""
+        self._respond('GET')
+
+
+class LinkServer(ThreadingMixIn, HTTPServer):
+
+    """HTTP server which handles each connection in its own thread."""
+
+    daemon_threads = True
+    block_on_close = False
+
+
+class DummyHistory(object):
+
+    """History which only remembers the results in memory."""
+
+    def __init__(self, checked=None):
+        self.checked = checked or {}
+        self.alive = []
+        self.dead = []
+
+    def lastChecked(self, url):
+        return self.checked.get(url)
+
+    def setLinkAlive(self, url):
+        self.checked[url] = time.time()
+        self.alive.append(url)
+        return False
+
+    def setLinkDead(self, url, error, page, day):
+        self.checked[url] = time.time()
+        self.dead.append((url, page))
+
+
+class DummyPage(object):
+
+    """Page which only has a title."""
+
+    def __init__(self, title):
+        self._title = title
+
+    def title(self):
+        return self._title
+
+
+class LocalServerTestCase(TestCase):
+
+    """Run a HTTP server on localhost."""
+
+    net = False
+
+    def setUp(self):
+        """Start the server."""
+        super(LocalServerTestCase, self).setUp()
+        self.server = LinkServer(('127.0.0.1', 0), LinkHandler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.base = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+        super(LocalServerTestCase, self).tearDown()
+
+
+class TestLinkChecker(LocalServerTestCase):
+
+    """Test the LinkChecker with HEAD requests and kept-alive connections."""
+
+    def check(self, path, pool=None):
+        checker = weblinkchecker.LinkChecker(self.base + path, pool=pool)
+        return checker.check(useHEAD=True)
+
+    def test_head(self):
+        """Test that an alive page is only requested with HEAD."""
+        self.assertEqual(self.check('/ok'), (True, '200 OK'))
+        self.assertEqual(self.server.requests, [('HEAD', '/ok')])
+
+    def test_get_fallback(self):
+        """Test that a failed HEAD request is confirmed with GET."""
+        self.assertEqual(self.check('/nohead'), (True, '200 OK'))
+        self.assertEqual(self.server.requests,
+                         [('HEAD', '/nohead'), ('GET', '/nohead')])
+        alive, message = self.check('/missing')
+        self.assertFalse(alive)
+        self.assertEqual(message, '404 Not Found')
+
+    def test_connection_reuse(self):
+        """Test that the connection pool reuses the connection."""
+        pool = weblinkchecker.HostConnectionPool(per_host=1)
+        for path in ('/ok', '/redirect', '/nohead', '/ok'):
+            self.assertTrue(self.check(path, pool)[0])
+        # the GET request of /nohead closes its connection
+        self.assertEqual(self.server.connections, 2)
+        pool.close()
+
+    def test_without_pool(self):
+        """Test that each check uses a new connection without a pool."""
+        self.check('/ok')
+        self.check('/ok')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_timeout_tuple(self):
+        """Test that the longer timeout of a tuple is used."""
+        timeout = weblinkchecker.config.socket_timeout
+        weblinkchecker.config.socket_timeout = (5, 20)
+        try:
+            connection = weblinkchecker.HostConnectionPool.connect(
+                'http', '127.0.0.1')
+            self.assertEqual(connection.timeout, 20)
+            self.assertEqual(self.check('/ok'), (True, '200 OK'))
+        finally:
+            weblinkchecker.config.socket_timeout = timeout
+
+
+class TestLinkCheckPool(LocalServerTestCase):
+
+    """Test the LinkCheckPool."""
+
+    def wait(self, pool):
+        for i in range(100):
+            if not pool.pending:
+                break
+            time.sleep(0.05)
+        self.assertEqual(pool.pending, 0)
+
+    def test_dedupe(self):
+        """Test that URLs are checked once and known URLs are skipped."""
+        recent = self.base + '/recent'
+        history = DummyHistory({recent: time.time() - 60})
+        pool = weblinkchecker.LinkCheckPool(history, day=1, workers=2)
+        page = DummyPage('Test')
+        self.assertFalse(pool.add(page, recent))
+        self.assertTrue(pool.add(page, self.base + '/ok'))
+        self.assertTrue(pool.add(page, self.base + '/missing'))
+        self.wait(pool)
+        self.assertFalse(pool.add(DummyPage('Other'), self.base + '/ok'))
+        pool.stop()
+        self.assertEqual(history.alive, [self.base + '/ok'])
+        self.assertEqual(history.dead, [(self.base + '/missing', page)])
+        self.assertNotIn(('HEAD', '/recent'), self.server.requests)
+
+    def test_old_check(self):
+        """Test that URLs checked before the day window are checked again."""
+        url = self.base + '/ok'
+        history = DummyHistory({url: time.time() - 60 * 60 * 24 * 2})
+        pool = weblinkchecker.LinkCheckPool(history, day=1, workers=1)
+        self.assertTrue(pool.add(DummyPage('Test'), url))
+        self.wait(pool)
+        pool.stop()
+        self.assertEqual(history.alive, [url])
+
+
+class TestHistory(DefaultDrySiteTestCase):
+
+    """Test the History stored in a SQLite database."""
+
+    def setUp(self):
+        """Create a history in memory."""
+        super(TestHistory, self).setUp()
+        self.history = weblinkchecker.History(None, site=self.get_site(),
+                                              filename=':memory:')
+
+    def add_entry(self, url, title, date, error='404 Not Found'):
+        self.history.connection.execute(
+            'INSERT INTO deadlinks VALUES (?, ?, ?, ?)',
+            (url, title, date, error))
+
+    def test_dead_and_alive(self):
+        """Test recording dead and alive links."""
+        history = self.history
+        url = 'http://www.example.org/dead'
+        page = DummyPage('Foo')
+        self.assertIsNone(history.lastChecked(url))
+        history.setLinkDead(url, '404 Not Found', page, 7)
+        self.assertIsNotNone(history.lastChecked(url))
+        entries = history.getEntries(url)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0][0], 'Foo')
+        self.assertEqual(entries[0][2], '404 Not Found')
+        # found dead again within an hour
+        history.setLinkDead(url, '404 Not Found', DummyPage('Bar'), 7)
+        self.assertEqual(len(history.getEntries(url)), 1)
+        self.assertTrue(history.setLinkAlive(url))
+        self.assertEqual(history.getEntries(url), [])
+        self.assertFalse(history.setLinkAlive(url))
+        history.save()
+
+    def test_dead_links_window(self):
+        """Test querying the URLs found dead first in a time window."""
+        self.add_entry('http://a.example.org', 'A', 100)
+        self.add_entry('http://a.example.org', 'B', 300)
+        self.add_entry('http://b.example.org', 'B', 200)
+        self.assertEqual(self.history.getDeadLinks(),
+                         [('http://a.example.org', 100, 300),
+                          ('http://b.example.org', 200, 200)])
+        self.assertEqual(self.history.getDeadLinks(start=150),
+                         [('http://b.example.org', 200, 200)])
+        self.assertEqual(self.history.getDeadLinks(end=150),
+                         [('http://a.example.org', 100, 300)])
+
+    def test_repeat_generator(self):
+        """Test that RepeatPageGenerator yields each page once."""
+        for number in range(5):
+            self.add_entry('http://example.org/%d' % number,
+                           'Page %d' % (number % 3), number)
+        self.assertEqual(list(self.history.getPageTitles(step=2)),
+                         ['Page 0', 'Page 1', 'Page 2'])
+        pages = list(weblinkchecker.RepeatPageGenerator(self.history))
+        self.assertEqual([page.title() for page in pages],
+                         ['Page 0', 'Page 1', 'Page 2'])
+        self.assertEqual(pages[0].site, self.get_site())
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -18,7 +18,7 @@ import pywikibot
 
 from pywikibot import pagegenerators
 from pywikibot.tools import SelfCallDict
-from pywikibot.page import WikibasePage, ItemPage
+from pywikibot.page import WikibasePage, ItemPage, ClaimCollection
 from pywikibot.site import Namespace
 
 from tests.aspects import (
@@ -986,6 +986,231 @@ class TestJSON(WikidataTestCase):
         self.assertEqual(diff, expected)
 
 
+class TestClaimCollection(WikidataTestCase):
+
+    """Test the lazy conversion of claims."""
+
+    dry = True
+
+    def setUp(self):
+        super(TestClaimCollection, self).setUp()
+        wikidata = self.get_repo()
+        self.wdp = pywikibot.ItemPage(wikidata, 'Q60')
+        self.wdp.id = 'Q60'
+        with open(os.path.join(os.path.split(__file__)[0], 'pages', 'Q60.wd')) as f:
+            self.wdp._content = json.load(f)
+        self.wdp.get()
+
+    def test_lazy_claims(self):
+        """Test that only the accessed claims are converted."""
+        claims = self.wdp.claims
+        self.assertIsInstance(claims, ClaimCollection)
+        self.assertEqual(set(claims), set(self.wdp._content['claims']))
+        self.assertIn('P213', claims)
+        self.assertNotIn('P9999', claims)
+        self.assertFalse(claims.is_loaded('P213'))
+        self.assertFalse(any(claims.is_loaded(pid) for pid in claims))
+        claim = claims['P213'][0]
+        self.assertIsInstance(claim, pywikibot.Claim)
+        self.assertEqual(claim.snak, 'Q60$0427a236-4120-7d00-fa3e-e23548d4c02d')
+        self.assertEqual(claim.on_item, self.wdp)
+        self.assertTrue(claims.is_loaded('P213'))
+        self.assertIs(claims['P213'][0], claim)
+        self.assertEqual(sum(claims.is_loaded(pid) for pid in claims), 1)
+        self.assertRaises(KeyError, claims.__getitem__, 'P9999')
+
+    def test_modify_claims(self):
+        """Test setting and deleting claims of converted and raw properties."""
+        claims = self.wdp.claims
+        length = len(claims)
+        del claims['P213']
+        self.assertNotIn('P213', claims)
+        claims['P213'] = []
+        self.assertTrue(claims.is_loaded('P213'))
+        self.assertEqual(claims['P213'], [])
+        self.assertTrue(claims['P17'])
+        del claims['P17']
+        self.assertNotIn('P17', claims)
+        self.assertEqual(len(claims), length - 1)
+        self.assertRaises(KeyError, claims.__delitem__, 'P17')
+
+    def test_conversion_error(self):
+        """Test that claims are kept when their conversion fails."""
+        claims = self.wdp.claims
+        claims._json['P9999'] = [{'mainsnak': {}}]
+        self.assertRaises(KeyError, claims.__getitem__, 'P9999')
+        self.assertIn('P9999', claims)
+        self.assertFalse(claims.is_loaded('P9999'))
+        self.assertEqual(claims._json['P9999'], [{'mainsnak': {}}])
+
+
+class TestItemBatch(WikidataTestCase):
+
+    """Test saving several changes of an item in one edit."""
+
+    dry = True
+
+    def setUp(self):
+        super(TestItemBatch, self).setUp()
+        self.repo = self.get_repo()
+        with open(os.path.join(os.path.split(__file__)[0], 'pages', 'Q60.wd')) as f:
+            self.content = json.load(f)
+        self.item = pywikibot.ItemPage(self.repo, 'Q60')
+        self.item._content = copy.deepcopy(self.content)
+        self.item.get()
+        self.edits = []
+        self.conflicts = 0
+        self.partial = False
+        self.repo.editEntity = self._edit_entity
+        self.repo.loadcontent = self._load_content
+
+    def tearDown(self):
+        del self.repo.editEntity
+        del self.repo.loadcontent
+        super(TestItemBatch, self).tearDown()
+
+    def _load_content(self, identification, *props):
+        return {'Q60': copy.deepcopy(self.content)}
+
+    def _edit_entity(self, identification, data, **kwargs):
+        self.edits.append((identification, data, kwargs))
+        if self.conflicts:
+            self.conflicts -= 1
+            raise pywikibot.data.api.APIError('editconflict', 'Edit conflict')
+        # wbeditentity returns the complete entity
+        entity = copy.deepcopy(self.item.toJSON())
+        for prop_claims in entity['claims'].values():
+            for claim in prop_claims:
+                claim.setdefault('id', 'Q60$new')
+                for reference in claim.get('references', []):
+                    reference.setdefault('hash', 'newhash')
+                for qualifiers in claim.get('qualifiers', {}).values():
+                    for qualifier in qualifiers:
+                        qualifier.setdefault('hash', 'qualifierhash')
+        entity.update(id='Q60', lastrevid=kwargs['baserevid'] + 1)
+        if self.partial:
+            # only return the changed properties
+            entity = {'id': 'Q60', 'lastrevid': entity['lastrevid'],
+                      'claims': dict((pid, claims)
+                                     for pid, claims in entity['claims'].items()
+                                     if pid in data['claims'])}
+        return {'entity': entity}
+
+    def _changes(self):
+        claim = pywikibot.Claim(self.repo, 'P31', datatype='wikibase-item')
+        claim.setTarget(pywikibot.ItemPage(self.repo, 'Q515'))
+        source = pywikibot.Claim(self.repo, 'P143', datatype='wikibase-item')
+        source.setTarget(pywikibot.ItemPage(self.repo, 'Q328'))
+        qualifier = pywikibot.Claim(self.repo, 'P580', datatype='string')
+        qualifier.setTarget('1624')
+        with self.item.batch(summary='batch'):
+            self.item.addClaim(claim)
+            claim.addSource(source)
+            self.item.removeClaims(self.item.claims['P213'])
+            self.item.claims['P17'][0].addQualifier(qualifier)
+        return claim, source, qualifier
+
+    def test_one_edit(self):
+        """Test that all changes are sent in one wbeditentity."""
+        claim, source, qualifier = self._changes()
+        self.assertEqual(len(self.edits), 1)
+        identification, data, kwargs = self.edits[0]
+        self.assertEqual(identification, {'id': 'Q60'})
+        self.assertEqual(kwargs, {'baserevid': 122836617, 'summary': 'batch'})
+        self.assertEqual(set(data), set(['claims']))
+        self.assertEqual(set(data['claims']), set(['P17', 'P31', 'P213']))
+        self.assertEqual(data['claims']['P213'],
+                         [{'id': 'Q60$0427a236-4120-7d00-fa3e-e23548d4c02d',
+                           'remove': ''}])
+        self.assertEqual(len(data['claims']['P31'][0]['references']), 1)
+        self.assertIn('qualifiers', data['claims']['P17'][0])
+        self.assertEqual(self.item.latest_revision_id, 122836618)
+        self.assertEqual(claim.snak, 'Q60$new')
+        self.assertEqual(source.hash, 'newhash')
+        self.assertEqual(qualifier.hash, 'qualifierhash')
+        self.assertIsNone(self.item._batch)
+        self.assertEqual(self.item.toJSON(diffto=self.item._content), {})
+
+    def test_edit_conflict(self):
+        """Test that the changes are applied again after an edit conflict."""
+        self.conflicts = 1
+        claim = self._changes()[0]
+        self.assertEqual(len(self.edits), 2)
+        self.assertEqual(self.edits[0][1], self.edits[1][1])
+        self.assertEqual(claim.snak, 'Q60$new')
+
+    def test_edit_conflict_retries(self):
+        """Test that EditConflict is raised when all retries conflict."""
+        self.conflicts = 4
+        self.assertRaises(pywikibot.EditConflict, self._changes)
+        self.assertEqual(len(self.edits), 4)
+
+    def test_exception(self):
+        """Test that nothing is saved when the batch raises an exception."""
+        def failing_batch():
+            with self.item.batch():
+                self.item.removeClaims(self.item.claims['P213'])
+                raise ValueError('failed')
+        self.assertRaises(ValueError, failing_batch)
+        self.assertEqual(self.edits, [])
+        self.assertIsNone(self.item._batch)
+        self.assertIn('P213', self.item.claims)
+        self.assertEqual(self.item.toJSON(diffto=self.item._content), {})
+
+    def test_arguments(self):
+        """Test that the arguments of the changes are used for the edit."""
+        qualifier = pywikibot.Claim(self.repo, 'P580', datatype='string')
+        qualifier.setTarget('1624')
+        with self.item.batch(summary='batch'):
+            self.item.removeClaims(self.item.claims['P213'], bot=False)
+            self.item.claims['P17'][0].addQualifier(qualifier,
+                                                    summary='batch')
+        self.assertEqual(self.edits[0][2], {'baserevid': 122836617,
+                                            'summary': 'batch', 'bot': False})
+
+    def test_conflicting_arguments(self):
+        """Test that differing arguments of a change are not ignored."""
+        def conflicting_batch():
+            with self.item.batch(summary='batch'):
+                self.item.removeClaims(self.item.claims['P213'],
+                                       summary='other')
+        self.assertRaises(ValueError, conflicting_batch)
+        self.assertEqual(self.edits, [])
+        self.assertIn('P213', self.item.claims)
+
+    def test_remove_unsaved_source(self):
+        """Test that only the removed unsaved source is removed."""
+        claim = self.item.claims['P17'][0]
+        sources = []
+        for target in ('Q328', 'Q8447'):
+            source = pywikibot.Claim(self.repo, 'P143',
+                                     datatype='wikibase-item')
+            source.setTarget(pywikibot.ItemPage(self.repo, target))
+            sources.append(source)
+        count = len(claim.sources)
+        with self.item.batch():
+            claim.addSource(sources[0])
+            claim.addSource(sources[1])
+            claim.removeSource(sources[0])
+            self.assertEqual(len(claim.sources), count + 1)
+            self.assertIs(claim.sources[-1]['P143'][0], sources[1])
+        references = self.edits[0][1]['claims']['P17'][0]['references']
+        self.assertEqual(len(references), count + 1)
+
+    def test_partial_entity(self):
+        """Test that a returned entity is merged into the content."""
+        self.partial = True
+        claim = self._changes()[0]
+        self.assertEqual(claim.snak, 'Q60$new')
+        content = self.item._content
+        self.assertEqual(content['labels'], self.content['labels'])
+        self.assertNotIn('P213', content['claims'])
+        self.assertEqual(set(content['claims']),
+                         set(self.content['claims']) - set(['P213']) |
+                         set(['P31']))
+        self.assertEqual(self.item.toJSON(diffto=content), {})
+
+
 if __name__ == '__main__':
     try:
         unittest.main()